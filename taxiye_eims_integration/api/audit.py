@@ -0,0 +1,29 @@
+import frappe
+from frappe import _  # type: ignore
+from frappe.utils import cint, get_datetime  # type: ignore
+from taxiye_eims_integration.utils.audit_log import get_entries
+
+MAX_LIMIT = 1000
+
+
+@frappe.whitelist()
+def get_audit_log(limit=100, path=None, outcome=None, since=None):
+    """Recent sampled EIMS exchanges, newest first.
+
+    Filter by EIMS path ("register", "receipt/sales"), outcome
+    ("success", "rejected", "error") and a start datetime.
+    """
+    frappe.only_for("System Manager")  # type: ignore
+
+    limit = cint(limit)
+    if not 0 < limit <= MAX_LIMIT:
+        frappe.throw(_("limit must be between 1 and {0}").format(MAX_LIMIT))  # type: ignore
+    if outcome and outcome not in ("success", "rejected", "error"):
+        frappe.throw(_("outcome must be success, rejected or error"))  # type: ignore
+
+    return get_entries(
+        limit=limit,
+        path=path,
+        outcome=outcome,
+        since=get_datetime(since).timestamp() if since else None,
+    )
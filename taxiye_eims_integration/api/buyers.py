@@ -0,0 +1,32 @@
+import frappe
+from frappe import _  # type: ignore
+from taxiye_eims_integration.utils.serialization import loads
+from taxiye_eims_integration.utils.buyers import get_buyer, prewarm_buyers
+
+
+@frappe.whitelist()
+def prewarm():
+    """Register or refresh corporate buyers for B2B invoices in bulk.
+
+    Body: {"buyers": [{"tin": ..., "legal_name": ..., "vat_number": ..., "city": ..., ...}, ...]}
+    """
+    frappe.only_for("System Manager")  # type: ignore
+
+    raw_data = frappe.request.get_data(as_text=True)  # type: ignore
+    if not raw_data:
+        frappe.throw(_("Empty request body"))  # type: ignore
+
+    data = loads(raw_data)
+    buyers = data.get("buyers") if isinstance(data, dict) else data
+    if not isinstance(buyers, list):
+        frappe.throw(_("buyers must be a list"))  # type: ignore
+
+    return prewarm_buyers(buyers)
+
+
+@frappe.whitelist()
+def get_buyer_details(tin):
+    """BuyerDetails a trip with this rider TIN is invoiced with; empty for B2C"""
+    frappe.has_permission("EIMS Buyer", "read", throw=True)  # type: ignore
+
+    return get_buyer(tin)
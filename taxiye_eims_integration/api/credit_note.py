@@ -0,0 +1,66 @@
+import frappe
+from frappe import _  # type: ignore
+from taxiye_eims_integration.utils.serialization import loads
+from taxiye_eims_integration.utils.credit_notes import (
+    MAX_INLINE_SIZE,
+    register_credit_notes,
+    validate_requests,
+)
+
+
+@frappe.whitelist()
+def create_credit_note(invoice_id=None, irn=None, amount=None, reason=None, request_id=None):
+    """Issue a credit note against one invoice; without amount the invoice is cancelled"""
+    frappe.has_permission("Trip Invoice", "create", throw=True)  # type: ignore
+
+    valid, errors = validate_requests(
+        [{"invoice_id": invoice_id, "irn": irn, "amount": amount, "reason": reason, "request_id": request_id}]
+    )
+    if errors:
+        frappe.throw(_(errors[0]["error"]))  # type: ignore
+
+    result = register_credit_notes(valid)[0]
+    if result["status"] == "failed":
+        # credited by a concurrent request since it was validated
+        frappe.throw(_(result["error"]))  # type: ignore
+    if result["status"] == "queued":
+        frappe.local.response.http_status_code = 202  # type: ignore
+    return result
+
+
+@frappe.whitelist()
+def create_credit_notes():
+    """Issue credit notes in bulk.
+
+    Body: {"credit_notes": [{"invoice_id" | "irn": ..., "amount": ..., "reason": ..., "request_id": ...}, ...]}
+    Invalid entries are reported by index; the rest are registered in one
+    background job unless the request is small.
+    """
+    frappe.has_permission("Trip Invoice", "create", throw=True)  # type: ignore
+
+    raw_data = frappe.request.get_data(as_text=True)  # type: ignore
+    if not raw_data:
+        frappe.throw(_("Empty request body"))  # type: ignore
+
+    data = loads(raw_data)
+    requests = data.get("credit_notes") if isinstance(data, dict) else data
+    if not isinstance(requests, list):
+        frappe.throw(_("credit_notes must be a list"))  # type: ignore
+
+    valid, errors = validate_requests(requests)
+    if len(valid) <= MAX_INLINE_SIZE:
+        return {"status": "success", "results": register_credit_notes(valid), "errors": errors}
+
+    # only the accepted requests go to the job; it re-reads the invoices
+    accepted = [
+        {"invoice_id": original.name, "amount": amount, "reason": reason, "request_id": request_id}
+        for original, amount, reason, request_id in valid
+    ]
+    job = frappe.enqueue(  # type: ignore
+        "taxiye_eims_integration.utils.credit_notes.process_credit_notes",
+        queue="long",
+        timeout=60 * 60,
+        requests=accepted,
+    )
+    frappe.local.response.http_status_code = 202  # type: ignore
+    return {"status": "queued", "job_id": job.id if job else None, "accepted": len(accepted), "errors": errors}
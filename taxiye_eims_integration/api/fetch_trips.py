@@ -2,36 +2,15 @@ import frappe
 from frappe import _  # type: ignore
 from frappe.utils import now_datetime  # type: ignore
 import json
-import re
 from taxiye_eims_integration.utils.date import safe_format_posting_date
-from frappe.utils.password import get_decrypted_password # type: ignore
+from taxiye_eims_integration.utils.normalization import (
+    clean_tin_no,
+    clean_phone,
+    normalize_settings_tin,
+)
+from taxiye_eims_integration.utils.seller_details import DEFAULT_TIN, build_seller_details
+from taxiye_eims_integration.utils.settings import get_settings
 
-#clean TIN Number
-def clean_tin_no(tin):
-    """Clean and format the provided tax identification number."""
-    if not tin:
-        return ""
-
-    tinClean = tin.strip().replace("-", "").replace(" ", "")
-    if len(tinClean) < 9 or len(tinClean) > 12:
-        return ""
-
-    return tinClean
-
-#clean phone number
-def clean_phone(phone):
-    """Clean and format phone number with Ethiopian country code."""
-    if not phone:
-        return ""
-    
-    # Remove all non-numeric characters
-    cleaned = re.sub(r'\D', '', phone)
-    
-    # Add Ethiopian country code if missing
-    if not cleaned.startswith('251'):
-        cleaned = '251' + cleaned
-    
-    return '+' + cleaned
 #GET passenger(rider) information
 def get_rider_details(payload) -> dict:
     """Extract rider details"""
@@ -53,7 +32,11 @@ def get_rider_details(payload) -> dict:
 #item details
 def get_item_details(payload): 
     """Extract item and value details for Trip Invoice"""
-    commission_amount=float(payload.base_fare*payload.commission_rate)
+    if payload.commission_rate is None:
+        # only the amount was sent (push payloads, backfills)
+        commission_amount=float(payload.commission_amount)
+    else:
+        commission_amount=float(payload.base_fare*payload.commission_rate)
     amount=float(payload.base_fare+commission_amount)
     tax=float((payload.base_fare+commission_amount)*0.15)
     total_payment=float(payload.base_fare+commission_amount+tax)
@@ -69,7 +52,7 @@ def get_item_details(payload):
             "TotalLineAmount": total_payment,
             "Unit": "PCs",
             "Discount": 0,
-            "UnitPrice": float(payload.commission_rate),
+            "UnitPrice": float(payload.commission_rate or 0),
             "NatureOfSupplies": "goods",
         }
 
@@ -86,52 +69,22 @@ def get_item_details(payload):
 #get taxi provider information
 def get_tax_provider_details(payload):
     """Extract taxi provider details"""
-    settings = frappe.get_single("EIMS Settings")  
-    tax_provider_details = {
-        "City": settings.city or None,  
-        "Email": settings.email,  
-        "LegalName": settings.legalname,  
-        "Locality": settings.locality,  
-        "Phone": "+251" + re.sub(r'\D', '', settings.phone), # remove non-numeric characters and prefex with +251. 
-        "Region": settings.region,  
-        "SubCity": settings.subcity, 
-        "Wereda": settings.woreda,
-        "Tin": clean_tin_no(get_decrypted_password("EIMS Settings", "EIMS Settings", "tin")),
-        "VatNumber": get_decrypted_password("EIMS Settings", "EIMS Settings", "vatnumber") or None, 
-    }
-
-    return tax_provider_details
+    return build_seller_details(get_settings())
 
 #get driver information
 def get_driver_details():
-    """Extract driver details"""
-    try:
-        settings = frappe.get_single("EIMS Settings")
-    except frappe.DoesNotExistError:
-        frappe.throw(
-            _("EIMS Settings are not configured. Please go to 'EIMS Settings' and save your credentials before submitting an invoice."),
-            title="Configuration Missing"
-        )
+    """Extract the EIMS login credentials
+
+    Invoice and receipt bodies take get_seller_details() and
+    get_receipt_seller(), without the credentials.
+    """
+    settings = get_settings()
     driver_details = {
-        "city": settings.city,  
-        "email": settings.email,  
-        "housenumber": settings.housenumber,  
-        "legalname": settings.legalname,  
-        "locality": settings.locality,  
-        "phone": clean_phone(settings.phone), 
-        "region": settings.region,  
-        "woreda": settings.woreda,
-        "subcity": settings.subcity,
-        "systemtype": settings.systemtype,
-        "tin": clean_tin_no(get_decrypted_password("EIMS Settings", "EIMS Settings", "tin")) or "0079140416",
-        "seller_tin": clean_tin_no(get_decrypted_password("EIMS Settings", "EIMS Settings", "seller_tin")) or "0079140416",
-        "vatnumber": get_decrypted_password("EIMS Settings", "EIMS Settings", "vatnumber") or None,
-        "systemnumber": get_decrypted_password("EIMS Settings", "EIMS Settings", "systemnumber") or None,
-        "client_id": get_decrypted_password("EIMS Settings", "EIMS Settings", "client_id"),
-        "client_secret": get_decrypted_password("EIMS Settings", "EIMS Settings", "client_secret"),
-        "api_key": get_decrypted_password("EIMS Settings", "EIMS Settings", "api_key"),
-        "mor_base_url": settings.mor_base_url or "http://core.mor.gov.et",
-    
+        "tin": normalize_settings_tin(settings.tin) or DEFAULT_TIN,
+        "client_id": settings.client_id,
+        "client_secret": settings.client_secret,
+        "api_key": settings.api_key,
+        "mor_base_url": settings.mor_base_url,
     }
     return driver_details
     
@@ -149,7 +102,7 @@ def get_last_trip_invoice(taxi_provider_tin: str):
         return frappe.get_doc("Trip Invoice", last_txn[0]["name"])  # ✅ dict access
     return None
 
-def get_document_detail(payload, document_number):
+def get_document_detail(payload, document_number, document_type="INV"):
     date = payload.date
     time = payload.time
 
@@ -159,7 +112,7 @@ def get_document_detail(payload, document_number):
     return {
         "DocumentNumber": document_number,
         "Date": f"{date_str}T{time_str}",
-        "Type": "INV",
+        "Type": document_type,
     }
 
 
@@ -170,10 +123,11 @@ def get_payment_detail():
     }
 
 
-def get_reference_detail(previous_irn):
+def get_reference_detail(previous_irn, related_irn=None):
     return {
         "PreviousIrn": previous_irn,
-        "RelatedDocument": None,  # replace with actual doc ref if required
+        # IRN of the invoice a credit note is issued against
+        "RelatedDocument": related_irn,
     }
 
 def get_transaction_type(transaction_type):
@@ -186,9 +140,6 @@ def get_source_system_detail(payload, invoice_counter):
     return {
         # "CashierName": payload.taxi_provider_name,
         "InvoiceCounter": invoice_counter,
-        "SystemNumber": get_decrypted_password(
-            "EIMS Settings", "EIMS Settings", "systemnumber"
-        )
-        or None,  # type: ignore
+        "SystemNumber": get_settings().systemnumber or None,
         "SystemType": "POS",
     }
\ No newline at end of file
@@ -1,76 +1,60 @@
 import time
-import requests
 import frappe
 from frappe import _  # type: ignore
-import json
-import re
+from taxiye_eims_integration.utils.serialization import loads
 from taxiye_eims_integration.api.fetch_trips import (
     get_rider_details,
     get_document_detail,
     get_payment_detail,
     get_reference_detail,
     get_item_details,
-    get_driver_details,
     get_transaction_type,   
+    get_source_system_detail,
 )
 
 from taxiye_eims_integration.utils.auth import (
     extract_406_data, 
-    get_eims_headers_and_url, 
     parse_ack_date,
-    get_source_system_detail,
 )
+from taxiye_eims_integration.utils.seller_details import get_seller_details
+from taxiye_eims_integration.utils.eims_client import (
+    EIMSRateLimited,
+    EIMSSubmissionError,
+    get_retry_after,
+    post_journaled,
+)
+from taxiye_eims_integration.utils.eims_outbox import enqueue_submission, get_deferral_seconds
+from taxiye_eims_integration.utils.metrics import inc
+from taxiye_eims_integration.utils.submission_journal import get_acknowledgement, journal_key
+from taxiye_eims_integration.utils.archive import get_trip_invoice
+from taxiye_eims_integration.utils.buyers import get_buyer
+from taxiye_eims_integration.utils.in_flight import track
 from taxiye_eims_integration.utils.eims_invoice import (
+    cache_invoice_for_receipt,
     save_eims_invoice, 
     temporary_eims_invoice, 
     get_last_eims_invoice, 
     )
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional
 
 # Maximum retries for API submission
 max_retries = 5
 
-class InvoicePayload(BaseModel):
-    """Invoice payload model"""
-    trip_id: str
-    invoice_number: str
-    taxi_provider_name: str
-    taxi_provider_tin: str
-    taxi_provider_address: str
-    taxi_provider_phone: str
-    rider_phone: Optional[str] = None
-    rider_name: Optional[str] = None
-    rider_tin: Optional[str] = None
-    date: str = Field(..., description="Invoice date in YYYY-MM-DD format")
-    time: str = Field(..., description="Invoice time in HH:MM:SS format")
-    description: str
-    reference: str
-    base_fare: float
-    commission_amount: float
-    tax: float
-    amount: float
-    total_payment: float
-    
-    # Date validation
-    @field_validator("date")
-    @classmethod
-    def validate_date(cls, v: str) -> str:
-        if not re.match(r"^\d{4}-\d{2}-\d{2}$", v):
-            raise ValueError("date must be in YYYY-MM-DD format")
-        return v
-
-    # Time validation
-    @field_validator("time")
-    @classmethod
-    def validate_time(cls, v: str) -> str:
-        if not re.match(r"^\d{2}:\d{2}:\d{2}$", v):
-            raise ValueError("time must be in HH:MM:SS format")
-        return v
-
-
-def prepare_invoice_request_body(payload, last_doc):
-    """Prepare payload for EIMS API submission"""
+
+def __getattr__(name):
+    # InvoicePayload moved to api.schemas; load it (and pydantic) on first use
+    if name == "InvoicePayload":
+        from taxiye_eims_integration.api.schemas import InvoicePayload
+
+        return InvoicePayload
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def prepare_invoice_request_body(payload, last_doc, document_type="INV", related_irn=None):
+    """Prepare payload for EIMS API submission
+
+    Credit notes (document_type "CRE") take the next numbers of the same
+    chain and reference the credited invoice through related_irn.
+    """
 
     if last_doc:
         document_number = int(last_doc.document_number) + 1
@@ -82,20 +66,22 @@ def prepare_invoice_request_body(payload, last_doc):
         previous_irn = None
 
     item_list, value_details = get_item_details(payload)
-    rider = get_rider_details(payload)
-    driver = get_driver_details()
+    # corporate riders registered as EIMS Buyer get a B2B invoice
+    buyer = get_buyer(payload.rider_tin) if payload.rider_tin else None
+    rider = buyer or get_rider_details(payload)
+    seller = get_seller_details()
     payment_info = get_payment_detail()
 
     payload_data = {
         "BuyerDetails": rider,
-        "DocumentDetails": get_document_detail(payload, document_number),
+        "DocumentDetails": get_document_detail(payload, document_number, document_type),
         "ItemList": item_list,
         "PaymentDetails": payment_info,
-        "ReferenceDetails": get_reference_detail(previous_irn),
-        "SellerDetails": driver,
+        "ReferenceDetails": get_reference_detail(previous_irn, related_irn),
+        "SellerDetails": seller,
         "SourceSystem": get_source_system_detail(payload, invoice_counter),  
         "ValueDetails": value_details,
-        "TransactionType": get_transaction_type("B2C"),
+        "TransactionType": get_transaction_type("B2B" if buyer else "B2C"),
         "Version": "1",
     }
 
@@ -120,14 +106,10 @@ def extract_doc_no_and_invoice_count(data):
         raise frappe.ValidationError(f"406 Error: {data}")
 
 
-def save_invoice_for_internal_reference(last_doc, data, payload):
-    """Save EIMS invoice response into Trip Invoice DocType"""
+def get_invoice_values(last_doc, data, payload):
+    """Map an EIMS acknowledgement and its payload to Trip Invoice values"""
 
     body = data.get("body", {})
-    irn = body.get("irn")
-    signed_qr = body.get("signedQR")
-    acknowledged_date = body.get("acknowledged_date")
-    signed_invoice = body.get("signedInvoice")
 
     if last_doc:
         document_number = int(last_doc.document_number) + 1
@@ -138,32 +120,43 @@ def save_invoice_for_internal_reference(last_doc, data, payload):
         invoice_counter = 1
         previous_irn = None
 
-    ackDate_clean = parse_ack_date(acknowledged_date)
-    invoice = save_eims_invoice(
-        document_number=document_number,
-        invoice_counter=invoice_counter,
-        irn=irn,
-        previous_irn=previous_irn,
-        tax=payload.tax,
-        amount=payload.amount,
-        total_payment=payload.total_payment,
-        status="Completed",
-        signed_qr=signed_qr,
-        acknowledged_date=ackDate_clean,
-        signed_invoice=signed_invoice,
-        taxi_provider_name=payload.taxi_provider_name,
-        taxi_provider_tin=payload.taxi_provider_tin,
-        taxi_provider_phone=payload.taxi_provider_phone,
-        date=payload.date,
-        time=payload.time,
-        reference=payload.reference,
-        description=payload.description,
-        base_fare=payload.base_fare,
-        commission_amount=payload.commission_amount,
-        invoice_number=payload.invoice_number,
-        rider_name=payload.rider_name,
-        rider_phone=payload.rider_phone,
-    )
+    return {
+        "document_number": document_number,
+        "invoice_counter": invoice_counter,
+        "irn": body.get("irn"),
+        "previous_irn": previous_irn,
+        "tax": payload.tax,
+        "amount": payload.amount,
+        "total_payment": payload.total_payment,
+        "status": "Completed",
+        "signed_qr": body.get("signedQR"),
+        "acknowledged_date": parse_ack_date(body.get("acknowledged_date")),
+        "signed_invoice": body.get("signedInvoice"),
+        "taxi_provider_name": payload.taxi_provider_name,
+        "taxi_provider_tin": payload.taxi_provider_tin,
+        "taxi_provider_phone": payload.taxi_provider_phone,
+        "date": payload.date,
+        "time": payload.time,
+        "reference": payload.reference,
+        "description": payload.description,
+        "base_fare": payload.base_fare,
+        "commission_amount": payload.commission_amount,
+        "invoice_number": payload.invoice_number,
+        "rider_name": payload.rider_name,
+        "rider_phone": payload.rider_phone,
+        # credit notes are sent B2B again when the original was
+        "rider_tin": payload.rider_tin,
+        "trip_id": payload.trip_id,
+    }
+
+
+def save_invoice_for_internal_reference(last_doc, data, payload):
+    """Save EIMS invoice response into Trip Invoice DocType"""
+
+    values = get_invoice_values(last_doc, data, payload)
+    invoice = save_eims_invoice(**values)
+    # receipts usually follow within seconds; let them skip the database
+    cache_invoice_for_receipt(invoice)
 
     return {
         "status": "success",
@@ -184,64 +177,198 @@ def save_invoice_for_internal_reference(last_doc, data, payload):
             "tax": payload.tax,
             "base_fare": payload.base_fare,
             "commission_amount": payload.commission_amount,
-            "previous_irn": previous_irn,
-            "irn": irn,
-            "signed_qr": signed_qr,
-            "signed_invoice": signed_invoice,
-            "acknowledged_date": ackDate_clean,
-            "document_number": document_number,
-            "invoice_counter": invoice_counter,
+            "previous_irn": values["previous_irn"],
+            "irn": values["irn"],
+            "signed_qr": values["signed_qr"],
+            "signed_invoice": values["signed_invoice"],
+            "acknowledged_date": values["acknowledged_date"],
+            "document_number": values["document_number"],
+            "invoice_counter": values["invoice_counter"],
             "status": "Succeed",
         },
     }
 
 
-@frappe.whitelist()
-def create_invoice(max_retries=5):
+def get_acknowledged_last_doc(sequence):
+    """The last_doc an acknowledged request was chained to, from its journaled numbers"""
+    return frappe._dict(  # type: ignore
+        document_number=int(sequence["DocumentDetails.DocumentNumber"]) - 1,
+        invoice_counter=int(sequence["SourceSystem.InvoiceCounter"]) - 1,
+        irn=sequence["ReferenceDetails.PreviousIrn"],
+    )
 
-    headers, url = get_eims_headers_and_url()
-    submit_url = f"{url}/register"
 
-    # Fetch last invoice
-    last_doc = get_last_eims_invoice()
+def register_invoice(
+    validated_data,
+    last_doc,
+    max_retries=5,
+    document_type="INV",
+    related_irn=None,
+    wait_when_rate_limited=False,
+    journal_reference=None,
+):
+    """Register a validated invoice with EIMS, chained after `last_doc`.
 
-    raw_data = frappe.request.get_data(as_text=True)  # type: ignore
-    if not raw_data:
-        frappe.throw(_("Empty request body"))  # type: ignore
+    Resyncs the sequence on 406/417. When rate limited it raises
+    EIMSRateLimited, so web and job workers never sleep; the caller defers
+    the invoice to the outbox. Only standalone processes (the backfill
+    command) pass wait_when_rate_limited to back off in place. Returns
+    the EIMS response data and the last_doc the accepted invoice was chained
+    to; persisting it is left to the caller. An invoice EIMS already
+    acknowledged (e.g. before a timeout) is replayed from the journal; it
+    is found by trip_id, or by `journal_reference` when given.
+    """
+    payload = prepare_invoice_request_body(validated_data, last_doc, document_type, related_irn)
+    key = journal_key("register", payload, journal_reference or validated_data.trip_id)
 
-    # Parse JSON
-    data = json.loads(raw_data)
-
-    # Validate incoming payload
-    validated_data = InvoicePayload(**data)
-
-    payload = prepare_invoice_request_body(validated_data, last_doc)
+    ack = get_acknowledgement(key)
+    if ack:
+        inc("eims_journal_replays_total", path="register")
+        return ack["response"], get_acknowledged_last_doc(ack["sequence"])
 
+    last_error = None
     for attempt in range(1, max_retries + 1):
-        response = requests.post(submit_url, json=payload, headers=headers)
-        data = response.json()
+        response, data = post_journaled("register", payload, key)
 
         if data.get("statusCode") in (406, 417):
             # Sequence error: create temporary invoice and retry
+            inc("eims_invoice_retries_total", reason=f"sequence_{data.get('statusCode')}")
+            inc("eims_sequence_resyncs_total")
             latest_doc_number, latest_invoice_counter = (
                 extract_doc_no_and_invoice_count(data)
             )
             temporary_eims_invoice(latest_doc_number, latest_invoice_counter)
             last_doc = get_last_eims_invoice()
-            payload = prepare_invoice_request_body(validated_data, last_doc)  # type: ignore
+            payload = prepare_invoice_request_body(validated_data, last_doc, document_type, related_irn)  # type: ignore
             # prevalidate_invoice_payload(payload)
+            last_error = f"Sequence error {data.get('statusCode')}: {data.get('body')}"
             continue
 
         elif data.get("message") == "Too many requests!":
             # Rate limit: exponential backoff
+            inc("eims_invoice_retries_total", reason="rate_limited")
+            if not wait_when_rate_limited:
+                # the outbox backs off on its own deferral count; Retry-After only sets a minimum
+                raise EIMSRateLimited(
+                    "EIMS rate limit: Too many requests!", payload, retry_after=get_retry_after(response)
+                )
             delay = min(2**attempt, 10)  # max 10 seconds
-            print(f"Rate limited. Retrying in {delay} seconds...")  # type: ignore
             time.sleep(delay)
+            last_error = "Too many requests!"
             continue
 
         elif response.status_code == 200 and data.get("statusCode") == 200:
             # Success
-            result = save_invoice_for_internal_reference(last_doc, data, validated_data)
-            return result
-    else:
-        raise Exception("Failed to submit invoice: Too many requests repeatedly.")
+            return data, last_doc
+
+        last_error = f"HTTP {response.status_code}: {response.text}"
+        inc("eims_invoice_retries_total", reason="http_error")
+
+    inc("eims_submissions_total", type="invoice", outcome="failed")
+    raise EIMSSubmissionError(
+        f"Failed to submit invoice after {max_retries} attempts: {last_error}", payload
+    )
+
+
+def get_existing_invoice_result(invoice):
+    """Response for an invoice that was registered and saved earlier"""
+    return {
+        "status": "success",
+        "message": "Invoice was already registered",
+        "data": {
+            "invoice_id": invoice.name,
+            "trip_id": invoice.trip_id,
+            "previous_irn": invoice.previous_irn,
+            "irn": invoice.irn,
+            "signed_qr": invoice.signed_qr,
+            "signed_invoice": invoice.signed_invoice,
+            "acknowledged_date": invoice.acknowledged_date,
+            "document_number": invoice.document_number,
+            "invoice_counter": invoice.invoice_counter,
+            "status": "Succeed",
+        },
+    }
+
+
+def submit_invoice(validated_data, max_retries=5):
+    """Register a validated invoice with EIMS and save it as a Trip Invoice"""
+
+    # A retry of a trip that is already registered gets the saved invoice back
+    existing = get_trip_invoice(trip_id=validated_data.trip_id) if validated_data.trip_id else None
+    if existing:
+        return get_existing_invoice_result(existing)
+
+    # in flight from before the first attempt until saved: a worker stopped
+    # in between leaves it to the recovery pass
+    with track("Invoice", validated_data.model_dump()):
+        # Fetch last invoice
+        last_doc = get_last_eims_invoice()
+
+        data, last_doc = register_invoice(validated_data, last_doc, max_retries)
+        result = save_invoice_for_internal_reference(last_doc, data, validated_data)
+    inc("eims_submissions_total", type="invoice", outcome="success")
+    return result
+
+
+@frappe.whitelist()
+def create_invoice(max_retries=5):
+
+    raw_data = frappe.request.get_data(as_text=True)  # type: ignore
+    if not raw_data:
+        frappe.throw(_("Empty request body"))  # type: ignore
+
+    # Parse JSON
+    data = loads(raw_data)
+
+    # Validate incoming payload
+    from taxiye_eims_integration.api.schemas import InvoicePayload
+
+    validated_data = InvoicePayload(**data)
+
+    try:
+        return submit_invoice(validated_data, int(max_retries))
+    except EIMSRateLimited as e:
+        # retried by the outbox once EIMS accepts requests again; poll
+        # api.lookup.get_submission_status for the result
+        frappe.db.rollback()  # type: ignore
+        outbox = enqueue_submission(
+            "Invoice",
+            validated_data.model_dump(),
+            request_body=e.request_body,
+            error=str(e),
+            reference_id=validated_data.trip_id,
+            deferred=True,
+            retry_after=e.retry_after,
+        )
+        inc("eims_submissions_total", type="invoice", outcome="deferred")
+        frappe.local.response.http_status_code = 202  # type: ignore
+        return {
+            "status": "pending",
+            "message": "EIMS is rate limiting submissions; the invoice will be registered shortly",
+            "data": {
+                "outbox_id": outbox.name,
+                "trip_id": validated_data.trip_id,
+                "retry_after": get_deferral_seconds(outbox.deferrals or 1, e.retry_after),
+            },
+        }
+    except EIMSSubmissionError as e:
+        # Keep the payload so the outbox scheduler retries it instead of the caller
+        frappe.db.rollback()  # type: ignore
+        outbox = enqueue_submission(
+            "Invoice",
+            validated_data.model_dump(),
+            request_body=e.request_body,
+            error=str(e),
+            reference_id=validated_data.trip_id,
+        )
+        inc("eims_submissions_total", type="invoice", outcome="queued")
+        frappe.local.response.http_status_code = 202  # type: ignore
+        return {
+            "status": "queued",
+            "message": "EIMS did not accept the invoice yet; it has been queued for retry",
+            "data": {
+                "outbox_id": outbox.name,
+                "invoice_number": validated_data.invoice_number,
+                "trip_id": validated_data.trip_id,
+            },
+        }
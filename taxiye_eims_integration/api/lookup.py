@@ -0,0 +1,83 @@
+import frappe
+from frappe import _  # type: ignore
+from taxiye_eims_integration.utils.archive import get_trip_invoice, get_trip_receipts
+
+
+@frappe.whitelist()
+def get_invoice(invoice_id=None, irn=None, trip_id=None):
+    """Return a Trip Invoice and its receipts whether it is hot or archived"""
+    frappe.has_permission("Trip Invoice", "read", throw=True)  # type: ignore
+
+    invoice = get_trip_invoice(name=invoice_id, irn=irn, trip_id=trip_id)
+    if not invoice:
+        frappe.throw(_("Trip Invoice not found"), frappe.DoesNotExistError)  # type: ignore
+
+    invoice.receipts = get_trip_receipts(invoice.name)
+    return invoice
+
+
+# EIMS Outbox status -> status reported to the caller
+SUBMISSION_STATUSES = {
+    "Pending": "pending",
+    "Processing": "processing",
+    "Sent": "completed",
+    "Failed": "failed",
+}
+
+
+@frappe.whitelist()
+def get_submission_status(outbox_id=None, reference_id=None):
+    """Status and, once registered, result of a queued or deferred submission.
+
+    Pass the outbox_id returned with a "pending"/"queued" response, or the
+    trip id (invoices) / invoice id (receipts) it was submitted with.
+    """
+    frappe.has_permission("Trip Invoice", "read", throw=True)  # type: ignore
+
+    if outbox_id:
+        outbox = frappe.db.get_value(  # type: ignore
+            "EIMS Outbox",
+            outbox_id,
+            ["name", "submission_type", "status", "attempts", "next_attempt_at", "result_name", "last_error"],
+            as_dict=True,
+        )
+    elif reference_id:
+        outbox = frappe.db.get_value(  # type: ignore
+            "EIMS Outbox",
+            {"reference_id": reference_id},
+            ["name", "submission_type", "status", "attempts", "next_attempt_at", "result_name", "last_error"],
+            as_dict=True,
+            order_by="creation desc",
+        )
+    else:
+        frappe.throw(_("Pass outbox_id or reference_id"))  # type: ignore
+
+    if not outbox:
+        # registered right away, without going through the outbox
+        invoice = reference_id and get_trip_invoice(trip_id=reference_id, fields=["name"])
+        if invoice:
+            return {"status": "completed", "submission_type": "Invoice", "result": get_invoice(invoice.name)}
+        frappe.throw(_("Submission not found"), frappe.DoesNotExistError)  # type: ignore
+
+    status = SUBMISSION_STATUSES[outbox.status]
+    response = {
+        "status": status,
+        "submission_type": outbox.submission_type,
+        "outbox_id": outbox.name,
+        "attempts": outbox.attempts,
+    }
+    if status == "pending":
+        response["next_attempt_at"] = outbox.next_attempt_at
+    elif status == "failed":
+        response["error"] = outbox.last_error
+    elif status == "completed" and outbox.result_name:
+        if outbox.submission_type == "Receipt":
+            response["result"] = frappe.db.get_value(  # type: ignore
+                "Trip Receipt",
+                outbox.result_name,
+                ["name", "invoice_id", "irn", "rrn", "status", "receipt_counter", "total_payment", "tax"],
+                as_dict=True,
+            )
+        else:
+            response["result"] = get_invoice(outbox.result_name)
+    return response
@@ -0,0 +1,11 @@
+import frappe
+from werkzeug.wrappers import Response
+from taxiye_eims_integration.utils.metrics import render
+
+
+@frappe.whitelist()
+def metrics():
+    """Prometheus scrape target: EIMS integration metrics in the text format"""
+    frappe.only_for("System Manager")  # type: ignore
+
+    return Response(render(), mimetype="text/plain; version=0.0.4", charset="utf-8")
@@ -1,68 +1,57 @@
-import json
-import random
 import frappe
-import requests
-import datetime
+from frappe import _  # type: ignore
+from taxiye_eims_integration.utils.serialization import loads
 from taxiye_eims_integration.api.fetch_trips import (
     get_payment_detail,
-    get_driver_details,
     clean_tin_no
 )
-from taxiye_eims_integration.utils.auth import get_eims_headers_and_url
-from taxiye_eims_integration.utils.eims_receipt import save_eims_receipt
-from pydantic import BaseModel, Field, validator
-from typing import Optional
-
-
-class PaymentModel(BaseModel):
-    total_payment: float = Field(..., description="total passenger Payment amount")
-    amount: float = Field(..., description=" amount before tax")
-    tax: float = Field(..., description="Tax amount")
-    base_fare: float = Field(..., description="Base fare amount")
-    commission_amount: float = Field(..., description="Commission amount")
-    date: datetime.date = Field(..., description="Payment date in YYYY-MM-DD format")
-    method: str = Field(..., description="Payment method")
-    transactionNumber: Optional[str] = Field(None, alias="transactionNumber", description="Transaction reference number")
-    accountNumber: Optional[str] = Field(None, alias="accountNumber", description="Account number")
-
-class ReceiptModel(BaseModel):
-    invoice_id: str = Field(..., description="Unique invoice ID")
-    irn: str = Field(..., description="Invoice Reference Number")
-    CollectorName: Optional[str] = Field(None, description="Collector Name")
-    status: str 
-    signer_qr: Optional[str] = Field(None, description="Signer QR code")
-    payment: PaymentModel
+from taxiye_eims_integration.utils.eims_client import EIMSRateLimited, EIMSSubmissionError, post_journaled
+from taxiye_eims_integration.utils.eims_outbox import enqueue_submission
+from taxiye_eims_integration.utils.metrics import inc
+from taxiye_eims_integration.utils.submission_journal import get_acknowledgement, journal_key
+from taxiye_eims_integration.utils.eims_invoice import get_invoice_for_receipt
+from taxiye_eims_integration.utils.in_flight import track
+from taxiye_eims_integration.utils.seller_details import get_receipt_seller
+from taxiye_eims_integration.utils.eims_receipt import (
+    save_eims_receipt,
+    get_next_receipt_counter,
+)
 
 
-@frappe.whitelist()  # type: ignore
-def create_receipt():
-    raw_data = frappe.request.get_data()  # type: ignore
-    if not raw_data:
-        frappe.throw(_("Empty request body"))  # type: ignore
+def __getattr__(name):
+    # the request models moved to api.schemas; load them (and pydantic) on first use
+    if name in ("PaymentModel", "ReceiptModel"):
+        from taxiye_eims_integration.api import schemas
 
-    data = json.loads(raw_data)
+        return getattr(schemas, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    # Validate incoming payload
-    payload = ReceiptModel(**data)
 
-    driver_info = get_driver_details()
+def submit_receipt(payload, writer=None):
+    """Register a validated receipt with EIMS and save it as a Trip Receipt
 
-    invoices = frappe.get_list(  # type: ignore
-        "Trip Invoice",
-        filters={"name": payload.invoice_id},
-        fields=["*"],
-    )
-    invoice = None
+    Batch callers pass a utils.write_buffer.TripWriteBuffer as `writer` to
+    coalesce the Trip Receipt inserts; otherwise it is saved and committed here.
+    """
+    # buffered rows are covered by the write buffer's own journal once added
+    with track("Receipt", payload.model_dump(mode="json", by_alias=True)):
+        return register_receipt(payload, writer)
+
+
+def register_receipt(payload, writer=None):
+    """The EIMS call and save behind submit_receipt"""
+    driver_info = get_receipt_seller()
+
+    invoice = get_invoice_for_receipt(payload.invoice_id)
 
     irn = None
     total_amount = 0
     tax_amount = 0
     document_number = None
-    if invoices:
-        invoice = invoices[0]
+    if invoice:
         irn = invoice.irn  # type: ignore
         total_amount = invoice.total_payment  # type: ignore
-        document_number = invoice.document_number  # type: ignore
+        document_number = str(invoice.document_number)  # type: ignore
         tax_amount = invoice.tax  # type: ignore
     collected_amount = payload.payment.amount + payload.payment.tax
 
@@ -73,9 +62,6 @@ def create_receipt():
     seller_tin= clean_tin_no(driver_info["seller_tin"])
     discount_amount = 0
 
-    receipt_counter = str(random.randint(10000, 99999))
-    manual_receipt_number = str(random.randint(10000, 99999))
-
     mode_of_payment = get_payment_detail()
 
     time_str = "00:00:00"
@@ -90,8 +76,9 @@ def create_receipt():
         "ReceiptType": "Sales Receipts",
         "Reason": "Payment for taxi service",
         "ReceiptDate": receipt_date_str,
-        "ReceiptCounter": str(receipt_counter),
-        "ManualReceiptNumber": str(manual_receipt_number),
+        # filled in below once the journal has been checked
+        "ReceiptCounter": None,
+        "ManualReceiptNumber": None,
         "SourceSystemType": "POS",
         "SourceSystemNumber": driver_info.get("systemnumber", ""),
         "ReceiptCurrency": "ETB",
@@ -120,14 +107,29 @@ def create_receipt():
         },
     }
 
-    headers, url = get_eims_headers_and_url()
-    submit_url = f"{url}/receipt/sales"
-    res = requests.post(submit_url, json=req_payload, headers=headers)
-
-    if res.status_code != 200:
-        frappe.throw(f"EIMS Receipt Submission Failed: {res.text}")  # type: ignore
+    key = journal_key("receipt/sales", req_payload, payload.invoice_id)
+    ack = get_acknowledgement(key)
+    if ack:
+        # EIMS acknowledged this receipt before (e.g. the call timed out here)
+        inc("eims_journal_replays_total", path="receipt/sales")
+        response_data = ack["response"]
+        receipt_counter = int(ack["sequence"]["ReceiptCounter"])
+        manual_receipt_number = ack["sequence"]["ManualReceiptNumber"]
+    else:
+        # Sequential counter shared by all workers; the manual receipt number
+        # mirrors it so both stay unique per receipt.
+        receipt_counter = get_next_receipt_counter()
+        manual_receipt_number = str(receipt_counter)
+        req_payload["ReceiptCounter"] = str(receipt_counter)
+        req_payload["ManualReceiptNumber"] = manual_receipt_number
+
+        res, response_data = post_journaled("receipt/sales", req_payload, key)
+
+        if res.status_code != 200:
+            inc("eims_receipt_failures_total", reason="http_error")
+            inc("eims_submissions_total", type="receipt", outcome="failed")
+            raise EIMSSubmissionError(f"EIMS Receipt Submission Failed: {res.text}", req_payload)
 
-    response_data = res.json()
     body = response_data.get("body", {})
     status = body.get("status")
     rrn = body.get("rrn")
@@ -137,7 +139,7 @@ def create_receipt():
     commission_amount = invoice.commission_amount if invoice else 0
     base_fare = invoice.base_fare if invoice else 0
     
-    save_eims_receipt(
+    values = dict(
         invoice_id=payload.invoice_id,  # Must be a valid Trip Invoice ID
         irn=irn,  # type: ignore
         rrn=rrn,
@@ -149,12 +151,21 @@ def create_receipt():
         base_fare=base_fare,
         status="Acknowledged",
         signer_qr=qr,
+        receipt_counter=receipt_counter,
+        manual_receipt_number=manual_receipt_number,
+    )
+    # a replayed receipt may already have been saved by the attempt that timed out
+    receipt_id = ack and frappe.db.get_value(  # type: ignore
+        "Trip Receipt", {"invoice_id": payload.invoice_id, "receipt_counter": receipt_counter}
     )
+    if not receipt_id:
+        receipt_id = writer.add(values) if writer else save_eims_receipt(**values).name
 
     result = {
         "status": "success",
         "message": "Receipt has been created successfully",
         "data": {
+            "receipt_id": receipt_id,
             "invoice_id": payload.invoice_id,
             "invoice_number": invoice.invoice_number if invoice else None,
             "taxi_provider_name": invoice.taxi_provider_name if invoice else None,
@@ -182,4 +193,45 @@ def create_receipt():
         },
     }
 
+    inc("eims_submissions_total", type="receipt", outcome="success")
     return result
+
+
+@frappe.whitelist()  # type: ignore
+def create_receipt():
+    raw_data = frappe.request.get_data()  # type: ignore
+    if not raw_data:
+        frappe.throw(_("Empty request body"))  # type: ignore
+
+    data = loads(raw_data)
+
+    # Validate incoming payload
+    from taxiye_eims_integration.api.schemas import ReceiptModel
+
+    payload = ReceiptModel(**data)
+
+    try:
+        return submit_receipt(payload)
+    except EIMSSubmissionError as e:
+        # Keep the payload so the outbox scheduler retries it instead of the caller
+        frappe.db.rollback()  # type: ignore
+        outbox = enqueue_submission(
+            "Receipt",
+            payload.model_dump(mode="json", by_alias=True),
+            request_body=e.request_body,
+            error=str(e),
+            reference_id=payload.invoice_id,
+            # shed by the rate budget or rate limited by EIMS: not an attempt
+            deferred=isinstance(e, EIMSRateLimited),
+            retry_after=getattr(e, "retry_after", None),
+        )
+        inc("eims_submissions_total", type="receipt", outcome="queued")
+        frappe.local.response.http_status_code = 202  # type: ignore
+        return {
+            "status": "queued",
+            "message": "EIMS did not accept the receipt yet; it has been queued for retry",
+            "data": {
+                "outbox_id": outbox.name,
+                "invoice_id": payload.invoice_id,
+            },
+        }
@@ -0,0 +1,74 @@
+import re
+import datetime
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional
+
+# Request models for the whitelisted endpoints. Kept apart from the api
+# modules so pydantic is only imported when a request is actually validated.
+
+
+class InvoicePayload(BaseModel):
+    """Invoice payload model"""
+    trip_id: str
+    invoice_number: str
+    taxi_provider_name: str
+    taxi_provider_tin: str
+    taxi_provider_address: str
+    taxi_provider_phone: str
+    rider_phone: Optional[str] = None
+    rider_name: Optional[str] = None
+    rider_tin: Optional[str] = None
+    date: str = Field(..., description="Invoice date in YYYY-MM-DD format")
+    time: str = Field(..., description="Invoice time in HH:MM:SS format")
+    description: str
+    reference: str
+    base_fare: float
+    commission_amount: float
+    tax: float
+    amount: float
+    total_payment: float
+    # Optional item / buyer details read while building the EIMS request body
+    commission_rate: Optional[float] = None
+    quantity: float = 1
+    line_number: Optional[int] = None
+    rider_city: Optional[str] = None
+    rider_email: Optional[str] = None
+    housenumber: Optional[str] = None
+    id_number: Optional[str] = None
+
+    # Date validation
+    @field_validator("date")
+    @classmethod
+    def validate_date(cls, v: str) -> str:
+        if not re.match(r"^\d{4}-\d{2}-\d{2}$", v):
+            raise ValueError("date must be in YYYY-MM-DD format")
+        return v
+
+    # Time validation
+    @field_validator("time")
+    @classmethod
+    def validate_time(cls, v: str) -> str:
+        if not re.match(r"^\d{2}:\d{2}:\d{2}$", v):
+            raise ValueError("time must be in HH:MM:SS format")
+        return v
+
+
+class PaymentModel(BaseModel):
+    total_payment: float = Field(..., description="total passenger Payment amount")
+    amount: float = Field(..., description=" amount before tax")
+    tax: float = Field(..., description="Tax amount")
+    base_fare: float = Field(..., description="Base fare amount")
+    commission_amount: float = Field(..., description="Commission amount")
+    date: datetime.date = Field(..., description="Payment date in YYYY-MM-DD format")
+    method: str = Field(..., description="Payment method")
+    transactionNumber: Optional[str] = Field(None, alias="transactionNumber", description="Transaction reference number")
+    accountNumber: Optional[str] = Field(None, alias="accountNumber", description="Account number")
+
+
+class ReceiptModel(BaseModel):
+    invoice_id: str = Field(..., description="Unique invoice ID")
+    irn: str = Field(..., description="Invoice Reference Number")
+    CollectorName: Optional[str] = Field(None, description="Collector Name")
+    status: str
+    signer_qr: Optional[str] = Field(None, description="Signer QR code")
+    payment: PaymentModel
@@ -0,0 +1,61 @@
+import frappe
+from frappe import _  # type: ignore
+from frappe.utils import add_days, get_datetime, getdate, now_datetime  # type: ignore
+from taxiye_eims_integration.utils.rate_budget import get_stats
+
+# Totals come from Trip Stats Rollup only, so a dashboard load costs the same
+# whatever the size of Trip Invoice / Trip Receipt. Invoice rows are split by
+# document_type: credit notes (CRE) are reported apart, not added to invoices.
+
+ROLLUP_FIELDS = [
+    "bucket_start",
+    "source",
+    "taxi_provider_tin",
+    "status",
+    "document_type",
+    "record_count",
+    "base_fare",
+    "commission_amount",
+    "amount",
+    "tax",
+    "total_payment",
+]
+
+
+@frappe.whitelist()
+def get_trip_stats(
+    granularity="Day", from_date=None, to_date=None, taxi_provider_tin=None, source=None, document_type=None
+):
+    """Return rollup rows between two dates (defaults to the last 7 days)."""
+    if granularity not in ("Hour", "Day"):
+        frappe.throw(_("granularity must be Hour or Day"))  # type: ignore
+
+    to_datetime = get_datetime(add_days(getdate(to_date or now_datetime()), 1))
+    from_datetime = get_datetime(from_date or add_days(to_datetime, -7))
+
+    filters = {
+        "bucket_type": granularity,
+        "bucket_start": ["between", [from_datetime, to_datetime]],
+    }
+    if taxi_provider_tin:
+        filters["taxi_provider_tin"] = taxi_provider_tin
+    if source:
+        filters["source"] = source
+    if document_type:
+        filters["document_type"] = document_type
+
+    rows = frappe.get_list(  # type: ignore
+        "Trip Stats Rollup",
+        filters=filters,
+        fields=ROLLUP_FIELDS,
+        order_by="bucket_start asc",
+        limit_page_length=0,
+    )
+    # buckets whose rows cancelled out after updates carry no information
+    return [row for row in rows if row.record_count]
+
+
+@frappe.whitelist()
+def get_rate_budget_stats():
+    """Shed and deferred EIMS calls per priority class since the counters were reset."""
+    return get_stats()
@@ -0,0 +1,28 @@
+import frappe
+from frappe import _  # type: ignore
+from taxiye_eims_integration.utils.vat_report import (
+    get_invoices_without_receipts,
+    get_month_range,
+    get_monthly_report,
+)
+
+
+@frappe.whitelist()
+def get_vat_report(month=None, taxi_provider_tin=None):
+    """Monthly VAT totals per provider and day (month as YYYY-MM, default the previous month)"""
+    frappe.has_permission("VAT Daily Summary", "read", throw=True)  # type: ignore
+
+    return get_monthly_report(month, taxi_provider_tin)
+
+
+@frappe.whitelist()
+def get_unreceipted_invoices(month=None, from_date=None, to_date=None, taxi_provider_tin=None, start=0, page_length=100):
+    """Registered invoices without an acknowledged receipt, a page at a time"""
+    frappe.has_permission("Trip Invoice", "read", throw=True)  # type: ignore
+
+    if not (from_date and to_date):
+        if from_date or to_date:
+            frappe.throw(_("Pass both from_date and to_date, or a month"))  # type: ignore
+        from_date, to_date = get_month_range(month)
+
+    return get_invoices_without_receipts(from_date, to_date, taxi_provider_tin, start, page_length)
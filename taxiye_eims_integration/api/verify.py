@@ -0,0 +1,43 @@
+import frappe
+from frappe import _  # type: ignore
+from taxiye_eims_integration.utils.serialization import loads
+from taxiye_eims_integration.utils.archive import get_trip_invoice
+from taxiye_eims_integration.utils.verification import get_key_set_version, verify_documents
+
+
+@frappe.whitelist()
+def verify_signatures():
+    """Verify signed QR / signed invoice tokens offline.
+
+    Body: {"documents": [{"irn": ..., "signed_qr": ..., "signed_invoice": ...}, ...]}
+    """
+    frappe.has_permission("Trip Invoice", "read", throw=True)  # type: ignore
+
+    raw_data = frappe.request.get_data(as_text=True)  # type: ignore
+    if not raw_data:
+        frappe.throw(_("Empty request body"))  # type: ignore
+
+    data = loads(raw_data)
+    documents = data.get("documents") if isinstance(data, dict) else data
+    if not isinstance(documents, list):
+        frappe.throw(_("documents must be a list"))  # type: ignore
+
+    return {
+        "status": "success",
+        "key_set_version": get_key_set_version(),
+        "data": verify_documents(documents),
+    }
+
+
+@frappe.whitelist()
+def verify_invoice(invoice_id=None, irn=None):
+    """Verify the signatures stored on a Trip Invoice (hot or archived)"""
+    frappe.has_permission("Trip Invoice", "read", throw=True)  # type: ignore
+
+    invoice = get_trip_invoice(name=invoice_id, irn=irn, fields=["name", "irn", "signed_qr", "signed_invoice"])
+    if not invoice:
+        frappe.throw(_("Trip Invoice not found"), frappe.DoesNotExistError)  # type: ignore
+
+    result = verify_documents([invoice])[0]
+    result["invoice_id"] = invoice.name
+    return result
@@ -0,0 +1,178 @@
+"""In-process mock of the EIMS API for load tests.
+
+Serves the endpoints the integration calls (/auth/login, /auth/refresh-token,
+/v1/register, /v1/receipt/sales) and enforces the invoice chain the way EIMS
+does: every invoice must carry the next document number and invoice counter
+and link to the last accepted IRN, otherwise the call is answered with a
+406 / 417 naming the last accepted numbers. Optional latency and a request
+rate limit reproduce production timing.
+
+Run standalone with:
+    python -m taxiye_eims_integration.benchmarks.eims_mock --port 8900
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockLedger:
+    """Chain state of the mock; the source of truth the load test reconciles against."""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, rate_limit_per_second=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_per_second = rate_limit_per_second
+        self.lock = threading.Lock()
+        self.document_number = 0
+        self.invoice_counter = 0
+        self.last_irn = None
+        # accepted invoices in chain order: (document_number, invoice_counter, irn, previous_irn)
+        self.accepted = []
+        self.rejected = {"406": 0, "417": 0, "rate_limited": 0}
+        self.receipts = 0
+        self._window = (0, 0)
+
+    def start_at(self, document_number, invoice_counter, irn):
+        """Continue an existing chain, e.g. the last Trip Invoice of the site under test."""
+        self.document_number = int(document_number or 0)
+        self.invoice_counter = int(invoice_counter or 0)
+        self.last_irn = irn or None
+
+    def wait(self):
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000)
+
+    def rate_limited(self):
+        if not self.rate_limit_per_second:
+            return False
+        now = int(time.time())
+        with self.lock:
+            window, used = self._window
+            used = used + 1 if window == now else 1
+            self._window = (now, used)
+            if used > self.rate_limit_per_second:
+                self.rejected["rate_limited"] += 1
+                return True
+        return False
+
+    def sequence_error(self, status_code):
+        # EIMS names the last numbers it accepted; the client resyncs on them
+        return {
+            "statusCode": status_code,
+            "body": [
+                {
+                    "errorMessage": [
+                        f"Document number is not valid, expected : {self.document_number}",
+                        f"Invoice counter is not valid, expected : {self.invoice_counter}",
+                    ]
+                }
+            ],
+        }
+
+    def register(self, body):
+        document = body.get("DocumentDetails") or {}
+        source = body.get("SourceSystem") or {}
+        previous_irn = (body.get("ReferenceDetails") or {}).get("PreviousIrn")
+
+        with self.lock:
+            if (
+                int(document.get("DocumentNumber") or 0) != self.document_number + 1
+                or int(source.get("InvoiceCounter") or 0) != self.invoice_counter + 1
+            ):
+                self.rejected["406"] += 1
+                return self.sequence_error(406)
+            # placeholders written on resync carry no IRN; only a wrong link is rejected
+            if previous_irn and self.last_irn and previous_irn != self.last_irn:
+                self.rejected["417"] += 1
+                return self.sequence_error(417)
+
+            self.document_number += 1
+            self.invoice_counter += 1
+            irn = hashlib.sha256(f"{self.document_number}:{self.last_irn}".encode()).hexdigest()
+            self.accepted.append((self.document_number, self.invoice_counter, irn, self.last_irn))
+            self.last_irn = irn
+
+        return {
+            "statusCode": 200,
+            "message": "Invoice registered",
+            "body": {
+                "irn": irn,
+                "signedQR": f"mock-qr-{irn}",
+                "signedInvoice": f"mock-invoice-{irn}",
+                "acknowledged_date": datetime.now().isoformat(timespec="seconds"),
+            },
+        }
+
+    def receipt(self, body):
+        with self.lock:
+            self.receipts += 1
+            rrn = f"RRN-{self.receipts}"
+        return {"statusCode": 200, "body": {"status": "Acknowledged", "rrn": rrn, "qr": f"mock-qr-{rrn}"}}
+
+
+def make_handler(ledger):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def reply(self, status, data):
+            raw = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            ledger.wait()
+
+            if self.path.endswith(("/auth/login", "/auth/refresh-token")):
+                return self.reply(
+                    200, {"data": {"accessToken": "mock-token", "refreshToken": "mock-refresh", "expiresIn": 3600}}
+                )
+            if ledger.rate_limited():
+                return self.reply(429, {"message": "Too many requests!"})
+            if self.path.endswith("/v1/register"):
+                return self.reply(200, ledger.register(body))
+            if self.path.endswith("/v1/receipt/sales"):
+                return self.reply(200, ledger.receipt(body))
+            return self.reply(404, {"message": f"Unknown path {self.path}"})
+
+    return Handler
+
+
+def start_mock(port=0, **ledger_options):
+    """Serve the mock on a background thread; returns (server, ledger, base_url)."""
+    ledger = MockLedger(**ledger_options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(ledger))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, ledger, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--rate-limit", type=int, default=0)
+    args = parser.parse_args()
+
+    server, ledger, url = start_mock(
+        args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate_limit_per_second=args.rate_limit
+    )
+    print(f"EIMS mock listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
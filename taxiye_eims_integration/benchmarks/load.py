@@ -0,0 +1,242 @@
+"""Load and soak test of invoice sequencing against the EIMS mock.
+
+Starts benchmarks.eims_mock, points EIMS Settings at it and runs N
+submitter processes calling submit_invoice concurrently, the way parallel
+create_invoice requests do. Afterwards the Trip Invoice chain written during
+the run is checked (gap-free, duplicate-free, previous_irn links) and
+reconciled with what the mock acknowledged, and throughput and latency
+percentiles are reported.
+
+It writes Trip Invoices, so it only runs on sites with `allow_tests` set:
+    bench --site <test-site> eims-load-test --processes 8 --duration 600
+
+Submissions take tokens from the interactive rate budget; raise
+eims_rate_limit_per_second on the test site to measure beyond it.
+"""
+
+import multiprocessing
+import time
+import frappe
+from frappe.utils import now_datetime  # type: ignore
+from taxiye_eims_integration.benchmarks.eims_mock import start_mock
+from taxiye_eims_integration.utils.auth import clear_tokens
+from taxiye_eims_integration.utils.eims_invoice import get_last_eims_invoice
+from taxiye_eims_integration.utils.settings import bump_version
+
+# errors kept per process for the report
+MAX_SAMPLED_ERRORS = 5
+
+
+def make_payload(run_id, worker, sequence):
+    from taxiye_eims_integration.api.schemas import InvoicePayload
+
+    trip_id = f"LOAD-{run_id}-{worker}-{sequence}"
+    base_fare, commission = 200.0, 30.0
+    tax = round((base_fare + commission) * 0.15, 2)
+    now = now_datetime()
+    return InvoicePayload(
+        trip_id=trip_id,
+        invoice_number=trip_id,
+        taxi_provider_name="Load Test Driver",
+        taxi_provider_tin="0079140416",
+        taxi_provider_address="Addis Ababa",
+        taxi_provider_phone="+251911000000",
+        rider_name="Load Test Rider",
+        rider_phone="+251922000000",
+        date=now.strftime("%Y-%m-%d"),
+        time=now.strftime("%H:%M:%S"),
+        description="Load test trip",
+        reference=trip_id,
+        base_fare=base_fare,
+        commission_amount=commission,
+        tax=tax,
+        amount=base_fare + commission,
+        total_payment=base_fare + commission + tax,
+    )
+
+
+def submitter(site, sites_path, run_id, worker, deadline, results):
+    """Child process: submit invoices back to back until the deadline."""
+    from taxiye_eims_integration.api.invoice import submit_invoice
+    from taxiye_eims_integration.utils.eims_client import EIMSSubmissionError
+
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+    latencies = []
+    outcomes = {"success": 0, "rejected": 0, "error": 0}
+    errors = []
+    sequence = 0
+    try:
+        while time.time() < deadline:
+            sequence += 1
+            payload = make_payload(run_id, worker, sequence)
+            started = time.perf_counter()
+            try:
+                submit_invoice(payload)
+                outcomes["success"] += 1
+            except EIMSSubmissionError as e:
+                # create_invoice would queue these in the outbox
+                frappe.db.rollback()
+                outcomes["rejected"] += 1
+                errors.append(str(e)[:300])
+            except Exception as e:
+                frappe.db.rollback()
+                outcomes["error"] += 1
+                errors.append(f"{type(e).__name__}: {str(e)[:300]}")
+            latencies.append(time.perf_counter() - started)
+    finally:
+        results.put({"latencies": latencies, "outcomes": outcomes, "errors": errors[:MAX_SAMPLED_ERRORS]})
+        frappe.destroy()
+
+
+def percentile(values, share):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(int(share * len(ordered)), len(ordered) - 1)]
+
+
+def check_chain(since, accepted=None):
+    """Check the Trip Invoice chain written since a datetime.
+
+    Placeholders written on resync (no IRN) are counted but not part of the
+    chain. When `accepted` (the mock ledger) is given, every
+    acknowledged IRN must have been saved exactly once with its numbers.
+    """
+    rows = frappe.get_all(  # type: ignore
+        "Trip Invoice",
+        filters={"creation": [">=", since]},
+        fields=["name", "document_number", "invoice_counter", "irn", "previous_irn"],
+        order_by="creation asc",
+        limit_page_length=0,
+    )
+    chain = [row for row in rows if row.irn]
+    for row in chain:
+        row.document_number = int(row.document_number)
+        row.invoice_counter = int(row.invoice_counter)
+    chain.sort(key=lambda row: row.document_number)
+
+    def duplicates(field):
+        seen, repeated = set(), set()
+        for row in chain:
+            (repeated if row[field] in seen else seen).add(row[field])
+        return sorted(repeated)
+
+    numbers = [row.document_number for row in chain]
+    gaps = sorted(set(range(numbers[0], numbers[-1] + 1)) - set(numbers)) if numbers else []
+
+    broken_links, unlinked = [], 0
+    for previous, row in zip(chain, chain[1:]):
+        if row.document_number != previous.document_number + 1:
+            continue
+        if not row.previous_irn:
+            unlinked += 1
+        elif row.previous_irn != previous.irn:
+            broken_links.append(row.name)
+
+    report = {
+        "invoices": len(chain),
+        "placeholders": len(rows) - len(chain),
+        "duplicate_document_numbers": duplicates("document_number"),
+        "duplicate_invoice_counters": duplicates("invoice_counter"),
+        "duplicate_irns": duplicates("irn"),
+        "gaps": gaps,
+        "broken_links": broken_links,
+        "unlinked_after_resync": unlinked,
+    }
+
+    if accepted is not None:
+        saved = {row.irn: row for row in chain}
+        report["acknowledged_not_saved"] = [irn for _number, _counter, irn, _previous in accepted if irn not in saved]
+        acknowledged = {irn for _number, _counter, irn, _previous in accepted}
+        report["saved_not_acknowledged"] = [row.name for row in chain if row.irn not in acknowledged]
+        report["number_mismatches"] = [
+            saved[irn].name
+            for number, counter, irn, _previous in accepted
+            if irn in saved and (saved[irn].document_number, saved[irn].invoice_counter) != (number, counter)
+        ]
+
+    report["ok"] = not any(
+        report[key]
+        for key in report
+        if key not in ("invoices", "placeholders", "unlinked_after_resync")
+    )
+    return report
+
+
+def point_settings_at(base_url):
+    """Set EIMS Settings.mor_base_url and drop cached tokens; returns the previous url."""
+    previous = frappe.db.get_single_value("EIMS Settings", "mor_base_url")  # type: ignore
+    frappe.db.set_single_value("EIMS Settings", "mor_base_url", base_url)  # type: ignore
+    frappe.db.commit()  # type: ignore
+    # set_single_value skips on_update; reload the settings snapshot by hand
+    bump_version()
+    # tokens of one server must never be sent to the other
+    clear_tokens()
+    return previous
+
+
+def run(processes=4, duration=60, latency_ms=20, jitter_ms=30, rate_limit=0, echo=print):
+    """Run the load test on the current site and return the report."""
+    if not frappe.conf.get("allow_tests"):  # type: ignore
+        frappe.throw("The EIMS load test writes Trip Invoices; enable allow_tests on a test site first")  # type: ignore
+
+    server, ledger, base_url = start_mock(latency_ms=latency_ms, jitter_ms=jitter_ms, rate_limit_per_second=rate_limit)
+    last_doc = get_last_eims_invoice()
+    if last_doc:
+        ledger.start_at(last_doc.document_number, last_doc.invoice_counter, last_doc.irn)
+
+    previous_url = point_settings_at(base_url)
+    since = now_datetime()
+    run_id = frappe.generate_hash(length=6)  # type: ignore
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    deadline = time.time() + int(duration)
+
+    echo(f"Load test {run_id}: {processes} processes for {duration}s against {base_url}")
+    started = time.perf_counter()
+    workers = [
+        context.Process(
+            target=submitter,
+            args=(frappe.local.site, frappe.local.sites_path, run_id, worker, deadline, results),
+        )
+        for worker in range(int(processes))
+    ]
+    try:
+        for process in workers:
+            process.start()
+        collected = [results.get() for _process in workers]
+        for process in workers:
+            process.join()
+    finally:
+        point_settings_at(previous_url)
+        server.shutdown()
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for result in collected for latency in result["latencies"]]
+    outcomes = {
+        outcome: sum(result["outcomes"][outcome] for result in collected)
+        for outcome in ("success", "rejected", "error")
+    }
+    report = {
+        "outcomes": outcomes,
+        "throughput_per_second": round(outcomes["success"] / elapsed, 2),
+        "latency_seconds": {
+            "p50": round(percentile(latencies, 0.50), 4),
+            "p95": round(percentile(latencies, 0.95), 4),
+            "p99": round(percentile(latencies, 0.99), 4),
+            "max": round(max(latencies, default=0), 4),
+        },
+        "mock_rejections": dict(ledger.rejected),
+        "sample_errors": [error for result in collected for error in result["errors"]][:MAX_SAMPLED_ERRORS],
+        "chain": check_chain(since, ledger.accepted),
+    }
+
+    echo(
+        f"{outcomes['success']} invoices in {elapsed:.1f}s ({report['throughput_per_second']}/s), "
+        f"{outcomes['rejected']} rejected, {outcomes['error']} errors"
+    )
+    echo("latency " + ", ".join(f"{key} {value * 1000:.0f}ms" for key, value in report["latency_seconds"].items()))
+    echo(f"mock rejections {report['mock_rejections']}")
+    echo(f"chain {'OK' if report['chain']['ok'] else 'BROKEN'}: {report['chain']}")
+    return report
@@ -0,0 +1,72 @@
+"""Micro-benchmark for TIN / phone normalization.
+
+Run with:
+    bench --site <site> execute taxiye_eims_integration.benchmarks.normalization.run
+or, without a site:
+    python -m taxiye_eims_integration.benchmarks.normalization
+"""
+
+import re
+import timeit
+
+from taxiye_eims_integration.utils.normalization import (
+    clean_phone,
+    clean_tin_no,
+    normalize_batch,
+    normalize_settings_phone,
+)
+
+SAMPLE_TINS = ["0079140416", " 007-914-0416 ", "12345", "0012 3456 789", None, "001234567890"]
+SAMPLE_PHONES = ["0911234567", "+251 911 234 567", "911-23-45-67", "251911234567", "", None]
+
+
+def legacy_clean_tin_no(tin):
+    # implementation previously in api/fetch_trips.py, kept for comparison
+    if not tin:
+        return ""
+    tinClean = tin.strip().replace("-", "").replace(" ", "")
+    if len(tinClean) < 9 or len(tinClean) > 12:
+        return ""
+    return tinClean
+
+
+def legacy_clean_phone(phone):
+    # implementation previously in api/fetch_trips.py, kept for comparison
+    if not phone:
+        return ""
+    cleaned = re.sub(r"\D", "", phone)
+    if not cleaned.startswith("251"):
+        cleaned = "251" + cleaned
+    return "+" + cleaned
+
+
+def _time_per_call(func, values, number):
+    seconds = timeit.timeit(lambda: [func(value) for value in values], number=number)
+    return seconds / (number * len(values)) * 1e9
+
+
+def run(number=20000):
+    """Print ns/call for the legacy and current cleaners and the batch normalizer."""
+    number = int(number)
+    results = {
+        "legacy_clean_tin_no": _time_per_call(legacy_clean_tin_no, SAMPLE_TINS, number),
+        "clean_tin_no": _time_per_call(clean_tin_no, SAMPLE_TINS, number),
+        "legacy_clean_phone": _time_per_call(legacy_clean_phone, SAMPLE_PHONES, number),
+        "clean_phone": _time_per_call(clean_phone, SAMPLE_PHONES, number),
+        # settings values repeat, so this is the memoized hit path
+        "normalize_settings_phone": _time_per_call(normalize_settings_phone, SAMPLE_PHONES, number),
+    }
+    batch_seconds = timeit.timeit(lambda: normalize_batch(SAMPLE_TINS, SAMPLE_PHONES), number=number)
+    results["normalize_batch (per value)"] = (
+        batch_seconds / (number * (len(SAMPLE_TINS) + len(SAMPLE_PHONES))) * 1e9
+    )
+
+    for name, ns in results.items():
+        print(f"{name:<32} {ns:8.1f} ns/value")
+    print("stats:", normalize_batch(SAMPLE_TINS, SAMPLE_PHONES)["stats"])
+
+    return results
+
+
+if __name__ == "__main__":
+    run()
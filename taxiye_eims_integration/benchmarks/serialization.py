@@ -0,0 +1,121 @@
+"""Micro-benchmark for the JSON share of per-invoice CPU.
+
+Compares the stdlib path previously taken (`requests.post(json=...)`,
+`response.json()`) with utils.serialization (orjson when installed), next
+to the cost of building the request body itself.
+
+Run with:
+    bench --site <site> execute taxiye_eims_integration.benchmarks.serialization.run
+"""
+
+import json
+import timeit
+from datetime import date
+from types import SimpleNamespace
+
+from taxiye_eims_integration.api.fetch_trips import (
+    get_document_detail,
+    get_item_details,
+    get_payment_detail,
+    get_reference_detail,
+    get_rider_details,
+)
+from taxiye_eims_integration.utils.serialization import BACKEND, encode_payload, loads
+
+SAMPLE_PAYLOAD = SimpleNamespace(
+    trip_id="TRIP-0001",
+    reference="TRIP-0001",
+    description="Ride from Bole to Piassa",
+    base_fare=250.0,
+    commission_amount=37.5,
+    commission_rate=None,
+    quantity=1,
+    line_number=1,
+    date=date(2026, 1, 15),
+    time="08:45:00",
+    rider_name="Abebe Kebede",
+    rider_phone="+251911234567",
+    rider_tin="0012345678",
+    rider_city=None,
+    rider_email=None,
+    housenumber=None,
+    id_number=None,
+)
+# settings backed sections are fixed here so the benchmark does not hit the database
+SELLER = {
+    "City": "Addis Ababa",
+    "Email": "driver@example.com",
+    "LegalName": "Taxiye Driver",
+    "Locality": "Bole",
+    "Phone": "+251911000000",
+    "Region": "AA",
+    "SubCity": "Bole",
+    "Wereda": "03",
+    "Tin": "0079140416",
+    "VatNumber": None,
+}
+SOURCE_SYSTEM = {"InvoiceCounter": 1001, "SystemNumber": "ABC123", "SystemType": "POS"}
+SAMPLE_RESPONSE = json.dumps(
+    {
+        "statusCode": 200,
+        "message": "Invoice registered",
+        "body": {
+            "irn": "a" * 64,
+            "ackDate": "2026-01-15T08:45:03",
+            "signedQR": "eyJhbGciOiJSUzI1NiJ9." + "x" * 600 + "." + "y" * 342,
+            "signedInvoice": "eyJhbGciOiJSUzI1NiJ9." + "x" * 2400 + "." + "y" * 342,
+            "documentNumber": 1001,
+            "invoiceCounter": 1001,
+        },
+    }
+).encode()
+
+
+def build_body(payload=SAMPLE_PAYLOAD):
+    item_list, value_details = get_item_details(payload)
+    return {
+        "BuyerDetails": get_rider_details(payload),
+        "DocumentDetails": get_document_detail(payload, 1001),
+        "ItemList": item_list,
+        "PaymentDetails": get_payment_detail(),
+        "ReferenceDetails": get_reference_detail("b" * 64),
+        "SellerDetails": SELLER,
+        "SourceSystem": SOURCE_SYSTEM,
+        "ValueDetails": value_details,
+        "TransactionType": "B2C",
+        "Version": "1",
+    }
+
+
+def legacy_round_trip(body):
+    # what requests did with json= and response.json()
+    json.dumps(body, allow_nan=False).encode()
+    return json.loads(SAMPLE_RESPONSE.decode())
+
+
+def round_trip(body):
+    encode_payload(body)
+    return loads(SAMPLE_RESPONSE)
+
+
+def _us_per_call(func, number):
+    return timeit.timeit(func, number=number) / number * 1e6
+
+
+def run(number=20000):
+    """Print us/invoice for body building and each serialization path, and their share."""
+    number = int(number)
+    body = build_body()
+
+    build = _us_per_call(build_body, number)
+    results = {
+        "build body": build,
+        "stdlib json (legacy)": _us_per_call(lambda: legacy_round_trip(body), number),
+        f"serialization ({BACKEND}, with hash)": _us_per_call(lambda: round_trip(body), number),
+    }
+
+    for name, us in results.items():
+        share = "" if name == "build body" else f"  {us / (build + us):6.1%} of per-invoice CPU"
+        print(f"{name:<36} {us:8.2f} us/invoice{share}")
+
+    return results
@@ -0,0 +1,125 @@
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("eims-backfill")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "file_format", type=click.Choice(["csv", "parquet"]), help="Defaults to the file extension")
+@click.option("--chunk-size", default=500, show_default=True, help="Trips read, validated and written per chunk")
+@click.option("--restart", is_flag=True, default=False, help="Ignore the saved offset and start from the top")
+@click.option("--max-retries", default=5, show_default=True, help="EIMS attempts per trip")
+@pass_context
+def eims_backfill(context, path, file_format=None, chunk_size=500, restart=False, max_retries=5):
+	"""Register historical trips from a CSV or Parquet file with EIMS"""
+	from taxiye_eims_integration.utils.backfill import run_backfill
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		state = run_backfill(
+			path,
+			file_format=file_format,
+			chunk_size=chunk_size,
+			restart=restart,
+			max_retries=max_retries,
+			echo=click.echo,
+		)
+		click.secho(f"Backfill finished at offset {state['offset']}", fg="green")
+	finally:
+		frappe.destroy()
+
+
+@click.command("eims-rebuild-rollups")
+@pass_context
+def eims_rebuild_rollups(context):
+	"""Recompute Trip Stats Rollup from Trip Invoice and Trip Receipt, per document type"""
+	from taxiye_eims_integration.utils.rollups import rebuild_rollups
+
+	for site in context.sites:
+		frappe.init(site=site)
+		frappe.connect()
+		try:
+			rebuild_rollups()
+			click.secho(f"Rebuilt trip stats rollups for {site}", fg="green")
+		finally:
+			frappe.destroy()
+
+
+@click.command("eims-load-test")
+@click.option("--processes", default=4, show_default=True, help="Concurrent submitter processes")
+@click.option("--duration", default=60, show_default=True, help="Seconds to keep submitting")
+@click.option("--latency-ms", default=20, show_default=True, help="Base latency of the EIMS mock")
+@click.option("--jitter-ms", default=30, show_default=True, help="Random latency added by the EIMS mock")
+@click.option("--rate-limit", default=0, show_default=True, help="Mock requests per second before 'Too many requests!' (0: off)")
+@pass_context
+def eims_load_test(context, processes=4, duration=60, latency_ms=20, jitter_ms=30, rate_limit=0):
+	"""Submit invoices concurrently against the EIMS mock and check the resulting chain"""
+	from taxiye_eims_integration.benchmarks.load import run
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		report = run(
+			processes=processes,
+			duration=duration,
+			latency_ms=latency_ms,
+			jitter_ms=jitter_ms,
+			rate_limit=rate_limit,
+			echo=click.echo,
+		)
+		if not report["chain"]["ok"]:
+			raise click.ClickException("Trip Invoice chain check failed")
+	finally:
+		frappe.destroy()
+
+
+@click.command("eims-sequence-check")
+@click.option("--from-number", type=int, help="First document number to check")
+@click.option("--to-number", type=int, help="Last document number to check")
+@click.option("--limit", default=1000, show_default=True, help="Suspicious rows read at most")
+@pass_context
+def eims_sequence_check(context, from_number=None, to_number=None, limit=1000):
+	"""List gaps, duplicates and broken links in the Trip Invoice chain"""
+	from taxiye_eims_integration.utils.sequence_audit import ISSUE_TYPES, find_sequence_issues
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		issues = find_sequence_issues(from_number, to_number, limit)
+		for issue_type in ISSUE_TYPES:
+			click.echo(f"{issue_type}: {len(issues[issue_type])}")
+			for issue in issues[issue_type]:
+				click.echo(f"  {issue}")
+		if issues["truncated"]:
+			click.secho(f"Stopped after {limit} rows; narrow the range or raise --limit", fg="yellow")
+		if any(issues[issue_type] for issue_type in ISSUE_TYPES):
+			raise click.ClickException("Trip Invoice chain has issues")
+		click.secho("Trip Invoice chain is consistent", fg="green")
+	finally:
+		frappe.destroy()
+
+
+@click.command("eims-repair-placeholders")
+@click.option("--batch-size", default=500, show_default=True, help="Placeholders filled per transaction")
+@pass_context
+def eims_repair_placeholders(context, batch_size=500):
+	"""Fill resync placeholders from the EIMS acknowledgements in the submission journal"""
+	from taxiye_eims_integration.utils.sequence_audit import repair_placeholders
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		result = repair_placeholders(batch_size=batch_size, echo=click.echo)
+		click.secho(f"Filled {result['filled']} placeholders, linked {result['linked']} invoices", fg="green")
+		if result["unmatched"]:
+			click.secho(f"No acknowledgement journaled for document numbers {result['unmatched']}", fg="yellow")
+	finally:
+		frappe.destroy()
+
+
+commands = [eims_backfill, eims_rebuild_rollups, eims_load_test, eims_sequence_check, eims_repair_placeholders]
@@ -101,6 +101,12 @@ app_license = "mit"
 # before_uninstall = "taxiye_eims_integration.uninstall.before_uninstall"
 # after_uninstall = "taxiye_eims_integration.uninstall.after_uninstall"
 
+# Migration
+# ---------
+
+# deploys migrate before workers restart: settle what stopped workers left in flight
+after_migrate = ["taxiye_eims_integration.utils.in_flight.recover_in_flight"]
+
 # Integration Setup
 # ------------------
 # To set up dependencies/integrations with other apps
@@ -147,6 +153,20 @@ app_license = "mit"
 # 	}
 # }
 
+doc_events = {
+	# keep the dashboard rollups (Trip Stats Rollup) in step with the source rows
+	"Trip Invoice": {
+		"after_insert": "taxiye_eims_integration.utils.rollups.on_insert",
+		"on_update": "taxiye_eims_integration.utils.rollups.on_update",
+		"on_trash": "taxiye_eims_integration.utils.rollups.on_trash",
+	},
+	"Trip Receipt": {
+		"after_insert": "taxiye_eims_integration.utils.rollups.on_insert",
+		"on_update": "taxiye_eims_integration.utils.rollups.on_update",
+		"on_trash": "taxiye_eims_integration.utils.rollups.on_trash",
+	},
+}
+
 # Scheduled Tasks
 # ---------------
 
@@ -168,6 +188,33 @@ app_license = "mit"
 # 	],
 # }
 
+scheduler_events = {
+	"hourly": [
+		# pull trips the push endpoint missed
+		"taxiye_eims_integration.utils.trip_ingest.ingest_trips",
+		# public keys for offline signature verification
+		"taxiye_eims_integration.utils.verification.refresh_public_keys",
+	],
+	"daily_long": [
+		# VAT Daily Summary for the days since the last run
+		"taxiye_eims_integration.utils.vat_report.update_vat_summaries",
+		# move settled trips older than eims_archive_after_months to the archive tables
+		"taxiye_eims_integration.utils.archive.archive_settled_trips",
+	],
+	"cron": {
+		# drain EIMS submissions that failed or were deferred
+		"* * * * *": [
+			"taxiye_eims_integration.utils.eims_outbox.process_outbox",
+			# settle submissions of workers stopped between the EIMS ack and the save
+			"taxiye_eims_integration.utils.in_flight.recover_in_flight",
+		],
+		# persist buffered Trip Invoice / Trip Receipt rows of workers that died before flushing
+		"*/10 * * * *": [
+			"taxiye_eims_integration.utils.write_buffer.recover_write_journals",
+		],
+	},
+}
+
 # Testing
 # -------
 
@@ -209,11 +256,20 @@ app_license = "mit"
 # before_request = ["taxiye_eims_integration.utils.before_request"]
 # after_request = ["taxiye_eims_integration.utils.after_request"]
 
+# write the metrics buffered by this worker
+after_request = ["taxiye_eims_integration.utils.metrics.flush"]
+
 # Job Events
 # ----------
 # before_job = ["taxiye_eims_integration.utils.before_job"]
 # after_job = ["taxiye_eims_integration.utils.after_job"]
 
+after_job = [
+	"taxiye_eims_integration.utils.metrics.flush",
+	# job work horses exit right after the job; let the audit writer finish first
+	"taxiye_eims_integration.utils.audit_log.drain",
+]
+
 # User Data Protection
 # --------------------
 
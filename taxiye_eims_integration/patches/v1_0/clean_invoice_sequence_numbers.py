@@ -0,0 +1,35 @@
+import frappe
+from taxiye_eims_integration.utils.archive import ARCHIVE_TABLES, archive_exists
+
+# Trip Invoice.document_number / invoice_counter become Int columns in the
+# model sync that follows. Values MariaDB cannot cast (empty or non-numeric,
+# which strict mode rejects) are set to 0 first. The archive table was
+# created LIKE the hot table and is converted the same way here.
+
+SEQUENCE_COLUMNS = ("document_number", "invoice_counter")
+
+
+def clean_table(table):
+    for column in SEQUENCE_COLUMNS:
+        frappe.db.sql(  # type: ignore
+            f"""update {table} set `{column}` = '0'
+            where `{column}` is null or trim(`{column}`) not regexp '^[0-9]+$'"""
+        )
+        frappe.db.sql(  # type: ignore
+            f"update {table} set `{column}` = trim(`{column}`) where `{column}` != trim(`{column}`)"
+        )
+
+
+def execute():
+    if not frappe.db.has_column("Trip Invoice", "document_number"):  # type: ignore
+        return
+    clean_table("`tabTrip Invoice`")
+
+    if archive_exists("Trip Invoice"):
+        archive = f"`tab{ARCHIVE_TABLES['Trip Invoice']}`"
+        clean_table(archive)
+        frappe.db.sql_ddl(  # type: ignore
+            f"""alter table {archive}
+            modify `document_number` int(11) not null default 0,
+            modify `invoice_counter` int(11) not null default 0"""
+        )
@@ -0,0 +1,9 @@
+from taxiye_eims_integration.utils.rollups import rebuild_rollups
+
+# Trip Stats Rollup gained document_type, which is part of each row's name:
+# rows written before counted credit notes as invoices and would no longer
+# match. Recompute them all.
+
+
+def execute():
+    rebuild_rollups()
@@ -0,0 +1,21 @@
+# Copyright (c) 2026, Mevinai and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from taxiye_eims_integration.utils.buyers import cache_buyer, clean_buyer_tin, drop_cached_buyer
+
+
+class EIMSBuyer(Document):
+	def before_insert(self):
+		# the TIN is the name, so clean it before naming
+		self.tin = clean_buyer_tin(self.tin)
+
+	def validate(self):
+		self.tin = clean_buyer_tin(self.tin)
+
+	def on_update(self):
+		cache_buyer(self)
+
+	def on_trash(self):
+		drop_cached_buyer(self.tin)
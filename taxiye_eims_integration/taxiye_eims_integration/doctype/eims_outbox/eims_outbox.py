@@ -0,0 +1,14 @@
+# Copyright (c) 2026, Mevinai and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class EIMSOutbox(Document):
+	pass
+
+
+def on_doctype_update():
+	# the scheduler polls by (status, next_attempt_at); keep that an index seek
+	frappe.db.add_index("EIMS Outbox", ["status", "next_attempt_at"], "status_next_attempt_at_index")
@@ -3,9 +3,11 @@
 
 import frappe
 from frappe.model.document import Document
+from taxiye_eims_integration.utils.settings import invalidate_settings
 
 
 class EIMSSettings(Document):
-	pass
+	def on_update(self):
+		invalidate_settings()
 
 
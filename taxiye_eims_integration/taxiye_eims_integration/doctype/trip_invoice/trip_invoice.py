@@ -3,8 +3,14 @@
 
 import frappe
 from frappe.model.document import Document
+from taxiye_eims_integration.utils.eims_invoice import clear_invoice_receipt_cache
 
 
 class TripInvoice(Document):
-	pass
+	def on_update(self):
+		# drop the receipt lookup cache so it never serves stale amounts
+		clear_invoice_receipt_cache(self.name)
+
+	def on_trash(self):
+		clear_invoice_receipt_cache(self.name)
 
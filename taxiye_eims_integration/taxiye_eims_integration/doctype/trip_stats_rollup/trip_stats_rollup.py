@@ -0,0 +1,14 @@
+# Copyright (c) 2026, Mevinai and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class TripStatsRollup(Document):
+	pass
+
+
+def on_doctype_update():
+	# stats reads filter a bucket type over a time range
+	frappe.db.add_index("Trip Stats Rollup", ["bucket_type", "bucket_start"], "bucket_type_start_index")
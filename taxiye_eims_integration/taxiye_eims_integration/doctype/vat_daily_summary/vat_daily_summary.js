@@ -0,0 +1,8 @@
+// Copyright (c) 2026, Mevinai and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("VAT Daily Summary", {
+// 	refresh(frm) {
+
+// 	},
+// });
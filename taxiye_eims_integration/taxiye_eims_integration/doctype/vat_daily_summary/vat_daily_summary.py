@@ -0,0 +1,14 @@
+# Copyright (c) 2026, Mevinai and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class VATDailySummary(Document):
+	pass
+
+
+def on_doctype_update():
+	# the monthly report reads a date range, optionally for one provider
+	frappe.db.add_index("VAT Daily Summary", ["summary_date", "taxi_provider_tin"], "summary_date_tin_index")
@@ -0,0 +1,86 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import archive
+from taxiye_eims_integration.utils.archive import get_archived_values, get_trip_invoice, get_trip_receipts
+
+
+class ArchiveTestCase(UnitTestCase):
+	def setUp(self):
+		self.frappe = MagicMock()
+		self.frappe.get_all.return_value = []
+		self.frappe.db.get_value.return_value = None
+		self.frappe.db.sql.return_value = []
+		self.has_archive = True
+		for target, value in (
+			("frappe", self.frappe),
+			("archive_exists", lambda doctype: self.has_archive),
+		):
+			patcher = patch.object(archive, target, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+
+class TestGetTripInvoice(ArchiveTestCase):
+	def test_hot_invoice_is_not_looked_up_in_the_archive(self):
+		self.frappe.db.get_value.return_value = frappe._dict(name="INV-1")
+
+		invoice = get_trip_invoice(irn="IRN-1", fields=["name"])
+
+		self.assertEqual(invoice, {"name": "INV-1", "archived": 0})
+		self.frappe.db.get_value.assert_called_once_with("Trip Invoice", {"irn": "IRN-1"}, ["name"], as_dict=True)
+		self.frappe.db.sql.assert_not_called()
+
+	def test_falls_back_to_the_archive(self):
+		self.frappe.db.sql.return_value = [frappe._dict(name="INV-1")]
+
+		invoice = get_trip_invoice(trip_id="TRIP-1", fields=["name", "irn"])
+
+		self.assertEqual(invoice, {"name": "INV-1", "archived": 1})
+		query, values = self.frappe.db.sql.call_args.args
+		self.assertIn("select `name`, `irn` from `tabTrip Invoice Archive` where `trip_id` = %(value)s", query)
+		self.assertEqual(values, {"value": "TRIP-1"})
+
+	def test_unknown_invoice(self):
+		self.assertIsNone(get_trip_invoice(name="INV-404"))
+
+	def test_no_archive_table_yet(self):
+		self.has_archive = False
+		self.assertIsNone(get_trip_invoice(name="INV-404"))
+		self.frappe.db.sql.assert_not_called()
+
+	def test_needs_a_key(self):
+		self.assertIsNone(get_trip_invoice())
+		self.frappe.db.get_value.assert_not_called()
+
+	def test_uses_the_first_key_given(self):
+		get_trip_invoice(name="INV-1", irn="IRN-1")
+		self.assertEqual(self.frappe.db.get_value.call_args.args[1], {"name": "INV-1"})
+
+
+class TestArchiveLookups(ArchiveTestCase):
+	def test_hot_receipts_are_not_looked_up_in_the_archive(self):
+		self.frappe.get_all.return_value = [{"name": "REC-1"}]
+		self.assertEqual(get_trip_receipts("INV-1"), [{"name": "REC-1"}])
+		self.frappe.db.sql.assert_not_called()
+
+	def test_receipts_fall_back_to_the_archive(self):
+		self.frappe.db.sql.return_value = [{"name": "REC-1"}]
+		self.assertEqual(get_trip_receipts("INV-1"), [{"name": "REC-1"}])
+		self.assertIn("`tabTrip Receipt Archive`", self.frappe.db.sql.call_args.args[0])
+
+	def test_archived_values(self):
+		self.frappe.db.sql.return_value = ["TRIP-1"]
+		self.assertEqual(get_archived_values("Trip Invoice", "trip_id", ["TRIP-1", "TRIP-2"]), ["TRIP-1"])
+		self.assertEqual(self.frappe.db.sql.call_args.args[1], {"values": ("TRIP-1", "TRIP-2")})
+
+	def test_archived_values_without_archive(self):
+		self.has_archive = False
+		self.assertEqual(get_archived_values("Trip Invoice", "trip_id", ["TRIP-1"]), [])
+		self.assertEqual(get_archived_values("Trip Invoice", "trip_id", []), [])
+		self.frappe.db.sql.assert_not_called()
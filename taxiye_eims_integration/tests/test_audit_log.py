@@ -0,0 +1,34 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils.audit_log import redact
+
+
+class TestRedact(UnitTestCase):
+	def test_masks_sensitive_fields_at_any_depth(self):
+		body = {
+			"SellerDetails": {"Tin": "0079140416", "LegalName": "Taxiye", "City": "Addis Ababa"},
+			"BuyerDetails": {"Phone": "+251911000000", "Email": "rider@example.com"},
+			"ItemList": [{"ItemCode": "TAXI", "TotalLineAmount": 115.0}],
+		}
+		self.assertEqual(
+			redact(body),
+			{
+				"SellerDetails": {"Tin": "***", "LegalName": "***", "City": "Addis Ababa"},
+				"BuyerDetails": {"Phone": "***", "Email": "***"},
+				"ItemList": [{"ItemCode": "TAXI", "TotalLineAmount": 115.0}],
+			},
+		)
+
+	def test_masks_login_credentials(self):
+		login = {"clientId": "id", "clientSecret": "secret", "apikey": "key", "tin": "0079140416"}
+		self.assertEqual(redact(login), {"clientId": "***", "clientSecret": "***", "apikey": "***", "tin": "***"})
+
+	def test_keeps_empty_values(self):
+		# an empty TIN (B2C rider) tells more than a mask
+		self.assertEqual(redact({"Tin": None, "VatNumber": ""}), {"Tin": None, "VatNumber": ""})
+
+	def test_masks_dicts_inside_lists(self):
+		self.assertEqual(redact([{"phone": "0911000000"}, "text", 3]), [{"phone": "***"}, "text", 3])
@@ -0,0 +1,46 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, call, patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.api import invoice
+from taxiye_eims_integration.utils import backfill
+
+
+class TestRegisterChunk(UnitTestCase):
+	def test_each_trip_chains_on_the_saved_tail(self):
+		payloads = [frappe._dict(trip_id="TRIP-1"), frappe._dict(trip_id="TRIP-2"), frappe._dict(trip_id="TRIP-3")]
+		steps = MagicMock()
+		steps.get_last_eims_invoice.side_effect = ["tail-0", "tail-1"]
+		steps.register_invoice.side_effect = lambda payload, last_doc, *args, **kwargs: ({}, last_doc)
+		steps.get_invoice_values.side_effect = lambda last_doc, data, payload: {"trip_id": payload.trip_id}
+		writer = steps.writer
+		writer.__enter__.return_value = writer
+
+		with (
+			patch.object(backfill, "get_known_trip_ids", return_value={"TRIP-2"}),
+			patch.object(backfill, "get_last_eims_invoice", steps.get_last_eims_invoice),
+			patch.object(backfill, "TripWriteBuffer", return_value=writer),
+			patch.object(invoice, "register_invoice", steps.register_invoice),
+			patch.object(invoice, "get_invoice_values", steps.get_invoice_values),
+		):
+			self.assertEqual(backfill.register_chunk(payloads, 5), (2, 1))
+
+		# the tail is read again only once the previous invoice is saved
+		self.assertEqual(
+			[step for step in steps.mock_calls if step[0] in ("get_last_eims_invoice", "writer.add", "writer.flush")],
+			[
+				call.get_last_eims_invoice(),
+				call.writer.add({"trip_id": "TRIP-1"}),
+				call.writer.flush(),
+				call.get_last_eims_invoice(),
+				call.writer.add({"trip_id": "TRIP-3"}),
+				call.writer.flush(),
+			],
+		)
+		self.assertEqual(
+			[step.args[1] for step in steps.register_invoice.call_args_list], ["tail-0", "tail-1"]
+		)
@@ -0,0 +1,92 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import buyers
+from taxiye_eims_integration.utils.buyers import MISSING, REDIS_KEY_BUYERS, drop_cached_buyer, get_buyer
+from taxiye_eims_integration.utils.serialization import loads
+
+TIN = "0012345678"
+
+
+class FakeRedis:
+	"""The raw hash commands buyers.py calls as unbound redis.Redis methods."""
+
+	def __init__(self):
+		self.hashes = {}
+
+	def hget(self, cache, key, field):
+		return self.hashes.get(key, {}).get(field)
+
+	def hset(self, cache, key, field=None, value=None, mapping=None):
+		values = self.hashes.setdefault(key, {})
+		values.update(mapping or {field: value})
+
+	def hdel(self, cache, key, field):
+		self.hashes.get(key, {}).pop(field, None)
+
+
+class TestGetBuyer(UnitTestCase):
+	def setUp(self):
+		self.redis = FakeRedis()
+		self.frappe = MagicMock()
+		self.frappe.cache.return_value.make_key.side_effect = lambda key: f"site|{key}"
+		self.frappe.db.get_value.return_value = None
+		self.lookups = []
+		for target, value in (
+			("frappe", self.frappe),
+			("redis", MagicMock(Redis=self.redis)),
+			("inc", lambda name, result: self.lookups.append(result)),
+		):
+			patcher = patch.object(buyers, target, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	@property
+	def cached(self):
+		return self.redis.hashes.get(f"site|{REDIS_KEY_BUYERS}", {})
+
+	def test_miss_reads_the_database_once_and_caches_the_buyer(self):
+		self.frappe.db.get_value.return_value = frappe._dict(
+			tin=TIN, legal_name="Acme PLC", enabled=1, city="Addis Ababa"
+		)
+
+		first = get_buyer(f" {TIN[:4]}-{TIN[4:]} ")
+		second = get_buyer(TIN)
+
+		self.frappe.db.get_value.assert_called_once_with("EIMS Buyer", TIN, buyers.BUYER_FIELDS, as_dict=True)
+		self.assertEqual(first, second)
+		self.assertEqual((first["Tin"], first["LegalName"], first["City"]), (TIN, "Acme PLC", "Addis Ababa"))
+		self.assertEqual(loads(self.cached[TIN]), first)
+		self.assertEqual(self.lookups, ["hit", "hit"])
+
+	def test_unknown_tin_is_cached_as_a_miss(self):
+		self.assertIsNone(get_buyer(TIN))
+		self.assertIsNone(get_buyer(TIN))
+
+		self.frappe.db.get_value.assert_called_once()
+		self.assertEqual(self.cached[TIN], MISSING)
+		self.assertEqual(self.lookups, ["miss", "miss"])
+
+	def test_disabled_buyer_is_a_miss(self):
+		self.frappe.db.get_value.return_value = frappe._dict(tin=TIN, legal_name="Acme PLC", enabled=0)
+		self.assertIsNone(get_buyer(TIN))
+		self.assertEqual(self.cached[TIN], MISSING)
+
+	def test_dropped_buyer_is_read_again(self):
+		get_buyer(TIN)
+		drop_cached_buyer(TIN)
+		self.frappe.db.get_value.return_value = frappe._dict(tin=TIN, legal_name="Acme PLC", enabled=1)
+
+		self.assertEqual(get_buyer(TIN)["LegalName"], "Acme PLC")
+		self.assertEqual(self.frappe.db.get_value.call_count, 2)
+
+	def test_invalid_tin_is_not_looked_up(self):
+		self.assertIsNone(get_buyer("12"))
+		self.assertIsNone(get_buyer(None))
+		self.frappe.cache.assert_not_called()
+		self.assertEqual(self.lookups, [])
@@ -0,0 +1,130 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import credit_notes
+from taxiye_eims_integration.utils.credit_notes import CREDIT_NOTE, build_credit_note_payload, validate_requests
+
+
+def make_invoice(name, total_payment=100, credited_amount=0, **values):
+	return frappe._dict(
+		{
+			"name": name,
+			"irn": f"irn-{name}",
+			"document_type": "INV",
+			"status": "Completed",
+			"total_payment": total_payment,
+			"credited_amount": credited_amount,
+			**values,
+		}
+	)
+
+
+class TestValidateRequests(UnitTestCase):
+	def validate(self, requests, *invoices):
+		originals = {invoice.name: invoice for invoice in invoices}
+		with patch.object(credit_notes, "get_originals", return_value=originals):
+			return validate_requests(requests)
+
+	def test_partial_credits_in_one_batch_share_the_remaining_amount(self):
+		invoice = make_invoice("INV-1", total_payment=100, credited_amount=20)
+		valid, errors = self.validate(
+			[
+				{"invoice_id": "INV-1", "amount": 50},
+				{"invoice_id": "INV-1", "amount": 30},
+				{"invoice_id": "INV-1", "amount": 1},
+			],
+			invoice,
+		)
+		self.assertEqual([amount for _original, amount, _reason, _request_id in valid], [50, 30])
+		self.assertEqual(errors, [{"index": 2, "error": "Amount must be between 0 and 0.0"}])
+
+	def test_cancellation_takes_what_the_batch_left(self):
+		invoice = make_invoice("INV-1", total_payment=100)
+		valid, errors = self.validate(
+			[{"invoice_id": "INV-1", "amount": 40}, {"invoice_id": "INV-1", "reason": "cancelled"}], invoice
+		)
+		self.assertEqual(errors, [])
+		self.assertEqual([(amount, reason) for _original, amount, reason, _request_id in valid], [(40, None), (60, "cancelled")])
+
+	def test_pending_amounts_are_kept_per_invoice(self):
+		valid, errors = self.validate(
+			[{"invoice_id": "INV-1", "amount": 100}, {"invoice_id": "INV-2", "amount": 100}],
+			make_invoice("INV-1"),
+			make_invoice("INV-2"),
+		)
+		self.assertEqual(errors, [])
+		self.assertEqual(len(valid), 2)
+
+	def test_rejects_unknown_and_unregistered_invoices(self):
+		valid, errors = self.validate(
+			[
+				{"invoice_id": "INV-404"},
+				{"invoice_id": "CRE-1"},
+				{"invoice_id": "INV-2"},
+			],
+			make_invoice("CRE-1", document_type=CREDIT_NOTE),
+			make_invoice("INV-2", irn=None, status="Pending"),
+		)
+		self.assertEqual(valid, [])
+		self.assertEqual(
+			errors,
+			[
+				{"index": 0, "error": "Invoice not found"},
+				{"index": 1, "error": "CRE-1 is not a registered invoice"},
+				{"index": 2, "error": "INV-2 is not a registered invoice"},
+			],
+		)
+
+
+def make_b2b_invoice():
+	return make_invoice(
+		"INV-1",
+		total_payment=115,
+		trip_id="TRIP-1",
+		reference="RIDE",
+		taxi_provider_name="Taxiye Driver",
+		taxi_provider_tin="0079140416",
+		taxi_provider_phone="+251911000000",
+		rider_name="Corporate Rider",
+		rider_phone="+251922000000",
+		rider_tin="0012345678",
+		base_fare=90,
+		commission_amount=10,
+		tax=15,
+		amount=100,
+	)
+
+
+class TestB2BCreditNote(UnitTestCase):
+	def test_invoice_values_keep_the_rider_tin(self):
+		from taxiye_eims_integration.api.invoice import get_invoice_values
+
+		payload = build_credit_note_payload(make_b2b_invoice(), 115)
+		values = get_invoice_values(None, {"body": {"irn": "irn-CRE"}}, payload)
+		self.assertEqual(values["rider_tin"], "0012345678")
+
+	def test_credit_note_of_a_b2b_invoice_is_b2b(self):
+		from taxiye_eims_integration.api import invoice
+
+		original = make_b2b_invoice()
+		payload = build_credit_note_payload(original, 57.5, "refund")
+		self.assertEqual(payload.rider_tin, "0012345678")
+
+		buyer = {"LegalName": "Corporate PLC", "Tin": "0012345678"}
+		with (
+			patch.object(invoice, "get_buyer", return_value=buyer) as get_buyer,
+			patch.object(invoice, "get_seller_details", return_value={}),
+			patch.object(invoice, "get_source_system_detail", return_value={}),
+		):
+			body = invoice.prepare_invoice_request_body(payload, None, CREDIT_NOTE, original.irn)
+
+		get_buyer.assert_called_once_with("0012345678")
+		self.assertEqual(body["TransactionType"], "B2B")
+		self.assertEqual(body["BuyerDetails"], buyer)
+		self.assertEqual(body["DocumentDetails"]["Type"], CREDIT_NOTE)
+		self.assertEqual(body["ReferenceDetails"]["RelatedDocument"], "irn-INV-1")
@@ -0,0 +1,191 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import eims_outbox
+from taxiye_eims_integration.utils.eims_client import EIMSRateLimited, EIMSSubmissionError, RateBudgetExceeded
+from taxiye_eims_integration.utils.eims_outbox import (
+	BACKOFF_BASE_SECONDS,
+	BACKOFF_MAX_SECONDS,
+	DEFERRAL_BASE_SECONDS,
+	DEFERRAL_MAX_SECONDS,
+	MAX_DEFERRALS,
+	claim_due_entries,
+	enqueue_submission,
+	get_backoff_seconds,
+	get_deferral_seconds,
+	get_idempotency_key,
+	process_entry,
+)
+
+
+class TestIdempotencyKey(UnitTestCase):
+	def test_keys_by_trip_invoice_and_request(self):
+		self.assertEqual(get_idempotency_key("Invoice", {"trip_id": "TRIP-1"}), "Invoice:TRIP-1")
+		self.assertEqual(get_idempotency_key("Receipt", {"invoice_id": "INV-1"}), "Receipt:INV-1")
+		self.assertEqual(
+			get_idempotency_key("Credit Note", {"invoice_id": "INV-1", "request_id": "r1"}), "Credit Note:r1"
+		)
+
+	def test_partial_credit_notes_of_the_same_amount_differ(self):
+		first = {"invoice_id": "INV-1", "amount": 50, "reason": None, "request_id": "r1"}
+		second = {**first, "request_id": "r2"}
+		self.assertNotEqual(get_idempotency_key("Credit Note", first), get_idempotency_key("Credit Note", second))
+
+	def test_no_key_without_reference(self):
+		self.assertIsNone(get_idempotency_key("Credit Note", {"invoice_id": "INV-1", "amount": 50}))
+
+
+class TestEnqueueDedup(UnitTestCase):
+	def test_returns_the_waiting_entry_with_the_same_key(self):
+		frappe = MagicMock()
+		frappe.db.get_value.return_value = "OUT-1"
+		with patch.object(eims_outbox, "frappe", frappe):
+			outbox = enqueue_submission("Invoice", {"trip_id": "TRIP-1", "total_payment": 115})
+
+		filters = frappe.db.get_value.call_args.args[1]
+		self.assertEqual(filters["idempotency_key"], "Invoice:TRIP-1")
+		frappe.get_doc.assert_called_once_with("EIMS Outbox", "OUT-1")
+		self.assertIs(outbox, frappe.get_doc.return_value)
+		frappe.new_doc.assert_not_called()
+
+	def test_submission_without_key_is_always_queued(self):
+		frappe = MagicMock()
+		with patch.object(eims_outbox, "frappe", frappe):
+			outbox = enqueue_submission("Credit Note", {"invoice_id": "INV-1", "amount": 50})
+
+		frappe.db.get_value.assert_not_called()
+		self.assertIs(outbox, frappe.new_doc.return_value)
+		self.assertIsNone(outbox.idempotency_key)
+		outbox.insert.assert_called_once()
+
+
+class OutboxTestCase(UnitTestCase):
+	def setUp(self):
+		self.frappe = MagicMock()
+		for target, value in (("frappe", self.frappe), ("priority_class", MagicMock())):
+			patcher = patch.object(eims_outbox, target, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def make_entry(self, **values):
+		outbox = MagicMock(name="EIMS Outbox")
+		defaults = {"submission_type": "Invoice", "priority": 1, "attempts": 0, "deferrals": 0, "max_attempts": 3}
+		outbox.configure_mock(name="OUT-1", **{**defaults, **values})
+		self.frappe.get_doc.return_value = outbox
+		return outbox
+
+	def process(self, outcome):
+		with patch.object(eims_outbox, "submit_entry", side_effect=outcome) as submit:
+			return process_entry("OUT-1"), submit
+
+
+class TestBackoff(UnitTestCase):
+	def test_equal_jitter_around_an_exponential_delay(self):
+		for attempts in range(1, 12):
+			delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+			for _sample in range(20):
+				self.assertTrue(delay / 2 <= get_backoff_seconds(attempts) <= delay)
+
+	def test_capped(self):
+		self.assertLessEqual(get_backoff_seconds(50), BACKOFF_MAX_SECONDS)
+
+
+class TestClaimDueEntries(OutboxTestCase):
+	def test_marks_the_claimed_batch_processing(self):
+		self.frappe.db.sql.side_effect = [["OUT-1", "OUT-2"], None]
+		self.assertEqual(claim_due_entries(2), ["OUT-1", "OUT-2"])
+
+		select, update = self.frappe.db.sql.call_args_list
+		self.assertIn("for update skip locked", select.args[0])
+		self.assertEqual(select.args[1]["limit"], 2)
+		self.assertIn("status = 'Processing'", update.args[0])
+		self.assertEqual(update.args[1]["names"], ("OUT-1", "OUT-2"))
+		self.frappe.db.commit.assert_called_once()
+
+	def test_nothing_due(self):
+		self.frappe.db.sql.return_value = []
+		self.assertEqual(claim_due_entries(), [])
+		self.frappe.db.sql.assert_called_once()
+
+
+class TestProcessEntry(OutboxTestCase):
+	def test_success_marks_sent(self):
+		outbox = self.make_entry()
+		status, _submit = self.process([{"data": {"invoice_id": "INV-1"}}])
+		self.assertEqual(status, "Sent")
+		self.assertEqual((outbox.attempts, outbox.result_name, outbox.last_error), (1, "INV-1", None))
+		outbox.save.assert_called_once()
+		self.frappe.db.commit.assert_called()
+
+	def test_failure_backs_off(self):
+		outbox = self.make_entry()
+		status, _submit = self.process(EIMSSubmissionError("HTTP 500", {"body": 1}))
+		self.assertEqual(status, "Pending")
+		self.assertEqual(outbox.attempts, 1)
+		self.assertEqual(outbox.last_error, "HTTP 500")
+		self.frappe.db.rollback.assert_called_once()
+		self.frappe.log_error.assert_not_called()
+
+	def test_fails_after_max_attempts(self):
+		outbox = self.make_entry(attempts=2)
+		status, _submit = self.process(EIMSSubmissionError("HTTP 500"))
+		self.assertEqual(status, "Failed")
+		self.assertEqual(outbox.attempts, 3)
+		self.frappe.log_error.assert_called_once()
+
+
+class TestDeferral(OutboxTestCase):
+	def test_deferral_delay_doubles_up_to_the_cap(self):
+		self.assertEqual(
+			[get_deferral_seconds(deferrals) for deferrals in (1, 2, 3, 4)],
+			[DEFERRAL_BASE_SECONDS * factor for factor in (1, 2, 4, 8)],
+		)
+		self.assertEqual(get_deferral_seconds(30), DEFERRAL_MAX_SECONDS)
+
+	def test_retry_after_is_a_minimum(self):
+		self.assertEqual(get_deferral_seconds(1, retry_after=30), 30)
+		self.assertEqual(get_deferral_seconds(5, retry_after=1), DEFERRAL_BASE_SECONDS * 16)
+
+	def test_rate_limit_defers_without_an_attempt(self):
+		outbox = self.make_entry(deferrals=3)
+		with patch.object(eims_outbox, "defer_entry") as defer_entry:
+			status, _submit = self.process(EIMSRateLimited("Too many requests!", retry_after=None))
+
+		self.assertEqual(status, "Shed")
+		defer_entry.assert_called_once_with("OUT-1", 4, get_deferral_seconds(4))
+		self.assertEqual(outbox.attempts, 0)
+		outbox.save.assert_not_called()
+
+	def test_shed_by_the_rate_budget_is_a_deferral(self):
+		self.make_entry()
+		with patch.object(eims_outbox, "defer_entry") as defer_entry:
+			status, _submit = self.process(RateBudgetExceeded("no budget"))
+
+		self.assertEqual(status, "Shed")
+		defer_entry.assert_called_once_with("OUT-1", 1, get_deferral_seconds(1, 1))
+
+	def test_counts_an_attempt_past_max_deferrals(self):
+		outbox = self.make_entry(deferrals=MAX_DEFERRALS)
+		with patch.object(eims_outbox, "defer_entry") as defer_entry:
+			status, _submit = self.process(EIMSRateLimited("Too many requests!"))
+
+		defer_entry.assert_not_called()
+		self.assertEqual(status, "Pending")
+		self.assertEqual((outbox.attempts, outbox.deferrals), (1, MAX_DEFERRALS + 1))
+		outbox.save.assert_called_once()
+
+	def test_deferred_submission_is_queued_without_an_attempt(self):
+		self.frappe.db.get_value.return_value = None
+		outbox = enqueue_submission(
+			"Invoice", {"trip_id": "TRIP-1"}, error="Too many requests!", deferred=True, retry_after=None
+		)
+		self.assertEqual((outbox.attempts, outbox.deferrals), (0, 1))
+
+	def test_failed_submission_counts_an_attempt(self):
+		self.frappe.db.get_value.return_value = None
+		outbox = enqueue_submission("Invoice", {"trip_id": "TRIP-1"}, error="HTTP 500")
+		self.assertEqual((outbox.attempts, outbox.deferrals), (1, 0))
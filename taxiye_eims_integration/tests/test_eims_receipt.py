@@ -0,0 +1,91 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import eims_receipt
+from taxiye_eims_integration.utils.eims_receipt import (
+	RECEIPT_COUNTER_FLOOR,
+	get_next_receipt_counter,
+	reserve_receipt_counters,
+	reserved_receipt_counters,
+)
+
+
+class FakeCache:
+	"""The few Redis commands the counter uses, on a dict."""
+
+	def __init__(self):
+		self.values = {}
+		self.round_trips = 0
+
+	def make_key(self, key):
+		return f"site|{key}".encode()
+
+	def eval(self, script, numkeys, key, count):
+		self.round_trips += 1
+		if key not in self.values:
+			return None
+		return self.incrby(key, count)
+
+	def set(self, key, value, nx=False):
+		if not (nx and key in self.values):
+			self.values[key] = int(value)
+
+	def incrby(self, key, count):
+		self.values[key] += count
+		return self.values[key]
+
+
+class TestReceiptCounters(UnitTestCase):
+	def setUp(self):
+		self.cache = FakeCache()
+		self.frappe = MagicMock()
+		self.frappe.cache.return_value = self.cache
+		self.frappe.flags = frappe._dict()
+		self.frappe.db.sql.return_value = ((None,),)
+		patcher = patch.object(eims_receipt, "frappe", self.frappe)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def test_starts_above_the_floor(self):
+		self.assertEqual(
+			list(reserve_receipt_counters(3)), [RECEIPT_COUNTER_FLOOR + offset for offset in (1, 2, 3)]
+		)
+
+	def test_old_random_counters_stay_below_the_floor(self):
+		self.frappe.db.sql.return_value = ((99999,),)
+		self.assertEqual(get_next_receipt_counter(), RECEIPT_COUNTER_FLOOR + 1)
+
+	def test_seeds_from_the_highest_saved_counter(self):
+		self.frappe.db.sql.return_value = ((250000,),)
+		self.assertEqual(get_next_receipt_counter(), 250001)
+		# seeded once: later reservations do not read the database again
+		self.assertEqual(get_next_receipt_counter(), 250002)
+		self.frappe.db.sql.assert_called_once()
+
+	def test_existing_counter_is_not_reseeded(self):
+		self.cache.values[self.cache.make_key(eims_receipt.REDIS_KEY_RECEIPT_COUNTER)] = 300000
+		self.frappe.db.sql.return_value = ((400000,),)
+		self.assertEqual(list(reserve_receipt_counters(2)), [300001, 300002])
+		self.frappe.db.sql.assert_not_called()
+
+	def test_batch_takes_its_counters_in_one_round_trip(self):
+		get_next_receipt_counter()
+		with reserved_receipt_counters(3):
+			counters = [get_next_receipt_counter() for _index in range(3)]
+			self.assertEqual(self.cache.round_trips, 2)
+			# beyond the reservation: single reservations again
+			extra = get_next_receipt_counter()
+
+		self.assertEqual(counters, [RECEIPT_COUNTER_FLOOR + offset for offset in (2, 3, 4)])
+		self.assertEqual(extra, RECEIPT_COUNTER_FLOOR + 5)
+		self.assertIsNone(self.frappe.flags.eims_receipt_counters)
+
+	def test_rejects_empty_reservations(self):
+		self.frappe.throw.side_effect = frappe.ValidationError
+		with self.assertRaises(frappe.ValidationError):
+			reserve_receipt_counters(0)
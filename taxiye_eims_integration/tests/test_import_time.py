@@ -0,0 +1,97 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+import json
+import subprocess
+import sys
+
+from frappe.tests import UnitTestCase
+
+# Modules frappe imports for every worker / bench command (whitelisted endpoints)
+API_MODULES = (
+	"taxiye_eims_integration.api.invoice",
+	"taxiye_eims_integration.api.receipt",
+	"taxiye_eims_integration.utils.auth",
+)
+
+# Must only be loaded on first use, never while importing the api modules
+LAZY_MODULES = ("pydantic", "requests")
+
+# Cumulative import budget for the app's own modules, in microseconds
+IMPORT_TIME_BUDGET_US = 150_000
+
+
+def run_importtime(modules):
+	"""Import `modules` in a fresh interpreter with -X importtime.
+
+	frappe is imported first so its own dependencies are not charged to
+	the app. Returns a list of (cumulative_us, module_name, depth) tuples
+	for everything imported after that point.
+	"""
+	code = "import frappe, frappe.utils.password\nimport sys\nsys.stderr.write('--- app ---\\n')\n"
+	code += "".join(f"import {module}\n" for module in modules)
+	result = subprocess.run(
+		[sys.executable, "-X", "importtime", "-c", code],
+		capture_output=True,
+		text=True,
+		check=True,
+	)
+
+	entries = []
+	lines = result.stderr.split("--- app ---\n", 1)[-1].splitlines()
+	for line in lines:
+		if not line.startswith("import time:") or "|" not in line:
+			continue
+		_self_us, cumulative_us, name = line[len("import time:") :].split("|")
+		if not cumulative_us.strip().isdigit():
+			continue
+		depth = (len(name) - len(name.lstrip())) // 2
+		entries.append((int(cumulative_us), name.strip(), depth))
+	return entries
+
+
+def get_eager_imports(modules, lazy_modules):
+	"""Import `modules` in a fresh interpreter and return the lazy modules the app imports at load.
+
+	frappe may load the same dependencies for itself, so checking what is in
+	sys.modules afterwards proves nothing. Instead every import statement
+	runs through a hook that notes which app module asked for a lazy module.
+	Returns a list of [importing_module, imported_module] pairs.
+	"""
+	code = f"""
+import builtins, json
+
+lazy = {tuple(lazy_modules)!r}
+eager = []
+original_import = builtins.__import__
+
+def tracking_import(name, globals=None, locals=None, fromlist=(), level=0):
+	importer = (globals or {{}}).get("__name__") or ""
+	if level == 0 and name.split(".")[0] in lazy and importer.startswith("taxiye_eims_integration"):
+		eager.append([importer, name])
+	return original_import(name, globals, locals, fromlist, level)
+
+builtins.__import__ = tracking_import
+{"".join(f"import {module}{chr(10)}" for module in modules)}
+builtins.__import__ = original_import
+print(json.dumps(eager))
+"""
+	result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+	return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestImportTime(UnitTestCase):
+	def test_heavy_dependencies_load_lazily(self):
+		eager = get_eager_imports(API_MODULES, LAZY_MODULES)
+		self.assertEqual(eager, [], "these app modules import a lazy dependency at module load")
+
+	def test_import_time_budget(self):
+		entries = run_importtime(API_MODULES)
+		# top level entries (smallest depth) carry the cumulative time of their subtree
+		top_depth = min(depth for _cumulative, _name, depth in entries)
+		total_us = sum(cumulative for cumulative, _name, depth in entries if depth == top_depth)
+		self.assertLess(
+			total_us,
+			IMPORT_TIME_BUDGET_US,
+			f"importing the api modules took {total_us} us (budget {IMPORT_TIME_BUDGET_US} us)",
+		)
@@ -0,0 +1,145 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+import os
+import socket
+from unittest.mock import MagicMock, patch
+
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import eims_outbox, in_flight
+from taxiye_eims_integration.utils.in_flight import (
+	STALE_AFTER_SECONDS,
+	is_abandoned,
+	mark,
+	recover_in_flight,
+	track,
+)
+from taxiye_eims_integration.utils.serialization import dumps, loads
+
+
+class FakeCache:
+	def __init__(self):
+		self.entries = {}
+
+	def make_key(self, key):
+		return key
+
+	def hset(self, key, token, value):
+		self.entries[token] = value
+
+	def hdel(self, key, token):
+		return 1 if self.entries.pop(token, None) is not None else 0
+
+	def hgetall(self, key):
+		return dict(self.entries)
+
+
+class InFlightTestCase(UnitTestCase):
+	def setUp(self):
+		self.cache = FakeCache()
+		self.frappe = MagicMock()
+		self.frappe.cache.return_value = self.cache
+		self.frappe.generate_hash.return_value = "token"
+		for target, value in (
+			("frappe", self.frappe),
+			("install_signal_handlers", lambda: None),
+			("inc", MagicMock()),
+		):
+			patcher = patch.object(in_flight, target, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+
+class TestTrack(InFlightTestCase):
+	def test_entry_is_dropped_once_saved(self):
+		with track("Invoice", {"trip_id": "TRIP-1"}):
+			entry = loads(self.cache.entries["token"])
+			self.assertEqual((entry["submission_type"], entry["payload"]), ("Invoice", {"trip_id": "TRIP-1"}))
+			self.assertEqual(entry["pid"], os.getpid())
+		self.assertEqual(self.cache.entries, {})
+
+	def test_unacknowledged_failure_drops_the_entry(self):
+		with self.assertRaises(RuntimeError), track("Invoice", {}):
+			mark("journal-1")
+			raise RuntimeError("EIMS is down")
+		self.assertEqual(self.cache.entries, {})
+
+	def test_acknowledged_failure_keeps_the_entry_for_recovery(self):
+		with self.assertRaises(RuntimeError), track("Invoice", {}):
+			mark("journal-1", acknowledged=True)
+			raise RuntimeError("save failed")
+
+		entry = loads(self.cache.entries["token"])
+		self.assertEqual((entry["journal_key"], entry["acknowledged"]), ("journal-1", True))
+
+	def test_mark_outside_a_submission_is_ignored(self):
+		mark("journal-1", acknowledged=True)
+		self.assertEqual(self.cache.entries, {})
+
+
+class TestIsAbandoned(UnitTestCase):
+	def entry(self, **values):
+		return {"host": socket.gethostname(), "pid": os.getpid(), "updated_at": 1000.0, **values}
+
+	def test_live_worker(self):
+		self.assertFalse(is_abandoned(self.entry(), 1000.0))
+
+	def test_stale_entry(self):
+		self.assertTrue(is_abandoned(self.entry(), 1001.0 + STALE_AFTER_SECONDS))
+
+	def test_dead_worker_on_this_host(self):
+		with patch.object(in_flight.os, "kill", side_effect=ProcessLookupError):
+			self.assertTrue(is_abandoned(self.entry(), 1000.0))
+
+	def test_worker_on_another_host_is_left_until_stale(self):
+		with patch.object(in_flight.os, "kill", side_effect=ProcessLookupError):
+			self.assertFalse(is_abandoned(self.entry(host="other-host"), 1000.0))
+
+
+class TestRecoverInFlight(InFlightTestCase):
+	def setUp(self):
+		super().setUp()
+		self.abandoned = {"abandoned"}
+		patcher = patch.object(in_flight, "is_abandoned", lambda entry, now: entry["token"] in self.abandoned)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def add(self, token, **entry):
+		self.cache.entries[token] = dumps({"token": token, "journal_key": None, **entry})
+
+	def test_requeues_unacknowledged_submissions_of_gone_workers(self):
+		self.add("abandoned", submission_type="Receipt", payload={"invoice_id": "INV-1"})
+		self.add("live", submission_type="Receipt", payload={"invoice_id": "INV-2"})
+
+		with patch.object(eims_outbox, "enqueue_submission") as enqueue_submission:
+			self.assertEqual(recover_in_flight(), {"requeued": 1})
+
+		enqueue_submission.assert_called_once()
+		self.assertEqual(enqueue_submission.call_args.kwargs["reference_id"], "INV-1")
+		self.assertEqual(list(self.cache.entries), ["live"])
+
+	def test_saves_acknowledged_invoices_from_the_journal(self):
+		self.add("abandoned", submission_type="Invoice", payload={"trip_id": "TRIP-1"}, journal_key="journal-1")
+		ack = {"sequence": 7, "response": {}}
+
+		with (
+			patch.object(in_flight, "get_acknowledgement", return_value=ack) as get_acknowledgement,
+			patch.object(in_flight, "recover_invoice") as recover_invoice,
+			patch("taxiye_eims_integration.api.schemas.InvoicePayload", side_effect=lambda **payload: payload),
+		):
+			self.assertEqual(recover_in_flight(), {"saved": 1})
+
+		get_acknowledgement.assert_called_once_with("journal-1")
+		recover_invoice.assert_called_once_with({"trip_id": "TRIP-1"}, ack)
+
+	def test_failed_recovery_puts_the_entry_back(self):
+		self.add("abandoned", submission_type="Receipt", payload={"invoice_id": "INV-1"})
+		raw = self.cache.entries["abandoned"]
+
+		with patch.object(in_flight, "resolve_entry", side_effect=RuntimeError("db down")):
+			self.assertEqual(recover_in_flight(), {})
+
+		self.assertEqual(self.cache.entries, {"abandoned": raw})
+		self.frappe.db.rollback.assert_called_once()
+		self.frappe.log_error.assert_called_once()
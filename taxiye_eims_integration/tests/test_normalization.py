@@ -0,0 +1,25 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils.normalization import normalize_batch
+
+
+class TestNormalizeBatch(UnitTestCase):
+	def test_phones_are_checked_against_the_pattern(self):
+		result = normalize_batch(
+			phones=["0911234567", "+251 911 234 567", "911-23-45-67", "12345", "251 123", "", None]
+		)
+
+		self.assertEqual(
+			result["phones"],
+			["+2510911234567", "+251911234567", "+251911234567", "", "", "", ""],
+		)
+		self.assertEqual(result["stats"]["phones"], {"total": 7, "valid": 3, "invalid": 2, "empty": 2})
+
+	def test_tins(self):
+		result = normalize_batch(tins=["0012-345-678", "12", None])
+
+		self.assertEqual(result["tins"], ["0012345678", "", ""])
+		self.assertEqual(result["stats"]["tins"], {"total": 3, "valid": 1, "invalid": 2})
@@ -0,0 +1,111 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+from collections import Counter
+from unittest.mock import MagicMock, patch
+
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import rate_budget
+from taxiye_eims_integration.utils.rate_budget import (
+	BACKGROUND,
+	INTERACTIVE,
+	RETRY,
+	acquire,
+	get_class_limits,
+	priority_class,
+)
+
+
+class FakeCache:
+	def __init__(self):
+		self.values = Counter()
+		self.stats = Counter()
+
+	def make_key(self, key):
+		return f"site|{key}"
+
+	def incr(self, key):
+		self.values[key] += 1
+		return self.values[key]
+
+	def decr(self, key):
+		self.values[key] -= 1
+		return self.values[key]
+
+	def expire(self, key, seconds):
+		pass
+
+	def hincrby(self, key, field, amount):
+		self.stats[field] += amount
+
+
+class FakeClock:
+	def __init__(self, now=1000.0):
+		self.now = now
+
+	def time(self):
+		return self.now
+
+	def monotonic(self):
+		return self.now
+
+	def sleep(self, seconds):
+		self.now += seconds
+
+
+class TestRateBudget(UnitTestCase):
+	def setUp(self):
+		self.cache = FakeCache()
+		self.clock = FakeClock()
+		self.frappe = MagicMock()
+		self.frappe.cache.return_value = self.cache
+		self.frappe.conf = {"eims_rate_limit_per_second": 10, "eims_interactive_reserved_share": 0.3}
+		self.frappe.flags.eims_priority_class = None
+		self.frappe.flags.eims_priority_wait = None
+		for target, value in (("frappe", self.frappe), ("time", self.clock)):
+			patcher = patch.object(rate_budget, target, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def take(self, name, times):
+		return [acquire(name) for _ in range(times)]
+
+	def test_class_limits(self):
+		self.assertEqual(get_class_limits(), {INTERACTIVE: 10, RETRY: 7, BACKGROUND: 3})
+
+	def test_lower_classes_are_shed_first(self):
+		self.assertEqual(self.take(BACKGROUND, 4), [True, True, True, False])
+		self.assertEqual(self.take(RETRY, 5), [True, True, True, True, False])
+		self.assertEqual(self.take(INTERACTIVE, 4), [True, True, True, False])
+		self.assertFalse(acquire(BACKGROUND))
+		self.assertEqual(
+			self.cache.stats, Counter({"background:shed": 2, "retry:shed": 1, "interactive:shed": 1})
+		)
+
+	def test_shed_token_is_given_back(self):
+		self.take(BACKGROUND, 10)
+		self.assertEqual(self.take(INTERACTIVE, 8), [True] * 7 + [False])
+
+	def test_a_new_window_resets_the_budget(self):
+		self.take(INTERACTIVE, 10)
+		self.assertFalse(acquire(BACKGROUND))
+		self.clock.now += 1
+		self.assertTrue(acquire(BACKGROUND))
+
+	def test_waits_for_the_next_window_only_when_asked(self):
+		self.take(INTERACTIVE, 10)
+		self.assertFalse(acquire(BACKGROUND))
+		self.assertEqual(self.clock.now, 1000.0)
+
+		with priority_class(BACKGROUND, wait_seconds=5):
+			self.assertTrue(acquire())
+		self.assertEqual(self.clock.now, 1001.0)
+		self.assertEqual(self.cache.stats["background:deferred"], 1)
+
+	def test_priority_class_applies_to_calls_inside_the_block(self):
+		self.take(INTERACTIVE, 5)
+		with priority_class(BACKGROUND):
+			self.assertFalse(acquire())
+		self.assertIsNone(self.frappe.flags.eims_priority_class)
+		self.assertTrue(acquire())
@@ -0,0 +1,91 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+import datetime
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import archive, rollups
+from taxiye_eims_integration.utils.rollups import get_rollup_deltas, get_rollup_name, rebuild_rollups
+
+INVOICE = frappe._dict(
+	date="2026-01-15",
+	time="08:45:03",
+	taxi_provider_tin="0079140416",
+	status="Completed",
+	base_fare=90,
+	commission_amount=10,
+	amount=100,
+	tax=15,
+	total_payment=115,
+)
+
+
+class TestRollupDeltas(UnitTestCase):
+	def test_invoice_buckets_by_trip_time(self):
+		hour, day = get_rollup_deltas("Invoice", INVOICE)
+		self.assertEqual(
+			hour[:6], ("Hour", datetime.datetime(2026, 1, 15, 8), "Invoice", "0079140416", "Completed", "INV")
+		)
+		self.assertEqual(day[:2], ("Day", datetime.datetime(2026, 1, 15)))
+		self.assertEqual(hour[6:], (1, 90.0, 10.0, 100.0, 15.0, 115.0))
+
+	def test_credit_notes_get_rows_of_their_own(self):
+		credit_note = frappe._dict(INVOICE, document_type="CRE")
+		invoice_row = get_rollup_deltas("Invoice", INVOICE)[0]
+		credit_row = get_rollup_deltas("Invoice", credit_note)[0]
+		self.assertEqual(credit_row[5], "CRE")
+		self.assertNotEqual(get_rollup_name(*invoice_row[:6]), get_rollup_name(*credit_row[:6]))
+
+	def test_receipts_have_no_tin_or_document_type(self):
+		receipt = frappe._dict(
+			status="Acknowledged", creation=datetime.datetime(2026, 1, 15, 9, 30), total_payment=115
+		)
+		hour = get_rollup_deltas("Receipt", receipt)[0]
+		self.assertEqual(hour[:6], ("Hour", datetime.datetime(2026, 1, 15, 9), "Receipt", None, "Acknowledged", None))
+
+	def test_removal_subtracts(self):
+		hour = get_rollup_deltas("Invoice", INVOICE, -1)[0]
+		self.assertEqual(hour[6:], (-1, -90.0, -10.0, -100.0, -15.0, -115.0))
+
+
+class TestOnUpdate(UnitTestCase):
+	def update(self, before, after):
+		doc = MagicMock(doctype="Trip Invoice")
+		doc.get.side_effect = after.get
+		doc.get_doc_before_save.return_value = before
+		with patch.object(rollups, "apply_rollup_deltas") as apply:
+			rollups.on_update(doc)
+		return apply
+
+	def test_untracked_change_is_ignored(self):
+		self.update(INVOICE, frappe._dict(INVOICE, description="edited")).assert_not_called()
+
+	def test_document_type_change_moves_the_invoice(self):
+		apply = self.update(INVOICE, frappe._dict(INVOICE, document_type="CRE"))
+		deltas = apply.call_args.args[0]
+		self.assertEqual([(delta[5], delta[6]) for delta in deltas], [("INV", -1), ("INV", -1), ("CRE", 1), ("CRE", 1)])
+
+
+class TestRebuildRollups(UnitTestCase):
+	def test_recomputes_every_bucket_and_source_from_the_archive_union(self):
+		fake_frappe = MagicMock()
+		with (
+			patch.object(rollups, "frappe", fake_frappe),
+			patch.object(archive, "get_rows_with_archive", side_effect=lambda doctype, columns: f"<{doctype}>"),
+		):
+			rebuild_rollups()
+
+		statements = [call.args[0] for call in fake_frappe.db.sql.call_args_list]
+		self.assertIn("delete from `tabTrip Stats Rollup`", statements[0])
+		inserts = statements[1:]
+		self.assertEqual(len(inserts), 4)
+		invoice_inserts = [sql for sql in inserts if "<Trip Invoice>" in sql]
+		receipt_inserts = [sql for sql in inserts if "<Trip Receipt>" in sql]
+		self.assertEqual((len(invoice_inserts), len(receipt_inserts)), (2, 2))
+		for sql in invoice_inserts:
+			self.assertIn("group by", sql)
+			self.assertIn("coalesce(document_type, 'INV')", sql.split("group by")[1])
+		fake_frappe.db.commit.assert_called_once()
@@ -0,0 +1,140 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import seller_details
+from taxiye_eims_integration.utils.seller_details import (
+	DEFAULT_TIN,
+	build_receipt_seller,
+	build_seller_details,
+	get_receipt_seller,
+	get_seller_details,
+)
+
+SELLER_DETAILS_KEYS = {
+	"City",
+	"Email",
+	"LegalName",
+	"Locality",
+	"Phone",
+	"Region",
+	"SubCity",
+	"Wereda",
+	"Tin",
+	"VatNumber",
+}
+
+
+def make_settings(**values):
+	return frappe._dict(
+		{
+			"city": "Addis Ababa",
+			"email": "tax@taxiye.com",
+			"legalname": "Taxiye Technologies PLC",
+			"locality": "Bole",
+			"phone": "0911 234 567",
+			"region": "AA",
+			"subcity": "Bole",
+			"woreda": "03",
+			"tin": "0012-345-678",
+			"seller_tin": "0087654321",
+			"vatnumber": "VAT-1",
+			"systemnumber": "SYS-1",
+			"client_id": "client",
+			"client_secret": "secret",
+			"api_key": "key",
+			"mor_base_url": "http://core.mor.gov.et",
+			**values,
+		}
+	)
+
+
+class TestSellerDetailsShape(UnitTestCase):
+	def test_holds_the_seller_fields_only(self):
+		details = build_seller_details(make_settings())
+
+		self.assertEqual(set(details), SELLER_DETAILS_KEYS)
+		self.assertEqual(
+			details,
+			{
+				"City": "Addis Ababa",
+				"Email": "tax@taxiye.com",
+				"LegalName": "Taxiye Technologies PLC",
+				"Locality": "Bole",
+				"Phone": "+2510911234567",
+				"Region": "AA",
+				"SubCity": "Bole",
+				"Wereda": "03",
+				"Tin": "0012345678",
+				"VatNumber": "VAT-1",
+			},
+		)
+
+	def test_empty_optional_fields_are_null(self):
+		details = build_seller_details(make_settings(city="", vatnumber="", tin=""))
+		self.assertEqual((details["City"], details["VatNumber"], details["Tin"]), (None, None, DEFAULT_TIN))
+
+	def test_receipt_seller(self):
+		self.assertEqual(
+			build_receipt_seller(make_settings()), {"seller_tin": "0087654321", "systemnumber": "SYS-1"}
+		)
+		self.assertEqual(
+			build_receipt_seller(make_settings(seller_tin=None, systemnumber="")),
+			{"seller_tin": DEFAULT_TIN, "systemnumber": None},
+		)
+
+
+class TestSharedBlock(UnitTestCase):
+	def setUp(self):
+		self.shared = {}
+		self.version = 1
+		self.settings = make_settings()
+		self.load_settings = MagicMock(side_effect=lambda: self.settings)
+		self.frappe = MagicMock()
+		self.frappe.local.site = "site1"
+		cache = self.frappe.cache.return_value
+		cache.make_key.side_effect = lambda key: key
+		cache.get.side_effect = self.shared.get
+		cache.set.side_effect = self.shared.__setitem__
+		for target, value in (
+			("frappe", self.frappe),
+			("_blocks", {}),
+			("get_version", lambda: self.version),
+			("site_key", lambda key: key.format(self.frappe.local.site)),
+			("load_settings", self.load_settings),
+			("time", MagicMock(monotonic=MagicMock(side_effect=range(0, 10**6, 100)))),
+		):
+			patcher = patch.object(seller_details, target, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def other_worker(self):
+		seller_details._blocks.clear()
+
+	def test_other_workers_take_the_block_from_redis(self):
+		details = get_seller_details()
+		self.other_worker()
+
+		self.assertEqual(get_seller_details(), details)
+		self.assertEqual(get_receipt_seller()["systemnumber"], "SYS-1")
+		self.load_settings.assert_called_once()
+
+	def test_new_version_rebuilds_the_block(self):
+		get_seller_details()
+		self.version = 2
+		self.settings = make_settings(legalname="Taxiye PLC")
+
+		self.assertEqual(get_seller_details()["LegalName"], "Taxiye PLC")
+		self.assertEqual(self.load_settings.call_count, 2)
+
+	def test_unchanged_content_keeps_the_block_workers_hold(self):
+		details = get_seller_details()
+		self.version = 2
+		self.settings = make_settings(client_secret="rotated")
+
+		self.assertIs(get_seller_details(), details)
+		self.assertEqual(self.load_settings.call_count, 2)
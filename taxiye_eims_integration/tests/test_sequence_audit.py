@@ -0,0 +1,78 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+import datetime
+from unittest.mock import patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import sequence_audit
+from taxiye_eims_integration.utils.sequence_audit import ISSUE_TYPES, find_sequence_issues
+
+CREATED = datetime.datetime(2026, 1, 15, 8, 0, 0)
+
+
+def make_row(name, number, counter, previous_number, previous_counter, irn="irn", **values):
+	"""A row as the LAG query returns it; by default well chained to the row before."""
+	return frappe._dict(
+		{
+			"name": name,
+			"document_number": number,
+			"invoice_counter": counter,
+			"irn": irn,
+			"previous_irn": "previous",
+			"creation": CREATED,
+			"previous_number": previous_number,
+			"previous_counter": previous_counter,
+			"previous_row_irn": "previous",
+			"number_created_before": previous_number,
+			**values,
+		}
+	)
+
+
+class TestFindSequenceIssues(UnitTestCase):
+	def find(self, rows, limit=100):
+		with patch.object(sequence_audit.frappe.db, "sql", return_value=rows):
+			return find_sequence_issues(limit=limit)
+
+	def test_classifies_each_issue(self):
+		issues = self.find(
+			[
+				# first row of the range: only checked for a missing IRN
+				make_row("INV-10", 10, 10, None, None, irn="", previous_row_irn=None, number_created_before=None),
+				make_row("INV-13", 13, 11, 10, 10),
+				make_row("INV-13b", 13, 12, 13, 11),
+				make_row("INV-14", 14, 16, 13, 12),
+				make_row("INV-15", 15, 17, 14, 16, number_created_before=20),
+				make_row("INV-16", 16, 18, 15, 17, previous_irn="wrong"),
+			]
+		)
+		self.assertEqual(issues["placeholders"], [{"name": "INV-10", "document_number": 10}])
+		self.assertEqual(issues["gaps"], [{"from": 11, "to": 12}])
+		self.assertEqual(issues["duplicates"], [{"name": "INV-13b", "document_number": 13}])
+		self.assertEqual(
+			issues["counter_mismatches"], [{"name": "INV-14", "document_number": 14, "invoice_counter": 16}]
+		)
+		self.assertEqual(issues["out_of_order"], [{"name": "INV-15", "document_number": 15, "creation": CREATED}])
+		self.assertEqual(
+			issues["broken_links"], [{"name": "INV-16", "document_number": 16, "previous_irn": "wrong"}]
+		)
+		self.assertFalse(issues["truncated"])
+
+	def test_duplicate_is_not_a_counter_mismatch_or_broken_link(self):
+		issues = self.find([make_row("INV-5b", 5, 5, 5, 5, previous_irn="other")])
+		self.assertEqual(issues["duplicates"], [{"name": "INV-5b", "document_number": 5}])
+		self.assertEqual(issues["counter_mismatches"], [])
+		self.assertEqual(issues["broken_links"], [])
+
+	def test_link_after_a_placeholder_is_not_broken(self):
+		# the placeholder has no IRN to link to yet
+		issues = self.find([make_row("INV-8", 8, 8, 7, 7, previous_irn=None, previous_row_irn=None)])
+		self.assertEqual(issues["broken_links"], [])
+
+	def test_clean_chain_and_truncation(self):
+		issues = self.find([make_row("INV-2", 2, 2, 1, 1)], limit=1)
+		self.assertEqual({issue_type: issues[issue_type] for issue_type in ISSUE_TYPES}, dict.fromkeys(ISSUE_TYPES, []))
+		self.assertTrue(issues["truncated"])
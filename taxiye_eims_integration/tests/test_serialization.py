@@ -0,0 +1,55 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+import datetime
+import json
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import serialization
+from taxiye_eims_integration.utils.serialization import canonical_dumps, dumps, payload_hash
+
+# what invoice and receipt bodies carry: nested dicts, lists, None, dates
+# and Decimals from the database, non-ASCII names
+PAYLOAD = {
+	"DocumentDetails": {"DocumentNumber": 41, "Date": datetime.datetime(2026, 1, 15, 8, 45, 3)},
+	"BuyerDetails": {"LegalName": "ታክሲዬ", "Tin": None},
+	"ItemList": [{"Quantity": 1, "UnitPrice": Decimal("100.00"), "TaxAmount": 15.0}],
+	"ValueDetails": {"TotalValue": 115.25, "Discount": 0},
+	"Version": "1",
+}
+
+
+def stdlib_dumps(obj):
+	with patch.object(serialization, "orjson", None):
+		return dumps(obj)
+
+
+class TestSerialization(UnitTestCase):
+	def test_canonical_dumps_is_the_stdlib_encoding(self):
+		self.assertEqual(
+			canonical_dumps(PAYLOAD),
+			json.dumps(PAYLOAD, default=str, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode(),
+		)
+
+	def test_canonical_dumps_makes_keys_str(self):
+		self.assertEqual(canonical_dumps({2: "b", "1": "a", True: "c"}), b'{"1":"a","2":"b","true":"c"}')
+
+	@unittest.skipIf(serialization.orjson is None, "orjson is not installed")
+	def test_dumps_matches_the_stdlib_for_payloads(self):
+		self.assertEqual(dumps(PAYLOAD), stdlib_dumps(PAYLOAD))
+
+	def test_payload_hash_does_not_depend_on_the_backend(self):
+		# exponent floats are encoded differently by orjson (1e-7) and the stdlib (1e-07)
+		payload = {**PAYLOAD, "Rate": 1e-07, 3: "non-str key"}
+		expected = payload_hash(payload)
+		with patch.object(serialization, "orjson", None):
+			self.assertEqual(payload_hash(payload), expected)
+
+	def test_loads_round_trip(self):
+		data = {"a": [1, 2.5, None], "b": "ታክሲ"}
+		self.assertEqual(serialization.loads(dumps(data)), data)
+		self.assertEqual(serialization.loads(stdlib_dumps(data).decode()), data)
@@ -0,0 +1,87 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import settings
+from taxiye_eims_integration.utils.settings import VERSION_CHECK_SECONDS, bump_version, get_settings, invalidate_settings
+
+
+class FakeCache:
+	def __init__(self):
+		self.values = {}
+
+	def make_key(self, key):
+		return key
+
+	def get(self, key):
+		return self.values.get(key)
+
+	def incr(self, key):
+		self.values[key] = self.values.get(key, 0) + 1
+
+
+class TestSettingsSnapshot(UnitTestCase):
+	def setUp(self):
+		self.cache = FakeCache()
+		self.now = 100.0
+		self.loads = 0
+		self.frappe = MagicMock()
+		self.frappe.local.site = "site1"
+		self.frappe.cache.return_value = self.cache
+		for target, value in (
+			("frappe", self.frappe),
+			("_snapshots", {}),
+			("load_settings", self.load_settings),
+			("time", MagicMock(monotonic=lambda: self.now)),
+		):
+			patcher = patch.object(settings, target, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def load_settings(self):
+		self.loads += 1
+		return frappe._dict(site=self.frappe.local.site, load=self.loads)
+
+	def test_snapshot_is_reused(self):
+		first = get_settings()
+		self.now += VERSION_CHECK_SECONDS + 1
+		self.assertIs(get_settings(), first)
+		self.assertEqual(self.loads, 1)
+
+	def test_version_bump_reloads_after_the_check_interval(self):
+		get_settings()
+		# another worker saved the settings
+		self.cache.incr("eims:site1:settings_version")
+
+		self.assertEqual(get_settings().load, 1)
+		self.now += VERSION_CHECK_SECONDS
+		self.assertEqual(get_settings().load, 2)
+
+	def test_bump_reloads_the_local_snapshot_at_once(self):
+		get_settings()
+		bump_version()
+		self.assertEqual(get_settings().load, 2)
+		self.assertEqual(self.cache.values, {"eims:site1:settings_version": 1})
+
+	def test_snapshots_are_kept_per_site(self):
+		self.assertEqual(get_settings().site, "site1")
+		self.frappe.local.site = "site2"
+		self.assertEqual(get_settings().site, "site2")
+		self.frappe.local.site = "site1"
+		self.assertEqual(get_settings().load, 1)
+
+		bump_version()
+		self.frappe.local.site = "site2"
+		self.assertEqual(get_settings().load, 2)
+
+	def test_invalidation_waits_for_the_commit(self):
+		get_settings()
+		invalidate_settings()
+
+		self.frappe.db.after_commit.add.assert_called_once_with(bump_version)
+		self.assertEqual(self.cache.values, {})
+		self.assertEqual(get_settings().load, 1)
@@ -0,0 +1,78 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils.submission_journal import journal_key, split_sequence
+
+INVOICE_BODY = {
+	"DocumentDetails": {"DocumentNumber": 41, "Date": "2026-01-15T00:00:00+03:00"},
+	"SourceSystem": {"InvoiceCounter": 41, "SystemType": "POS"},
+	"ReferenceDetails": {"PreviousIrn": "a" * 64, "RelatedDocument": None},
+	"ValueDetails": {"TotalValue": 115.0},
+}
+
+
+def renumbered(body, number, previous_irn):
+	"""The body a retry sends after a resync."""
+	return {
+		**body,
+		"DocumentDetails": {**body["DocumentDetails"], "DocumentNumber": number},
+		"SourceSystem": {**body["SourceSystem"], "InvoiceCounter": number},
+		"ReferenceDetails": {**body["ReferenceDetails"], "PreviousIrn": previous_irn},
+	}
+
+
+class TestSplitSequence(UnitTestCase):
+	def test_strips_register_sequence_fields(self):
+		stripped, sequence = split_sequence("register", INVOICE_BODY)
+		self.assertEqual(
+			sequence,
+			{
+				"DocumentDetails.DocumentNumber": 41,
+				"SourceSystem.InvoiceCounter": 41,
+				"ReferenceDetails.PreviousIrn": "a" * 64,
+			},
+		)
+		self.assertEqual(stripped["DocumentDetails"], {"Date": "2026-01-15T00:00:00+03:00"})
+		self.assertEqual(stripped["SourceSystem"], {"SystemType": "POS"})
+		self.assertEqual(stripped["ReferenceDetails"], {"RelatedDocument": None})
+		self.assertEqual(stripped["ValueDetails"], INVOICE_BODY["ValueDetails"])
+
+	def test_leaves_the_body_alone(self):
+		split_sequence("register", INVOICE_BODY)
+		self.assertEqual(INVOICE_BODY["DocumentDetails"]["DocumentNumber"], 41)
+		self.assertEqual(INVOICE_BODY["ReferenceDetails"]["PreviousIrn"], "a" * 64)
+
+	def test_strips_receipt_counters(self):
+		body = {"ReceiptNumber": "INV-1", "ReceiptCounter": 7, "ManualReceiptNumber": None}
+		stripped, sequence = split_sequence("receipt/sales", body)
+		self.assertEqual(stripped, {"ReceiptNumber": "INV-1"})
+		self.assertEqual(sequence, {"ReceiptCounter": 7, "ManualReceiptNumber": None})
+
+	def test_unknown_path_keeps_everything(self):
+		stripped, sequence = split_sequence("auth/login", {"tin": "0079140416"})
+		self.assertEqual(stripped, {"tin": "0079140416"})
+		self.assertEqual(sequence, {})
+
+
+class TestJournalKey(UnitTestCase):
+	def test_retry_after_resync_keeps_the_key(self):
+		self.assertEqual(
+			journal_key("register", INVOICE_BODY, "TRIP-1"),
+			journal_key("register", renumbered(INVOICE_BODY, 42, "b" * 64), "TRIP-1"),
+		)
+
+	def test_different_trips_get_different_keys(self):
+		# two trips of the same rider, same amounts, same date: identical bodies
+		self.assertNotEqual(
+			journal_key("register", INVOICE_BODY, "TRIP-1"),
+			journal_key("register", INVOICE_BODY, "TRIP-2"),
+		)
+
+	def test_body_and_path_are_part_of_the_key(self):
+		changed = {**INVOICE_BODY, "ValueDetails": {"TotalValue": 230.0}}
+		self.assertNotEqual(journal_key("register", INVOICE_BODY, "TRIP-1"), journal_key("register", changed, "TRIP-1"))
+		self.assertNotEqual(
+			journal_key("register", INVOICE_BODY, "TRIP-1"), journal_key("receipt/sales", INVOICE_BODY, "TRIP-1")
+		)
@@ -0,0 +1,138 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+import json
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import trip_ingest
+from taxiye_eims_integration.utils.trip_ingest import FileTripSource, filter_new_trips, ingest_trips
+
+
+class FakeTripSource:
+	def __init__(self, pages):
+		self.pages = pages
+		self.cursors = []
+
+	def fetch_page(self, cursor):
+		self.cursors.append(cursor)
+		return self.pages[cursor]
+
+
+class TestFileTripSource(UnitTestCase):
+	def setUp(self):
+		fd, self.path = tempfile.mkstemp(suffix=".jsonl")
+		self.addCleanup(os.remove, self.path)
+		with os.fdopen(fd, "w") as f:
+			for i in range(1, 6):
+				f.write(json.dumps({"trip_id": f"TRIP-{i}"}) + "\n")
+				if i == 2:
+					f.write("\n")
+
+	def test_pages_by_byte_offset(self):
+		source = FileTripSource(self.path, page_size=2)
+		trip_ids, cursor = [], None
+		while True:
+			trips, cursor = source.fetch_page(cursor)
+			trip_ids.append([trip["trip_id"] for trip in trips])
+			if not cursor:
+				break
+
+		self.assertEqual(trip_ids, [["TRIP-1", "TRIP-2"], ["TRIP-3", "TRIP-4"], ["TRIP-5"], []])
+
+	def test_end_of_file_keeps_the_offset_for_appended_trips(self):
+		source = FileTripSource(self.path, page_size=10)
+		trips, cursor = source.fetch_page(None)
+		self.assertEqual(len(trips), 5)
+		self.assertEqual(cursor, str(os.path.getsize(self.path)))
+
+		with open(self.path, "a") as f:
+			f.write(json.dumps({"trip_id": "TRIP-6"}) + "\n")
+		self.assertEqual([trip["trip_id"] for trip in source.fetch_page(cursor)[0]], ["TRIP-6"])
+
+
+class TestFilterNewTrips(UnitTestCase):
+	def test_drops_known_duplicate_and_missing_ids(self):
+		trips = [
+			{"trip_id": "TRIP-1"},
+			{"trip_id": "TRIP-2"},
+			{"fare": 10},
+			{"trip_id": "TRIP-3"},
+			{"trip_id": "TRIP-3", "fare": 20},
+		]
+		with patch.object(trip_ingest, "get_known_trip_ids", return_value={"TRIP-2"}) as known:
+			new_trips = filter_new_trips(trips)
+
+		known.assert_called_once_with(["TRIP-1", "TRIP-2", "TRIP-3"])
+		self.assertEqual(new_trips, [{"trip_id": "TRIP-1"}, {"trip_id": "TRIP-3"}])
+
+
+class TestIngestTrips(UnitTestCase):
+	def setUp(self):
+		self.settings = MagicMock(enabled=1, cursor="c0", max_trips_per_run=500)
+		self.frappe = MagicMock()
+		self.frappe.get_single.return_value = self.settings
+		self.queued = []
+		for target, value in (
+			("frappe", self.frappe),
+			("filter_new_trips", lambda trips: trips),
+			("queue_trips", self.queue_trips),
+		):
+			patcher = patch.object(trip_ingest, target, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def queue_trips(self, trips):
+		self.queued.extend(trips)
+		return len(trips)
+
+	def ingest(self, pages):
+		source = FakeTripSource(pages)
+		with patch.object(trip_ingest, "get_trip_source", return_value=source):
+			return ingest_trips(), source
+
+	def cursor_checkpoints(self):
+		return [c.args[1] for c in self.settings.db_set.call_args_list if c.args[0] == "cursor"]
+
+	def test_resumes_from_the_saved_cursor_and_checkpoints_each_page(self):
+		queued, source = self.ingest(
+			{
+				"c0": ([{"trip_id": "TRIP-1"}, {"trip_id": "TRIP-2"}], "c1"),
+				"c1": ([{"trip_id": "TRIP-3"}], None),
+			}
+		)
+
+		self.assertEqual(queued, 3)
+		self.assertEqual(source.cursors, ["c0", "c1"])
+		self.assertEqual(self.cursor_checkpoints(), ["c1"])
+
+	def test_stops_at_the_run_budget(self):
+		self.settings.max_trips_per_run = 2
+		queued, source = self.ingest(
+			{
+				"c0": ([{"trip_id": "TRIP-1"}, {"trip_id": "TRIP-2"}], "c1"),
+				"c1": ([{"trip_id": "TRIP-3"}], None),
+			}
+		)
+
+		self.assertEqual(queued, 2)
+		self.assertEqual(source.cursors, ["c0"])
+		self.assertEqual(self.cursor_checkpoints(), ["c1"])
+
+	def test_cursor_is_saved_only_after_the_page_is_queued(self):
+		def fail(trips):
+			raise RuntimeError("queue failed")
+
+		with patch.object(trip_ingest, "queue_trips", fail), self.assertRaises(RuntimeError):
+			self.ingest({"c0": ([{"trip_id": "TRIP-1"}], "c1")})
+
+		self.assertEqual(self.cursor_checkpoints(), [])
+
+	def test_disabled_settings_do_nothing(self):
+		self.settings.enabled = 0
+		queued, source = self.ingest({})
+		self.assertIsNone(queued)
+		self.assertEqual(source.cursors, [])
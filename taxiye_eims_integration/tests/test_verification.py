@@ -0,0 +1,111 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import verification
+from taxiye_eims_integration.utils.verification import verify_documents
+
+TOKENS = {
+	"qr-irn-1": {"valid": True, "kid": "k1", "claims": {"IRN": "IRN-1"}},
+	"invoice-irn-1": {"valid": True, "kid": "k1", "claims": {"irn": "IRN-1"}},
+	"qr-no-irn": {"valid": True, "kid": "k1", "claims": {"total": 100}},
+	"forged": {"valid": False, "error": "Signature verification failed"},
+}
+
+
+class TestVerifyDocuments(UnitTestCase):
+	def setUp(self):
+		self.frappe = MagicMock()
+		self.frappe.throw.side_effect = Exception
+		for target, value in (
+			("frappe", self.frappe),
+			("get_public_keys_json", lambda: "jwks"),
+			("verify_token", lambda token, raw_jwks: TOKENS[token]),
+		):
+			patcher = patch.object(verification, target, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def test_signatures_for_the_irn_are_valid(self):
+		[result] = verify_documents([{"irn": "IRN-1", "signed_qr": "qr-irn-1", "signed_invoice": "invoice-irn-1"}])
+		self.assertTrue(result["valid"])
+		self.assertEqual(set(result["checks"]), {"signed_qr", "signed_invoice"})
+
+	def test_valid_signature_for_another_irn_is_rejected(self):
+		[result] = verify_documents([{"irn": "IRN-2", "signed_qr": "qr-irn-1"}])
+		self.assertFalse(result["valid"])
+		self.assertEqual(result["checks"]["signed_qr"]["error"], "Signed IRN IRN-1 does not match IRN-2")
+		# the cached verification result is not changed
+		self.assertTrue(TOKENS["qr-irn-1"]["valid"])
+
+	def test_signature_without_an_irn_claim_does_not_match(self):
+		[result] = verify_documents([{"irn": "IRN-1", "signed_qr": "qr-no-irn"}])
+		self.assertFalse(result["valid"])
+
+	def test_without_an_irn_only_the_signature_is_checked(self):
+		[result] = verify_documents([{"signed_qr": "qr-no-irn"}])
+		self.assertTrue(result["valid"])
+
+	def test_invalid_signature(self):
+		[result] = verify_documents([{"irn": "IRN-1", "signed_qr": "qr-irn-1", "signed_invoice": "forged"}])
+		self.assertFalse(result["valid"])
+		self.assertTrue(result["checks"]["signed_qr"]["valid"])
+
+	def test_malformed_entries_get_an_error_each(self):
+		results = verify_documents(["qr-irn-1", None, {"signed_qr": 123}, {"irn": "IRN-1"}, {"signed_qr": "qr-irn-1"}])
+
+		self.assertEqual([result["valid"] for result in results], [False, False, False, False, True])
+		self.assertEqual(results[0]["error"], "Document must be an object")
+		self.assertEqual(results[1]["error"], "Document must be an object")
+		self.assertEqual(results[2]["checks"]["signed_qr"]["error"], "Signature must be a string")
+		self.assertEqual(results[3]["checks"], {})
+
+	def test_without_public_keys(self):
+		with patch.object(verification, "get_public_keys_json", return_value=None), self.assertRaises(Exception):
+			verify_documents([{"signed_qr": "qr-irn-1"}])
+
+
+class TestRefreshPublicKeys(UnitTestCase):
+	def setUp(self):
+		self.frappe = MagicMock()
+		self.frappe.conf = {"eims_public_keys_url": "https://mor.example/jwks"}
+		self.requests = MagicMock()
+		self.requests.RequestException = OSError
+		for target, value in (("frappe", self.frappe), ("parse_key_set", lambda raw: {"k1": "key"})):
+			patcher = patch.object(verification, target, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+		patcher = patch.dict("sys.modules", requests=self.requests)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def test_stores_the_key_set(self):
+		self.requests.get.return_value.json.return_value = {"keys": [{"kid": "k1"}]}
+
+		self.assertEqual(verification.refresh_public_keys(), {"keys": [{"kid": "k1"}]})
+		self.requests.get.assert_called_once_with("https://mor.example/jwks", timeout=verification.HTTP_TIMEOUT_SECONDS)
+		self.frappe.cache.return_value.set_value.assert_called_once()
+		self.frappe.log_error.assert_not_called()
+
+	def test_failed_fetch_is_reported(self):
+		self.requests.get.side_effect = OSError("connection refused")
+
+		self.assertIsNone(verification.refresh_public_keys())
+		self.frappe.log_error.assert_called_once()
+		self.frappe.cache.return_value.set_value.assert_not_called()
+
+	def test_unsupported_keys_are_reported(self):
+		self.requests.get.return_value.json.return_value = {"keys": [{"kid": "k1"}, {"kid": "k2"}]}
+
+		verification.refresh_public_keys()
+		self.assertEqual(self.frappe.log_error.call_args.args[1], "k2")
+		self.frappe.cache.return_value.set_value.assert_called_once()
+
+	def test_not_configured(self):
+		self.frappe.conf = {}
+		with patch.object(verification, "get_settings", return_value=MagicMock(public_keys_url=None)):
+			self.assertIsNone(verification.refresh_public_keys())
+		self.requests.get.assert_not_called()
@@ -0,0 +1,125 @@
+# Copyright (c) 2026, Mevinai and Contributors
+# See license.txt
+
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import MagicMock, patch
+
+from frappe.tests import UnitTestCase
+
+from taxiye_eims_integration.utils import write_buffer
+from taxiye_eims_integration.utils.write_buffer import (
+	JOURNAL_STALE_SECONDS,
+	TripWriteBuffer,
+	read_journal,
+	recover_write_journals,
+)
+
+
+class WriteBufferTestCase(UnitTestCase):
+	def setUp(self):
+		self.folder = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.folder)
+		self.frappe = MagicMock()
+		self.frappe.generate_hash.side_effect = (f"hash{i}" for i in range(1000))
+		self.inserted = []
+		for target, value in (
+			("frappe", self.frappe),
+			("get_journal_folder", lambda: self.folder),
+			("insert_rows", self.insert_rows),
+		):
+			patcher = patch.object(write_buffer, target, value)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def insert_rows(self, doctype, rows):
+		# like the real one: rows already inserted are skipped
+		names = {name for _doctype, name in self.inserted}
+		new = [row["name"] for row in rows if row["name"] not in names]
+		self.inserted.extend((doctype, name) for name in new)
+		return new
+
+	def journals(self):
+		return sorted(os.listdir(self.folder))
+
+
+class TestTripWriteBuffer(WriteBufferTestCase):
+	def test_rows_are_journaled_until_flushed(self):
+		writer = TripWriteBuffer("Trip Receipt", max_rows=10)
+		first = writer.add({"invoice_id": "INV-1"})
+		writer.add({"invoice_id": "INV-2"})
+
+		self.assertEqual(len(self.journals()), 1)
+		rows = read_journal(os.path.join(self.folder, self.journals()[0]))
+		self.assertEqual([row["invoice_id"] for row in rows], ["INV-1", "INV-2"])
+		self.assertEqual(rows[0]["name"], first)
+
+		writer.flush()
+		self.assertEqual([name for _doctype, name in self.inserted], [row["name"] for row in rows])
+		self.frappe.db.commit.assert_called_once()
+		self.assertEqual(self.journals(), [])
+
+	def test_one_fsync_per_flush(self):
+		with patch.object(write_buffer.os, "fsync") as fsync:
+			with TripWriteBuffer("Trip Invoice", max_rows=10) as writer:
+				for index in range(5):
+					writer.add({"trip_id": f"TRIP-{index}"})
+				fsync.assert_not_called()
+		fsync.assert_called_once()
+
+	def test_flush_tolerates_a_claimed_journal(self):
+		writer = TripWriteBuffer("Trip Invoice", max_rows=10)
+		writer.add({"trip_id": "TRIP-1"})
+		# recover_write_journals renamed it while the buffer sat idle
+		os.rename(writer.journal_path, writer.journal_path + write_buffer.RECOVERING_SUFFIX)
+
+		writer.flush()
+		self.assertEqual(len(self.inserted), 1)
+		self.assertEqual(writer.rows, [])
+
+	def test_callbacks_run_before_the_commit(self):
+		order = []
+		self.frappe.db.commit.side_effect = lambda: order.append("commit")
+		writer = TripWriteBuffer("Trip Receipt", max_rows=10)
+		writer.add({"invoice_id": "INV-1"})
+		writer.before_commit(lambda: order.append("callback"))
+		writer.flush()
+		self.assertEqual(order, ["callback", "commit"])
+
+
+class TestRecoverWriteJournals(WriteBufferTestCase):
+	def age_journal(self, writer, age_seconds):
+		writer.journal.close()
+		stale = time.time() - age_seconds
+		os.utime(writer.journal_path, (stale, stale))
+
+	def test_replays_stale_journals_only(self):
+		dead = TripWriteBuffer("Trip Invoice")
+		dead.add({"trip_id": "TRIP-1"})
+		self.age_journal(dead, JOURNAL_STALE_SECONDS + 60)
+		alive = TripWriteBuffer("Trip Receipt")
+		alive.add({"invoice_id": "INV-1"})
+
+		self.assertEqual(recover_write_journals(), 1)
+		self.assertEqual(self.inserted, [("Trip Invoice", dead.rows[0]["name"])])
+		self.assertEqual(self.journals(), [os.path.basename(alive.journal_path)])
+
+	def test_replay_skips_rows_already_inserted(self):
+		dead = TripWriteBuffer("Trip Invoice")
+		dead.add({"trip_id": "TRIP-1"})
+		dead.add({"trip_id": "TRIP-2"})
+		self.inserted.append(("Trip Invoice", dead.rows[0]["name"]))
+		self.age_journal(dead, JOURNAL_STALE_SECONDS + 60)
+
+		self.assertEqual(recover_write_journals(), 1)
+		self.assertEqual(len(self.inserted), 2)
+
+	def test_torn_last_line_is_skipped(self):
+		dead = TripWriteBuffer("Trip Invoice")
+		dead.add({"trip_id": "TRIP-1"})
+		dead.journal.write('{"trip_id": "TRIP-')
+		self.age_journal(dead, JOURNAL_STALE_SECONDS + 60)
+
+		self.assertEqual(recover_write_journals(), 1)
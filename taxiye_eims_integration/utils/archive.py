@@ -0,0 +1,196 @@
+import frappe
+from frappe.utils import add_months, now_datetime  # type: ignore
+from taxiye_eims_integration.utils.eims_invoice import get_last_eims_invoice
+
+# Cold store for settled trips. Completed invoices that have a receipt and
+# are older than `eims_archive_after_months` (site config, default 6) move,
+# together with their receipts, into compressed archive tables with the same
+# columns. The archive keeps its irn / trip_id / name indexes, so lookups by
+# IRN keep working through get_trip_invoice() while the hot tables only hold
+# recent and unsettled rows.
+
+DEFAULT_ARCHIVE_AFTER_MONTHS = 6
+ARCHIVE_BATCH_SIZE = 1000
+# upper bound of batches per scheduler run, so a first run cannot hog a worker
+MAX_BATCHES_PER_RUN = 50
+
+ARCHIVE_TABLES = {
+    "Trip Invoice": "Trip Invoice Archive",
+    "Trip Receipt": "Trip Receipt Archive",
+}
+
+
+def get_archive_table(doctype):
+    return f"`tab{ARCHIVE_TABLES[doctype]}`"
+
+
+def ensure_archive_tables():
+    """Create the archive tables from the hot tables and add columns they gained since."""
+    for doctype, archive in ARCHIVE_TABLES.items():
+        frappe.db.sql_ddl(f"create table if not exists `tab{archive}` like `tab{doctype}`")  # type: ignore
+        if get_row_format(f"tab{archive}") != "compressed":
+            # rebuilds the table: only when it is not compressed yet
+            frappe.db.sql_ddl(f"alter table `tab{archive}` row_format=compressed")  # type: ignore
+
+        archive_columns = set(get_table_columns(f"tab{archive}"))
+        for column in frappe.db.sql(f"show columns from `tab{doctype}`", as_dict=True):  # type: ignore
+            if column.Field not in archive_columns:
+                frappe.db.sql_ddl(  # type: ignore
+                    f"alter table `tab{archive}` add column `{column.Field}` {column.Type} null"
+                )
+
+    frappe.db.sql_ddl(  # type: ignore
+        "alter table `tabTrip Invoice Archive` add index if not exists irn_index (irn)"
+    )
+
+
+def get_row_format(table):
+    row_format = frappe.db.sql(  # type: ignore
+        """select row_format from information_schema.tables
+        where table_schema = database() and table_name = %s""",
+        table,
+    )
+    return (row_format[0][0] or "").lower() if row_format else None
+
+
+def get_table_columns(table):
+    return [row[0] for row in frappe.db.sql(f"show columns from `{table}`")]  # type: ignore
+
+
+def get_common_columns(doctype):
+    archive_columns = set(get_table_columns(f"tab{ARCHIVE_TABLES[doctype]}"))
+    return [column for column in get_table_columns(f"tab{doctype}") if column in archive_columns]
+
+
+def get_archivable_invoices(cutoff, limit):
+    """Completed invoices older than cutoff with at least one receipt."""
+    last_doc = get_last_eims_invoice()
+    return frappe.db.sql(  # type: ignore
+        """
+        select invoice.name
+        from `tabTrip Invoice` invoice
+        where invoice.status = 'Completed'
+            and invoice.creation < %(cutoff)s
+            and invoice.name != %(chain_tail)s
+            and exists (select 1 from `tabTrip Receipt` receipt where receipt.invoice_id = invoice.name)
+        order by invoice.creation
+        limit %(limit)s
+        """,
+        # the chain tail is what the next invoice links to; it stays hot
+        {"cutoff": cutoff, "chain_tail": last_doc.name if last_doc else "", "limit": limit},
+        pluck=True,
+    )
+
+
+def move_rows(doctype, key, values):
+    """Copy rows whose `key` is in `values` to the archive, then delete them."""
+    columns = ", ".join(f"`{column}`" for column in get_common_columns(doctype))
+    frappe.db.sql(  # type: ignore
+        f"""
+        insert ignore into {get_archive_table(doctype)} ({columns})
+        select {columns} from `tab{doctype}` where `{key}` in %(values)s
+        """,
+        {"values": tuple(values)},
+    )
+    frappe.db.sql(f"delete from `tab{doctype}` where `{key}` in %(values)s", {"values": tuple(values)})  # type: ignore
+
+
+def archive_batch(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move one batch of settled invoices and their receipts. Returns the count moved."""
+    names = get_archivable_invoices(cutoff, batch_size)
+    if not names:
+        return 0
+
+    # receipts first: they link to the invoices being moved
+    move_rows("Trip Receipt", "invoice_id", names)
+    move_rows("Trip Invoice", "name", names)
+    frappe.db.commit()  # type: ignore
+    return len(names)
+
+
+def get_archive_cutoff():
+    """Invoices created before this are moved to the archive."""
+    months = int(frappe.conf.get("eims_archive_after_months") or DEFAULT_ARCHIVE_AFTER_MONTHS)  # type: ignore
+    return add_months(now_datetime(), -months)
+
+
+def archive_settled_trips():
+    """Scheduler entry point: archive settled trips older than the configured age."""
+    cutoff = get_archive_cutoff()
+
+    ensure_archive_tables()
+
+    archived = 0
+    for _batch in range(MAX_BATCHES_PER_RUN):
+        moved = archive_batch(cutoff)
+        archived += moved
+        if moved < ARCHIVE_BATCH_SIZE:
+            break
+    return archived
+
+
+def archive_exists(doctype):
+    return frappe.db.sql("show tables like %s", f"tab{ARCHIVE_TABLES[doctype]}")  # type: ignore
+
+
+def get_archived_values(doctype, field, values):
+    """The `values` of an indexed field that are found in the archive of doctype."""
+    if not values or not archive_exists(doctype):
+        return []
+    return frappe.db.sql(  # type: ignore
+        f"select `{field}` from {get_archive_table(doctype)} where `{field}` in %(values)s",
+        {"values": tuple(values)},
+        pluck=True,
+    )
+
+
+def get_rows_with_archive(doctype, columns):
+    """A derived table of `columns` over the hot table and its archive."""
+    fields = ", ".join(f"`{column}`" for column in columns)
+    if not archive_exists(doctype):
+        return f"(select {fields} from `tab{doctype}`)"
+    return f"(select {fields} from `tab{doctype}` union all select {fields} from {get_archive_table(doctype)})"
+
+
+def get_trip_invoice(name=None, irn=None, trip_id=None, fields=None):
+    """Look up a Trip Invoice in the hot table, then in the archive.
+
+    Exactly one of name / irn / trip_id is used. Returns a dict with an
+    `archived` flag, or None when the invoice is unknown.
+    """
+    key, value = next(((key, value) for key, value in (("name", name), ("irn", irn), ("trip_id", trip_id)) if value), (None, None))
+    if not key:
+        return None
+
+    fields = list(fields or ["*"])
+    invoice = frappe.db.get_value("Trip Invoice", {key: value}, fields, as_dict=True)  # type: ignore
+    if invoice:
+        invoice.archived = 0
+        return invoice
+
+    if not archive_exists("Trip Invoice"):
+        return None
+
+    columns = ", ".join("*" if field == "*" else f"`{field}`" for field in fields)
+    rows = frappe.db.sql(  # type: ignore
+        f"select {columns} from {get_archive_table('Trip Invoice')} where `{key}` = %(value)s limit 1",
+        {"value": value},
+        as_dict=True,
+    )
+    if rows:
+        rows[0].archived = 1
+        return rows[0]
+    return None
+
+
+def get_trip_receipts(invoice_id):
+    """Receipts of an invoice, from the hot table or the archive."""
+    receipts = frappe.get_all("Trip Receipt", filters={"invoice_id": invoice_id}, fields=["*"])  # type: ignore
+    if receipts or not archive_exists("Trip Receipt"):
+        return receipts
+
+    return frappe.db.sql(  # type: ignore
+        f"select * from {get_archive_table('Trip Receipt')} where invoice_id = %(invoice_id)s",
+        {"invoice_id": invoice_id},
+        as_dict=True,
+    )
@@ -0,0 +1,192 @@
+import os
+import queue
+import random
+import threading
+import time
+import frappe
+import redis
+from taxiye_eims_integration.utils.metrics import inc
+from taxiye_eims_integration.utils.serialization import dumps, loads, payload_hash
+from taxiye_eims_integration.utils.submission_journal import split_sequence
+
+# Sampled audit log of EIMS exchanges.
+#
+# Every journaled call is classified as success / rejected / error and kept
+# with the sampling rate of its outcome (all failures, a share of successes).
+# An entry holds the path, HTTP status, latency, the sequence numbers sent and
+# a digest of the request with personal data redacted, plus the EIMS message
+# for failures. Entries are handed to a writer thread and pushed to a capped
+# Redis list per site, newest first; api.audit reads them back.
+
+REDIS_KEY_AUDIT = "eims:audit_log"
+
+# overridable with site config eims_audit_sample_rates / eims_audit_log_max_entries
+DEFAULT_SAMPLE_RATES = {"success": 0.1, "rejected": 1.0, "error": 1.0}
+DEFAULT_MAX_ENTRIES = 10000
+
+QUEUE_SIZE = 5000
+WRITE_BATCH_SIZE = 200
+MAX_DETAIL_LENGTH = 500
+# entries read per LRANGE while filtering
+READ_CHUNK_SIZE = 500
+
+# compared lower-cased; covers the invoice, receipt and login bodies
+REDACTED_FIELDS = {
+    "tin",
+    "vatnumber",
+    "phone",
+    "email",
+    "idnumber",
+    "legalname",
+    "housenumber",
+    "clientid",
+    "clientsecret",
+    "apikey",
+}
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {
+            key: "***" if key.lower() in REDACTED_FIELDS and item else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+def get_outcome(status_code, acknowledged):
+    if acknowledged:
+        return "success"
+    if status_code is not None and status_code < 500:
+        return "rejected"
+    return "error"
+
+
+def get_sample_rate(outcome):
+    rates = frappe.conf.get("eims_audit_sample_rates") or {}  # type: ignore
+    return float(rates.get(outcome, DEFAULT_SAMPLE_RATES[outcome]))
+
+
+def get_detail(data, text=None):
+    """What EIMS said about a failed call, truncated."""
+    if data:
+        detail = {key: data[key] for key in ("statusCode", "message", "body") if key in data}
+        return dumps(detail).decode()[:MAX_DETAIL_LENGTH]
+    return (text or "")[:MAX_DETAIL_LENGTH]
+
+
+def record(path, body, status_code=None, latency=None, acknowledged=False, data=None, text=None):
+    """Sample and queue one audit entry; never blocks the caller."""
+    outcome = get_outcome(status_code, acknowledged)
+    rate = get_sample_rate(outcome)
+    if rate < 1 and random.random() >= rate:
+        return
+
+    _stripped, sequence = split_sequence(path, body)
+    entry = {
+        "at": time.time(),
+        "path": path,
+        "status": status_code,
+        "outcome": outcome,
+        "latency_ms": round(latency * 1000, 1) if latency is not None else None,
+        "sample_rate": rate,
+        "sequence": sequence,
+        "digest": payload_hash(redact(body)),
+    }
+    if outcome != "success":
+        entry["detail"] = get_detail(data, text)
+
+    cache = frappe.cache()  # type: ignore
+    max_entries = int(frappe.conf.get("eims_audit_log_max_entries") or DEFAULT_MAX_ENTRIES)  # type: ignore
+    ensure_writer()
+    try:
+        # the key is made here: site config is thread-local to the request
+        _queue.put_nowait((cache, cache.make_key(REDIS_KEY_AUDIT), max_entries, dumps(entry)))
+    except queue.Full:
+        inc("eims_audit_entries_dropped_total")
+
+
+def ensure_writer():
+    global _queue, _writer, _writer_pid
+
+    if _writer is not None and _writer_pid == os.getpid():
+        return
+    with _writer_lock:
+        if _writer is not None and _writer_pid == os.getpid():
+            return
+        if _writer_pid is not None:
+            # forked: the parent's thread did not come along, nor may its queue lock
+            _queue = queue.Queue(maxsize=QUEUE_SIZE)
+        _writer = threading.Thread(target=write_entries, args=(_queue,), name="eims-audit-log", daemon=True)
+        _writer_pid = os.getpid()
+        _writer.start()
+
+
+def write_entries(entries):
+    """Writer thread: push queued entries to Redis in pipelined batches."""
+    while True:
+        batch = [entries.get()]
+        while len(batch) < WRITE_BATCH_SIZE:
+            try:
+                batch.append(entries.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            write_batch(batch)
+        except Exception:
+            # best effort: an unreachable Redis costs the batch, not the worker
+            pass
+        finally:
+            for _entry in batch:
+                entries.task_done()
+
+
+def write_batch(batch):
+    by_key = {}
+    for cache, key, max_entries, raw in batch:
+        by_key.setdefault(key, (cache, max_entries, []))[2].append(raw)
+
+    for key, (cache, max_entries, raws) in by_key.items():
+        pipeline = cache.pipeline()
+        pipeline.lpush(key, *raws)
+        pipeline.ltrim(key, 0, max_entries - 1)
+        pipeline.execute()
+
+
+def drain():
+    """Wait until queued entries are written (after_job: work horses exit right after)."""
+    if _writer is not None and _writer_pid == os.getpid():
+        _queue.join()
+
+
+def get_entries(limit=100, path=None, outcome=None, since=None):
+    """Recent entries of the current site, newest first, optionally filtered."""
+    cache = frappe.cache()  # type: ignore
+    key = cache.make_key(REDIS_KEY_AUDIT)
+    entries, start = [], 0
+
+    while len(entries) < limit:
+        # raw LRANGE on the key the writer pushes to; RedisWrapper.lrange would prefix it again
+        chunk = redis.Redis.lrange(cache, key, start, start + READ_CHUNK_SIZE - 1)
+        if not chunk:
+            break
+        for raw in chunk:
+            entry = loads(raw)
+            if since is not None and entry["at"] < since:
+                # the list is ordered: everything after is older
+                return entries
+            if (path and entry["path"] != path) or (outcome and entry["outcome"] != outcome):
+                continue
+            entries.append(entry)
+            if len(entries) >= limit:
+                break
+        start += READ_CHUNK_SIZE
+
+    return entries
@@ -1,16 +1,18 @@
-import json
-import requests
 import frappe
+from frappe import _  # type: ignore
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any
-from taxiye_eims_integration.api.fetch_trips import get_driver_details
 from frappe.utils.password import encrypt, decrypt  # type: ignore
-from frappe.utils import formatdate
+from taxiye_eims_integration.utils.metrics import inc
+from taxiye_eims_integration.utils.settings import get_settings, site_key
 
-# Redis keys
-REDIS_KEY_ACCESS = "eims:access_token"
-REDIS_KEY_REFRESH = "eims:refresh_token"
-REDIS_KEY_EXPIRES = "eims:expires_in"
+# requests and fetch_trips are imported inside the functions that need them:
+# this module is loaded by every whitelisted endpoint at worker boot.
+
+# Redis keys, namespaced per site: sites of one bench log in with their own
+# credentials and must never share tokens
+REDIS_KEY_ACCESS = "eims:{}:access_token"
+REDIS_KEY_REFRESH = "eims:{}:refresh_token"
+REDIS_KEY_EXPIRES = "eims:{}:expires_in"
 
 
 def set_token_in_redis(access_token, refresh_token, expires_sec):
@@ -21,19 +23,19 @@ def set_token_in_redis(access_token, refresh_token, expires_sec):
 
     # Encrypt before storing
     if access_token:
-        r.set_value(REDIS_KEY_ACCESS, encrypt(access_token), expires_sec)
+        r.set_value(site_key(REDIS_KEY_ACCESS), encrypt(access_token), expires_sec)
     if refresh_token:
         # keep refresh token for 7 days
-        r.set_value(REDIS_KEY_REFRESH, encrypt(refresh_token), 60 * 60 * 24 * 7)
-    r.set_value(REDIS_KEY_EXPIRES, expire_at.isoformat(), expires_sec)
+        r.set_value(site_key(REDIS_KEY_REFRESH), encrypt(refresh_token), 60 * 60 * 24 * 7)
+    r.set_value(site_key(REDIS_KEY_EXPIRES), expire_at.isoformat(), expires_sec)
 
 
 def get_token_from_redis():
     """Retrieve and decrypt tokens from Redis."""
     r = frappe.cache() # type: ignore
-    enc_access = r.get_value(REDIS_KEY_ACCESS)
-    enc_refresh = r.get_value(REDIS_KEY_REFRESH)
-    expires_in_str = r.get_value(REDIS_KEY_EXPIRES)
+    enc_access = r.get_value(site_key(REDIS_KEY_ACCESS))
+    enc_refresh = r.get_value(site_key(REDIS_KEY_REFRESH))
+    expires_in_str = r.get_value(site_key(REDIS_KEY_EXPIRES))
 
     access_token, refresh_token, expires_in = None, None, None
 
@@ -58,8 +60,16 @@ def get_token_from_redis():
     return access_token, refresh_token, expires_in
 
 
+def clear_tokens():
+    """Forget the tokens of the current site, e.g. after the EIMS server changed."""
+    for key in (REDIS_KEY_ACCESS, REDIS_KEY_REFRESH, REDIS_KEY_EXPIRES):
+        frappe.cache().delete_value(site_key(key))  # type: ignore
+
+
 def refresh_eims_token(base_url, refresh_token):
     """Try to refresh access token using refresh token."""
+    import requests
+
     try:
         refresh_url = f"{base_url}/auth/refresh-token"
         response = requests.post(refresh_url, json={"refreshToken": refresh_token})
@@ -72,14 +82,18 @@ def refresh_eims_token(base_url, refresh_token):
 
         if access_token:
             set_token_in_redis(access_token, refresh_token_new or refresh_token, expires_sec)
+            inc("eims_token_refreshes_total", outcome="success")
             return access_token
     except Exception as e:
         frappe.log_error(f"EIMS Refresh Failed: {str(e)}") # type: ignore
+    inc("eims_token_refreshes_total", outcome="failed")
     return None
 
 
 def login_eims(base_url, seller_info):
     """Perform login to get new tokens."""
+    import requests
+
     try:
         login_url = f"{base_url}/auth/login"
         response = requests.post(
@@ -102,10 +116,13 @@ def login_eims(base_url, seller_info):
             frappe.throw(_("EIMS Login response missing accessToken")) # type: ignore
 
         set_token_in_redis(access_token, refresh_token_new or "", expires_sec)
+        inc("eims_logins_total", outcome="success")
         return access_token
     except requests.RequestException as e:
+        inc("eims_logins_total", outcome="failed")
         frappe.throw(_("EIMS Login Failed: {0}").format(str(e))) # type: ignore
     except Exception as e:
+        inc("eims_logins_total", outcome="failed")
         frappe.log_error(f"Unexpected EIMS login error: {str(e)}") # type: ignore
         frappe.throw(_("Failed to generate EIMS access token")) # type: ignore
 
@@ -115,32 +132,36 @@ def get_eims_access_token():
     eth_tz = timezone(timedelta(hours=3))
     current_time = datetime.now(eth_tz)
 
-    driver_details = get_driver_details()
-    base_url = driver_details.get("mor_base_url", "").rstrip("/")
+    settings = get_settings()
+    base_url = settings.mor_base_url
 
     access_token, refresh_token, expires_in = get_token_from_redis()
 
     # Token is valid → return
     if access_token and expires_in and expires_in > current_time + timedelta(seconds=30):
+        inc("eims_token_requests_total", source="cache")
         return access_token
 
     # Try refresh token first
     if refresh_token:
         token = refresh_eims_token(base_url, refresh_token)
         if token:
+            inc("eims_token_requests_total", source="refresh")
             return token
 
     # Otherwise login
-    return login_eims(base_url, driver_details)
+    from taxiye_eims_integration.api.fetch_trips import get_driver_details
+
+    inc("eims_token_requests_total", source="login")
+    return login_eims(base_url, get_driver_details())
 
 def get_eims_headers_and_url():
-    driver_details = get_driver_details()
     token = get_eims_access_token()
 
     return {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
-    }, f"{driver_details['mor_base_url']}/v1"
+    }, f"{get_settings().mor_base_url}/v1"
 
 
 def extract_406_data(data):
@@ -0,0 +1,218 @@
+import csv
+import json
+import os
+import queue
+import threading
+import frappe
+from taxiye_eims_integration.utils.eims_invoice import get_last_eims_invoice
+from taxiye_eims_integration.utils import metrics
+from taxiye_eims_integration.utils.rate_budget import BACKGROUND, priority_class
+from taxiye_eims_integration.utils.write_buffer import TripWriteBuffer
+from taxiye_eims_integration.utils.trip_ingest import get_known_trip_ids
+
+# Bulk registration of historical trips from CSV / Parquet files.
+#
+# A reader thread streams the file in chunks, fills in amounts and validates
+# rows with InvoicePayload, and hands chunks over a bounded queue. The main
+# thread registers each trip with EIMS in chain order (every invoice links to
+# the previous IRN, so registration itself cannot run in parallel). Live
+# invoices share that chain, so each trip chains on the last saved invoice
+# and is saved as soon as EIMS acknowledges it: a tail kept in memory would
+# have live traffic and the backfill take the same document number. Memory
+# is bounded by chunk_size * (QUEUE_DEPTH + 1) rows whatever the file size.
+
+DEFAULT_CHUNK_SIZE = 500
+# chunks read and validated ahead of the one being submitted
+QUEUE_DEPTH = 2
+# same VAT rate get_item_details applies
+VAT_RATE = 0.15
+# invalid rows reported per chunk in the Error Log
+MAX_REPORTED_ERRORS = 50
+# backfills run as background traffic and wait this long for budget before giving up
+RATE_BUDGET_WAIT_SECONDS = 30
+
+
+def get_checkpoint_path(path):
+    return f"{path}.backfill.json"
+
+
+def load_checkpoint(path):
+    """Return the saved progress for `path`, or a fresh state."""
+    try:
+        with open(get_checkpoint_path(path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"offset": 0, "submitted": 0, "skipped": 0, "invalid": 0}
+
+
+def save_checkpoint(path, state):
+    # write then rename so a crash never leaves a truncated checkpoint
+    tmp_path = get_checkpoint_path(path) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, get_checkpoint_path(path))
+
+
+def iter_csv_chunks(path, chunk_size, offset=0):
+    """Yield (rows, end_offset) chunks of a CSV file, starting at a file offset.
+
+    Rows are read line by line so the offset after each chunk can be
+    checkpointed; quoted values spanning several lines are not supported.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader([f.readline()]))
+        if offset:
+            f.seek(offset)
+
+        while True:
+            lines = []
+            while len(lines) < chunk_size:
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    lines.append(line)
+            if not lines:
+                return
+            yield [dict(zip(header, values)) for values in csv.reader(lines)], f.tell()
+
+
+def iter_parquet_chunks(path, chunk_size, offset=0):
+    """Yield (rows, end_offset) chunks of a Parquet file; the offset is a row number."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        frappe.throw("Reading Parquet files requires pyarrow (pip install pyarrow)")  # type: ignore
+
+    position = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        start, position = position, position + batch.num_rows
+        if position <= offset:
+            continue
+        yield batch.to_pylist()[max(offset - start, 0) :], position
+
+
+def compute_amounts(rows):
+    """Fill missing commission/amount/tax/total_payment for a chunk in one pass."""
+    for row in rows:
+        for field, value in row.items():
+            if value == "":
+                row[field] = None
+        try:
+            base_fare = float(row.get("base_fare") or 0)
+            if row.get("commission_amount") is None:
+                row["commission_amount"] = base_fare * float(row.get("commission_rate") or 0)
+            amount = base_fare + float(row["commission_amount"])
+        except (TypeError, ValueError):
+            # leave the row as is; validation reports the bad value
+            continue
+        if row.get("amount") is None:
+            row["amount"] = amount
+        if row.get("tax") is None:
+            row["tax"] = amount * VAT_RATE
+        if row.get("total_payment") is None:
+            row["total_payment"] = amount + float(row["tax"])
+    return rows
+
+
+def validate_chunk(rows):
+    """Validate rows with InvoicePayload; returns (payloads, errors)."""
+    from taxiye_eims_integration.api.schemas import InvoicePayload
+    from pydantic import ValidationError
+
+    payloads, errors = [], []
+    for row in rows:
+        try:
+            payloads.append(InvoicePayload(**row))
+        except ValidationError as e:
+            errors.append({"trip_id": row.get("trip_id"), "error": str(e)})
+    return payloads, errors
+
+
+def read_ahead(chunks, depth=QUEUE_DEPTH):
+    """Consume an iterator in a background thread through a bounded queue."""
+    handoff = queue.Queue(maxsize=depth)
+    done = object()
+
+    def produce():
+        try:
+            for chunk in chunks:
+                handoff.put(chunk)
+        except BaseException as e:
+            handoff.put(e)
+        finally:
+            handoff.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while (item := handoff.get()) is not done:
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def register_chunk(payloads, max_retries):
+    """Register a chunk with EIMS in chain order and write the acknowledged invoices.
+
+    Each acknowledged invoice is journaled by the write buffer and committed
+    before the next trip reads the chain tail. Returns (submitted, skipped).
+    """
+    from taxiye_eims_integration.api.invoice import get_invoice_values, register_invoice
+
+    known = get_known_trip_ids([payload.trip_id for payload in payloads])
+    submitted = 0
+    with TripWriteBuffer("Trip Invoice", max_rows=len(payloads)) as writer:
+        for payload in payloads:
+            if payload.trip_id in known:
+                continue
+            known.add(payload.trip_id)
+
+            # a bench command, not a web or job worker: backing off in place is fine
+            data, last_doc = register_invoice(
+                payload, get_last_eims_invoice(), max_retries, wait_when_rate_limited=True
+            )
+            writer.add(get_invoice_values(last_doc, data, payload))
+            # saved before the tail is read again, by this loop or a live request
+            writer.flush()
+            submitted += 1
+
+    return submitted, len(payloads) - submitted
+
+
+def run_backfill(path, file_format=None, chunk_size=DEFAULT_CHUNK_SIZE, restart=False, max_retries=5, echo=print):
+    """Register every trip of a CSV/Parquet file, resuming from the saved offset."""
+    file_format = (file_format or os.path.splitext(path)[1].lstrip(".")).lower()
+    if file_format not in ("csv", "parquet"):
+        frappe.throw(f"Unsupported backfill format: {file_format}")  # type: ignore
+
+    state = {"offset": 0, "submitted": 0, "skipped": 0, "invalid": 0} if restart else load_checkpoint(path)
+    reader = iter_parquet_chunks if file_format == "parquet" else iter_csv_chunks
+    prepared = (
+        (validate_chunk(compute_amounts(rows)), offset)
+        for rows, offset in reader(path, int(chunk_size), state["offset"])
+    )
+
+    for (payloads, errors), offset in read_ahead(prepared):
+        with priority_class(BACKGROUND, wait_seconds=RATE_BUDGET_WAIT_SECONDS):
+            submitted, skipped = register_chunk(payloads, max_retries)
+
+        if errors:
+            frappe.log_error(  # type: ignore
+                f"Backfill: {len(errors)} invalid rows before offset {offset}",
+                json.dumps(errors[:MAX_REPORTED_ERRORS], indent=1),
+            )
+
+        state.update(
+            offset=offset,
+            submitted=state["submitted"] + submitted,
+            skipped=state["skipped"] + skipped,
+            invalid=state["invalid"] + len(errors),
+        )
+        save_checkpoint(path, state)
+        echo(
+            f"offset {offset}: {state['submitted']} submitted, "
+            f"{state['skipped']} already invoiced, {state['invalid']} invalid"
+        )
+        # bench commands have no request / job end to flush on
+        metrics.flush()
+
+    return state
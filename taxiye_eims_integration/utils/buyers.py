@@ -0,0 +1,151 @@
+import frappe
+import redis
+from frappe import _  # type: ignore
+from frappe.utils import now  # type: ignore
+from taxiye_eims_integration.utils.metrics import inc
+from taxiye_eims_integration.utils.normalization import clean_phone, clean_tin_no
+from taxiye_eims_integration.utils.serialization import dumps, loads
+
+# Registry of corporate buyers for B2B invoices, keyed by cleaned TIN.
+#
+# EIMS Buyer holds the validated legal name and address. The BuyerDetails
+# section of each buyer is kept ready in one Redis hash, so a B2B trip costs
+# a single HGET. Unknown TINs are remembered as misses (an empty value) and
+# go out as B2C; saving or pre-warming the buyer replaces the miss.
+# The hash is read and written with raw commands on the made key: the
+# RedisWrapper hash methods would prefix it again and pickle the values.
+
+REDIS_KEY_BUYERS = "eims:buyers"
+# a miss is cached as an empty value
+MISSING = b""
+
+BUYER_FIELDS = [
+    "tin",
+    "legal_name",
+    "vat_number",
+    "enabled",
+    "email",
+    "phone",
+    "region",
+    "city",
+    "subcity",
+    "woreda",
+    "locality",
+    "housenumber",
+]
+
+
+def clean_buyer_tin(tin):
+    cleaned = clean_tin_no(tin)
+    if not cleaned:
+        frappe.throw(_("Invalid TIN {0}").format(tin))  # type: ignore
+    return cleaned
+
+
+def get_buyer_details(buyer):
+    """The BuyerDetails section of a B2B invoice for a buyer"""
+    return {
+        "City": buyer.get("city") or None,
+        "Email": buyer.get("email") or None,
+        "Housenumber": buyer.get("housenumber") or None,
+        "IdType": None,
+        "IdNumber": None,
+        "LegalName": buyer.get("legal_name"),
+        "Locality": buyer.get("locality") or None,
+        "Phone": clean_phone(buyer.get("phone")) or None,
+        "Region": buyer.get("region") or None,
+        "SubCity": buyer.get("subcity") or None,
+        "Tin": buyer.get("tin"),
+        "VatNumber": buyer.get("vat_number") or None,
+        "Wereda": buyer.get("woreda") or None,
+    }
+
+
+def encode_buyer(buyer):
+    return dumps(get_buyer_details(buyer)) if buyer.get("enabled") else MISSING
+
+
+def cache_buyer(buyer):
+    cache = frappe.cache()  # type: ignore
+    redis.Redis.hset(cache, cache.make_key(REDIS_KEY_BUYERS), buyer.tin, encode_buyer(buyer.as_dict()))
+
+
+def drop_cached_buyer(tin):
+    cache = frappe.cache()  # type: ignore
+    redis.Redis.hdel(cache, cache.make_key(REDIS_KEY_BUYERS), tin)
+
+
+def get_buyer(tin):
+    """BuyerDetails of an enabled buyer by (raw) TIN, or None for B2C."""
+    tin = clean_tin_no(tin)
+    if not tin:
+        return None
+
+    cache = frappe.cache()  # type: ignore
+    key = cache.make_key(REDIS_KEY_BUYERS)
+    raw = redis.Redis.hget(cache, key, tin)
+    if raw is None:
+        buyer = frappe.db.get_value("EIMS Buyer", tin, BUYER_FIELDS, as_dict=True)  # type: ignore
+        raw = encode_buyer(buyer) if buyer else MISSING
+        redis.Redis.hset(cache, key, tin, raw)
+
+    inc("eims_buyer_lookups_total", result="hit" if raw else "miss")
+    return loads(raw) if raw else None
+
+
+def prewarm_buyers(buyers):
+    """Create or update buyers from a corporate client list and cache them all.
+
+    `buyers` is a list of dicts with at least tin and legal_name. Existing
+    buyers are read in one query and new ones written with one multi-row
+    INSERT. Returns counts and the rows that could not be used.
+    """
+    rows, errors = {}, []
+    for index, buyer in enumerate(buyers):
+        tin = clean_tin_no(buyer.get("tin"))
+        if not tin or not buyer.get("legal_name"):
+            errors.append({"index": index, "error": "tin and legal_name are required"})
+            continue
+        row = {field: buyer.get(field) for field in BUYER_FIELDS}
+        row.update(tin=tin, enabled=1 if buyer.get("enabled") is None else int(buyer["enabled"]))
+        rows[tin] = row
+
+    existing = {
+        buyer.tin: buyer
+        for buyer in frappe.get_all(  # type: ignore
+            "EIMS Buyer", filters={"name": ["in", list(rows)]}, fields=BUYER_FIELDS, limit_page_length=0
+        )
+    } if rows else {}
+
+    new = [row for tin, row in rows.items() if tin not in existing]
+    changed = [
+        row
+        for tin, row in rows.items()
+        if tin in existing and any((row[field] or None) != (existing[tin][field] or None) for field in BUYER_FIELDS)
+    ]
+
+    if new:
+        created = now()
+        user = frappe.session.user  # type: ignore
+        frappe.db.bulk_insert(  # type: ignore
+            "EIMS Buyer",
+            ["name", "creation", "modified", "owner", "modified_by", "docstatus", *BUYER_FIELDS],
+            [[row["tin"], created, created, user, user, 0, *(row[field] for field in BUYER_FIELDS)] for row in new],
+        )
+    for row in changed:
+        frappe.db.set_value("EIMS Buyer", row["tin"], {field: row[field] for field in BUYER_FIELDS if field != "tin"})  # type: ignore
+    frappe.db.commit()  # type: ignore
+
+    if rows:
+        cache = frappe.cache()  # type: ignore
+        # one HSET for the whole list
+        redis.Redis.hset(
+            cache, cache.make_key(REDIS_KEY_BUYERS), mapping={tin: encode_buyer(row) for tin, row in rows.items()}
+        )
+
+    return {
+        "inserted": len(new),
+        "updated": len(changed),
+        "unchanged": len(rows) - len(new) - len(changed),
+        "errors": errors,
+    }
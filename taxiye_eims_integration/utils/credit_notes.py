@@ -0,0 +1,271 @@
+import frappe
+from frappe import _  # type: ignore
+from frappe.utils import flt, now_datetime  # type: ignore
+from taxiye_eims_integration.utils.eims_client import EIMSRateLimited, EIMSSubmissionError
+from taxiye_eims_integration.utils.eims_invoice import get_last_eims_invoice
+from taxiye_eims_integration.utils.eims_outbox import PRIORITY_BACKGROUND, enqueue_submission
+from taxiye_eims_integration.utils.write_buffer import TripWriteBuffer
+
+# Credit notes (EIMS document type CRE) for refunds and cancelled trips.
+#
+# A credit note is registered like an invoice: it takes the next document
+# number / invoice counter of the same chain and references the credited
+# invoice through ReferenceDetails.RelatedDocument. A cancellation is a credit
+# note for the whole remaining amount. Bulk requests look up all originals in
+# one query, are validated up front and registered by one background job in
+# chain order. Each credit note is saved as soon as EIMS acknowledges it, so
+# live invoices never chain on a stale tail; what EIMS does not accept goes
+# to the outbox like any other submission.
+
+CREDIT_NOTE = "CRE"
+MAX_BULK_SIZE = 5000
+# bulk requests up to this size are registered inline instead of in a job
+MAX_INLINE_SIZE = 20
+
+ORIGINAL_FIELDS = [
+    "name",
+    "irn",
+    "status",
+    "document_type",
+    "trip_id",
+    "reference",
+    "taxi_provider_name",
+    "taxi_provider_tin",
+    "taxi_provider_phone",
+    "tax_provider_address",
+    "rider_name",
+    "rider_phone",
+    "rider_tin",
+    "base_fare",
+    "commission_amount",
+    "tax",
+    "amount",
+    "total_payment",
+    "credited_amount",
+]
+
+
+def get_originals(requests):
+    """Fetch the invoices referenced by credit note requests in one query.
+
+    Returns {invoice_id or irn: invoice}.
+    """
+    names = [request["invoice_id"] for request in requests if request.get("invoice_id")]
+    irns = [request["irn"] for request in requests if request.get("irn")]
+    if not names and not irns:
+        return {}
+
+    or_filters = {}
+    if names:
+        or_filters["name"] = ["in", names]
+    if irns:
+        or_filters["irn"] = ["in", irns]
+    invoices = frappe.get_all(  # type: ignore
+        "Trip Invoice", or_filters=or_filters, fields=ORIGINAL_FIELDS, limit_page_length=0
+    )
+
+    originals = {}
+    for invoice in invoices:
+        originals[invoice.name] = invoice
+        if invoice.irn:
+            originals[invoice.irn] = invoice
+    return originals
+
+
+def validate_requests(requests):
+    """Match requests to their invoices and check the amounts.
+
+    Returns (valid, errors): valid is a list of (original, amount, reason,
+    request_id), errors a list of {"index", "error"}. Amounts include VAT and
+    default to what is left to credit (a cancellation). A request without a
+    request_id gets a new one.
+    """
+    if len(requests) > MAX_BULK_SIZE:
+        frappe.throw(_("At most {0} credit notes per request").format(MAX_BULK_SIZE))  # type: ignore
+
+    originals = get_originals(requests)
+    # credit already requested earlier in this batch
+    pending = {}
+    valid, errors = [], []
+
+    for index, request in enumerate(requests):
+        original = originals.get(request.get("invoice_id") or request.get("irn"))
+        if not original:
+            errors.append({"index": index, "error": "Invoice not found"})
+            continue
+        if original.document_type == CREDIT_NOTE or not original.irn or original.status != "Completed":
+            errors.append({"index": index, "error": f"{original.name} is not a registered invoice"})
+            continue
+
+        remaining = flt(original.total_payment) - flt(original.credited_amount) - pending.get(original.name, 0)
+        amount = flt(request.get("amount") or remaining, 2)
+        if amount <= 0 or amount > flt(remaining, 2):
+            errors.append({"index": index, "error": f"Amount must be between 0 and {flt(remaining, 2)}"})
+            continue
+
+        pending[original.name] = pending.get(original.name, 0) + amount
+        request_id = request.get("request_id") or frappe.generate_hash(length=20)  # type: ignore
+        valid.append((original, amount, request.get("reason"), request_id))
+
+    return valid, errors
+
+
+def reserve_credit(name, amount):
+    """Add `amount` to the credited amount of an invoice if that much is left.
+
+    The invoice row is locked (FOR UPDATE) for the check, so concurrent
+    requests, inline or in a job, cannot both take the last of it. The
+    reservation is committed at once: the lock is not held while EIMS is
+    called, and a credit note recovered from the write journal after a crash
+    is already covered by it. Returns the amount credited before, or None
+    when not enough is left.
+    """
+    try:
+        invoice = frappe.db.sql(  # type: ignore
+            "select total_payment, credited_amount from `tabTrip Invoice` where name = %s for update",
+            name,
+            as_dict=True,
+        )
+        if not invoice:
+            return None
+        credited = flt(invoice[0].credited_amount)
+        if flt(amount, 2) > flt(flt(invoice[0].total_payment) - credited, 2):
+            return None
+        frappe.db.sql(  # type: ignore
+            "update `tabTrip Invoice` set credited_amount = ifnull(credited_amount, 0) + %s where name = %s",
+            (amount, name),
+        )
+        return credited
+    finally:
+        frappe.db.commit()  # type: ignore
+
+
+def release_credit(name, amount):
+    """Give back a reservation whose credit note EIMS did not register."""
+    frappe.db.sql(  # type: ignore
+        "update `tabTrip Invoice` set credited_amount = ifnull(credited_amount, 0) - %s where name = %s",
+        (amount, name),
+    )
+    frappe.db.commit()  # type: ignore
+
+
+def build_credit_note_payload(original, amount, reason=None):
+    """An InvoicePayload crediting `amount` (VAT included) of the original invoice"""
+    from taxiye_eims_integration.api.schemas import InvoicePayload
+
+    # every line of the original is credited in the same proportion
+    share = amount / flt(original.total_payment)
+    now = now_datetime()
+    return InvoicePayload(
+        trip_id=original.trip_id or original.name,
+        invoice_number=f"{CREDIT_NOTE}-{original.name}",
+        taxi_provider_name=original.taxi_provider_name,
+        taxi_provider_tin=original.taxi_provider_tin,
+        taxi_provider_address=original.tax_provider_address or "",
+        taxi_provider_phone=original.taxi_provider_phone or "",
+        rider_name=original.rider_name,
+        rider_phone=original.rider_phone,
+        rider_tin=original.rider_tin,
+        date=now.strftime("%Y-%m-%d"),
+        time=now.strftime("%H:%M:%S"),
+        description=reason or f"Credit note for {original.name}",
+        reference=original.reference,
+        base_fare=flt(flt(original.base_fare) * share, 2),
+        commission_amount=flt(flt(original.commission_amount) * share, 2),
+        tax=flt(flt(original.tax) * share, 2),
+        amount=flt(flt(original.amount) * share, 2),
+        total_payment=amount,
+    )
+
+
+def register_credit_notes(valid, max_retries=5, queue_failures=True):
+    """Register validated credit notes in chain order, saving each one as it is acknowledged.
+
+    Returns one result per credit note. With queue_failures, credit notes
+    EIMS does not accept are queued in the outbox; otherwise the error is
+    raised (the outbox itself retries this way).
+    """
+    from taxiye_eims_integration.api.invoice import get_invoice_values, register_invoice
+
+    results = []
+    with TripWriteBuffer("Trip Invoice") as writer:
+        for original, amount, reason, request_id in valid:
+            payload = build_credit_note_payload(original, amount, reason)
+            # taken before EIMS is called: the validation above read without a lock
+            credited_before = reserve_credit(original.name, amount)
+            if credited_before is None:
+                error = f"{original.name} has less than {amount} left to credit"
+                if not queue_failures:
+                    frappe.throw(error)  # type: ignore
+                results.append({"invoice_id": original.name, "status": "failed", "error": error})
+                continue
+            try:
+                data, last_doc = register_invoice(
+                    payload,
+                    # live invoices share the chain: read the saved tail every time
+                    get_last_eims_invoice(),
+                    max_retries,
+                    document_type=CREDIT_NOTE,
+                    related_irn=original.irn,
+                    # the credit already taken tells successive partial credit notes
+                    # apart in the journal, and stays the same when one is retried
+                    journal_reference=f"{CREDIT_NOTE}:{original.name}:{flt(credited_before, 2)}",
+                )
+            except BaseException as e:
+                release_credit(original.name, amount)
+                if not queue_failures or not isinstance(e, EIMSSubmissionError):
+                    raise
+                outbox = enqueue_submission(
+                    "Credit Note",
+                    # the request id keeps apart partial credit notes of the same amount
+                    {"invoice_id": original.name, "amount": amount, "reason": reason, "request_id": request_id},
+                    request_body=e.request_body,
+                    error=str(e),
+                    reference_id=original.name,
+                    priority=PRIORITY_BACKGROUND,
+                    deferred=isinstance(e, EIMSRateLimited),
+                    retry_after=getattr(e, "retry_after", None),
+                )
+                results.append({"invoice_id": original.name, "status": "queued", "outbox_id": outbox.name})
+                continue
+
+            values = get_invoice_values(last_doc, data, payload)
+            values.update(
+                document_type=CREDIT_NOTE,
+                related_invoice=original.name,
+                related_irn=original.irn,
+                # trip_id lookups must keep finding the original invoice
+                trip_id=None,
+            )
+            credit_note = writer.add(values)
+            # saved before the tail is read again, here or by a live request
+            writer.flush()
+            results.append(
+                {
+                    "invoice_id": original.name,
+                    "status": "success",
+                    "credit_note_id": credit_note,
+                    "irn": values["irn"],
+                    "amount": amount,
+                }
+            )
+
+    return results
+
+
+def process_credit_notes(requests, max_retries=5):
+    """Background job: register a bulk credit note request."""
+    valid, errors = validate_requests(requests)
+    if errors:
+        # state changed since the request was accepted, e.g. credited twice
+        frappe.log_error("Credit notes skipped", frappe.as_json(errors))  # type: ignore
+    return register_credit_notes(valid, max_retries)
+
+
+def submit_credit_note(payload, max_retries=5):
+    """Register one credit note; raises EIMSSubmissionError when EIMS does not accept it."""
+    valid, errors = validate_requests([payload])
+    if errors:
+        frappe.throw(errors[0]["error"])  # type: ignore
+    result = register_credit_notes(valid, max_retries, queue_failures=False)[0]
+    return {"status": "success", "data": result}
@@ -0,0 +1,116 @@
+import time
+from taxiye_eims_integration.utils import audit_log, in_flight
+from taxiye_eims_integration.utils.auth import get_eims_headers_and_url
+from taxiye_eims_integration.utils.metrics import inc, observe
+from taxiye_eims_integration.utils.rate_budget import acquire, get_priority_class
+from taxiye_eims_integration.utils.serialization import encode_payload, loads
+from taxiye_eims_integration.utils.submission_journal import record_ack, record_sent
+
+# a call that outlives this is retried; the journal keeps a late ack from being lost
+REQUEST_TIMEOUT_SECONDS = 30
+
+
+class EIMSSubmissionError(Exception):
+    """Raised when EIMS does not accept a submission after all retries."""
+
+    def __init__(self, message, request_body=None):
+        super().__init__(message)
+        self.request_body = request_body
+
+
+class EIMSRateLimited(EIMSSubmissionError):
+    """Raised when EIMS answers "Too many requests!"; retry after `retry_after` seconds."""
+
+    def __init__(self, message, request_body=None, retry_after=None):
+        super().__init__(message, request_body)
+        self.retry_after = retry_after
+
+
+class RateBudgetExceeded(EIMSRateLimited):
+    """Raised when a call is shed because its priority class has no budget left.
+
+    Callers defer it like an EIMS rate limit; the budget refills every second.
+    """
+
+    def __init__(self, message, request_body=None, retry_after=1):
+        super().__init__(message, request_body, retry_after)
+
+
+def post_to_eims(path, body):
+    """POST a prepared request body to an EIMS `/v1` endpoint.
+
+    The body is encoded once; its content hash is kept on the response as
+    `payload_hash`. Takes a token from the shared rate budget first and
+    raises RateBudgetExceeded when the current priority class is shed.
+    """
+    import requests  # deferred: keeps worker boot and bench commands light
+
+    if not acquire():
+        inc("eims_requests_shed_total", priority_class=get_priority_class())
+        raise RateBudgetExceeded(
+            f"EIMS rate budget exhausted for {get_priority_class()} traffic", body
+        )
+
+    headers, url = get_eims_headers_and_url()
+    data, digest = encode_payload(body)
+    started = time.perf_counter()
+    response = requests.post(f"{url}/{path}", data=data, headers=headers, timeout=REQUEST_TIMEOUT_SECONDS)
+    observe("eims_request_duration_seconds", time.perf_counter() - started, path=path)
+    inc("eims_requests_total", path=path, status=response.status_code)
+    response.payload_hash = digest
+    return response
+
+
+def read_response(response):
+    """Decode an EIMS response body."""
+    return loads(response.content)
+
+
+def get_retry_after(response):
+    """Seconds from a Retry-After header given in seconds, or None."""
+    try:
+        return max(int(response.headers.get("Retry-After")), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_acknowledged(response, data):
+    return response.status_code == 200 and data.get("statusCode", 200) == 200
+
+
+def post_journaled(path, body, key):
+    """POST a request journaled under `key`; returns (response, decoded data).
+
+    The request is recorded before it is sent and the acknowledgement after,
+    so a retry can replay it instead of registering again. The exchange is
+    sampled into the audit log.
+    """
+    import requests
+
+    record_sent(key, path, body)
+    in_flight.mark(key)
+    started = time.perf_counter()
+    try:
+        response = post_to_eims(path, body)
+    except requests.RequestException as e:
+        audit_log.record(path, body, latency=time.perf_counter() - started, text=f"{type(e).__name__}: {e}")
+        raise
+    try:
+        data = read_response(response)
+    except ValueError:
+        # gateway errors come back as HTML; the caller handles them by status code
+        data = {}
+    acknowledged = is_acknowledged(response, data)
+    if acknowledged:
+        record_ack(key, path, body, data)
+        in_flight.mark(key, acknowledged=True)
+    audit_log.record(
+        path,
+        body,
+        response.status_code,
+        response.elapsed.total_seconds(),
+        acknowledged,
+        data,
+        None if data else response.text,
+    )
+    return response, data
@@ -1,5 +1,63 @@
 import frappe
 from frappe.utils import now_datetime # type: ignore
+from taxiye_eims_integration.utils.write_buffer import insert_rows
+
+# Redis cache of the invoice fields a receipt needs, keyed by invoice id
+REDIS_KEY_RECEIPT_INVOICE = "eims:receipt_invoice:{}"
+# receipts normally follow the invoice within seconds; a day covers late ones
+RECEIPT_INVOICE_CACHE_TTL = 60 * 60 * 24
+
+RECEIPT_INVOICE_FIELDS = (
+    "name",
+    "irn",
+    "document_number",
+    "total_payment",
+    "tax",
+    "base_fare",
+    "commission_amount",
+    "taxi_provider_name",
+    "taxi_provider_tin",
+    "taxi_provider_phone",
+    "rider_name",
+    "rider_phone",
+    "date",
+    "time",
+    "description",
+)
+
+
+def cache_invoice_for_receipt(invoice):
+    """Write the receipt-relevant fields of a Trip Invoice to Redis."""
+    cached = frappe._dict({field: invoice.get(field) for field in RECEIPT_INVOICE_FIELDS})  # type: ignore
+    frappe.cache().set_value(  # type: ignore
+        REDIS_KEY_RECEIPT_INVOICE.format(invoice.name),
+        cached,
+        expires_in_sec=RECEIPT_INVOICE_CACHE_TTL,
+    )
+    return cached
+
+
+def clear_invoice_receipt_cache(invoice_id):
+    frappe.cache().delete_value(REDIS_KEY_RECEIPT_INVOICE.format(invoice_id))  # type: ignore
+
+
+def get_invoice_for_receipt(invoice_id):
+    """Return the fields a receipt needs from a Trip Invoice, cache first.
+
+    Falls back to a narrow column read (never the signed blobs) of the hot
+    table, then the archive, and refills the cache on a miss. Returns None when the invoice does not exist.
+    """
+    cached = frappe.cache().get_value(REDIS_KEY_RECEIPT_INVOICE.format(invoice_id))  # type: ignore
+    if cached:
+        return frappe._dict(cached)  # type: ignore
+
+    # imported here: archive builds on this module
+    from taxiye_eims_integration.utils.archive import get_trip_invoice
+
+    invoice = get_trip_invoice(name=invoice_id, fields=RECEIPT_INVOICE_FIELDS)
+    if not invoice:
+        return None
+    return cache_invoice_for_receipt(invoice)
 
 
 def get_last_eims_invoice():
@@ -29,14 +87,19 @@ def save_eims_invoice(
     taxi_provider_name: str,
     taxi_provider_tin: str,
     taxi_provider_phone: str | None,
-    taxi_provider_email: str | None,
     reference: str,
     date,
     time,
     description: str = "",
+    taxi_provider_email: str | None = None,
     # New fields
     rider_name: str | None = None,
     rider_phone: str | None = None,
+    rider_tin: str | None = None,
+    trip_id: str | None = None,
+    document_type: str = "INV",
+    related_invoice: str | None = None,
+    related_irn: str | None = None,
 ):
     """Save a Trip Invoice"""
 
@@ -45,12 +108,15 @@ def save_eims_invoice(
     # Mandatory fields
     transaction_doc.taxi_provider_name = taxi_provider_name
     transaction_doc.taxi_provider_tin = taxi_provider_tin
+    transaction_doc.taxi_provider_email = taxi_provider_email
     transaction_doc.invoice_number = invoice_number
+    transaction_doc.trip_id = trip_id
     transaction_doc.date = date
     transaction_doc.time = time
     transaction_doc.reference = reference
     transaction_doc.rider_name = rider_name
     transaction_doc.rider_phone = rider_phone
+    transaction_doc.rider_tin = rider_tin
     transaction_doc.document_number = document_number
     transaction_doc.invoice_counter = invoice_counter
     transaction_doc.irn = irn
@@ -65,12 +131,23 @@ def save_eims_invoice(
     transaction_doc.signed_invoice = signed_invoice
     transaction_doc.acknowledged_date = acknowledged_date
     transaction_doc.description = description
+    transaction_doc.document_type = document_type
+    transaction_doc.related_invoice = related_invoice
+    transaction_doc.related_irn = related_irn
 
     transaction_doc.insert(ignore_permissions=True)
     frappe.db.commit()  # type: ignore
 
     return transaction_doc
 
+def bulk_insert_invoices(invoices):
+    """Insert many Trip Invoices with multi-row INSERTs, skipping the Document lifecycle.
+
+    `invoices` are dicts of Trip Invoice values (see api.invoice.get_invoice_values)
+    in chain order. Does not commit. Returns the generated names.
+    """
+    return insert_rows("Trip Invoice", invoices)
+
 #create temporary invoice 
 def temporary_eims_invoice(document_number, invoice_counter):
     # Create a new Document instance of doctype 'Trip Invoice'
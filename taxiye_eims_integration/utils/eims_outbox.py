@@ -0,0 +1,291 @@
+import random
+import frappe
+from frappe.utils import add_to_date, now_datetime  # type: ignore
+from taxiye_eims_integration.utils.eims_client import EIMSRateLimited, EIMSSubmissionError
+from taxiye_eims_integration.utils.eims_receipt import reserved_receipt_counters
+from taxiye_eims_integration.utils.rate_budget import BACKGROUND, RETRY, priority_class
+from taxiye_eims_integration.utils.serialization import dumps, loads, payload_hash
+from taxiye_eims_integration.utils.write_buffer import TripWriteBuffer
+
+# Lower values are drained first. Invoices go ahead of receipts because a
+# receipt can only be registered once its invoice has an IRN.
+PRIORITY_INVOICE = 1
+PRIORITY_RECEIPT = 5
+# trips pulled by the ingest pipeline and other bulk jobs
+PRIORITY_BACKGROUND = 10
+
+# Backoff between attempts: exponential from BASE, capped at MAX, with jitter
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+
+# Rows stuck in Processing longer than this are assumed orphaned by a dead worker
+PROCESSING_TIMEOUT_SECONDS = 15 * 60
+
+DEFAULT_BATCH_SIZE = 50
+
+# delay before the rest of a drain stopped by a shed entry is tried again
+SHED_RETRY_SECONDS = 60
+
+# Entries shed by the rate budget or rate limited by EIMS are deferred without
+# counting an attempt, each time twice as long from DEFERRAL_BASE up to
+# DEFERRAL_MAX. Past MAX_DEFERRALS a deferral counts as a failed attempt, so
+# an entry that stays rate limited still ends up Failed.
+DEFERRAL_BASE_SECONDS = 2
+DEFERRAL_MAX_SECONDS = 5 * 60
+MAX_DEFERRALS = 10
+
+
+def get_backoff_seconds(attempts):
+    """Return a jittered exponential delay for the given attempt count."""
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0), BACKOFF_MAX_SECONDS)
+    # "equal jitter": keep half the delay, randomise the rest so retries spread out
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def get_deferral_seconds(deferrals, retry_after=None):
+    """Delay before a rate limited entry is due again; at least `retry_after`."""
+    delay = min(DEFERRAL_BASE_SECONDS * 2 ** max(deferrals - 1, 0), DEFERRAL_MAX_SECONDS)
+    return max(delay, retry_after or 0)
+
+
+def get_idempotency_key(submission_type, payload):
+    """What makes a submission the same one: the trip of an invoice, the
+    invoice of a receipt, the request of a credit note.
+
+    Partial credit notes of one invoice may carry the same amount, so they
+    are told apart by their request id, never by content.
+    """
+    if submission_type == "Invoice":
+        value = payload.get("trip_id")
+    elif submission_type == "Receipt":
+        value = payload.get("invoice_id")
+    else:
+        value = payload.get("request_id")
+    return f"{submission_type}:{value}" if value else None
+
+
+def enqueue_submission(
+    submission_type,
+    payload,
+    request_body=None,
+    error=None,
+    reference_id=None,
+    priority=None,
+    deferred=False,
+    retry_after=None,
+):
+    """Store a failed (or deferred) EIMS submission in the outbox for retry.
+
+    A `deferred` submission (rate limited) counts a deferral instead of an
+    attempt and is due after the first deferral delay, or `retry_after`
+    seconds when EIMS asked for longer. A submission already waiting in the
+    outbox (same idempotency key) is not queued twice; the existing entry is
+    returned instead.
+    """
+    encoded = dumps(payload)
+    idempotency_key = get_idempotency_key(submission_type, payload)
+    existing = idempotency_key and frappe.db.get_value(  # type: ignore
+        "EIMS Outbox", {"idempotency_key": idempotency_key, "status": ["in", ["Pending", "Processing"]]}
+    )
+    if existing:
+        return frappe.get_doc("EIMS Outbox", existing)  # type: ignore
+
+    if priority is None:
+        # credit notes take numbers from the invoice chain
+        priority = PRIORITY_RECEIPT if submission_type == "Receipt" else PRIORITY_INVOICE
+
+    outbox = frappe.new_doc("EIMS Outbox")  # type: ignore
+    outbox.submission_type = submission_type
+    outbox.reference_id = reference_id
+    outbox.status = "Pending"
+    outbox.priority = priority
+    outbox.attempts = 1 if error and not deferred else 0
+    outbox.deferrals = 1 if deferred else 0
+    outbox.payload = encoded.decode()
+    outbox.payload_hash = payload_hash(payload)
+    outbox.idempotency_key = idempotency_key
+    outbox.request_body = dumps(request_body).decode() if request_body else None
+    outbox.last_error = error
+    # fresh submissions are due at once; failed ones wait out the first backoff
+    if deferred:
+        outbox.next_attempt_at = add_to_date(now_datetime(), seconds=get_deferral_seconds(1, retry_after))
+    elif error:
+        outbox.next_attempt_at = add_to_date(now_datetime(), seconds=get_backoff_seconds(outbox.attempts))
+    else:
+        outbox.next_attempt_at = now_datetime()
+    outbox.insert(ignore_permissions=True)
+    frappe.db.commit()  # type: ignore
+
+    return outbox
+
+
+def release_stale_entries():
+    """Put entries left in Processing by a crashed worker back in the queue."""
+    frappe.db.sql(  # type: ignore
+        """
+        update `tabEIMS Outbox`
+        set status = 'Pending', next_attempt_at = %(now)s
+        where status = 'Processing' and modified < %(cutoff)s
+        """,
+        {
+            "now": now_datetime(),
+            "cutoff": add_to_date(now_datetime(), seconds=-PROCESSING_TIMEOUT_SECONDS),
+        },
+    )
+    frappe.db.commit()  # type: ignore
+
+
+def claim_due_entries(batch_size=DEFAULT_BATCH_SIZE):
+    """Lock and mark a batch of due entries as Processing.
+
+    Reads through the (status, next_attempt_at) index and skips rows locked
+    by another worker, so concurrent drains never pick the same entry.
+    """
+    names = frappe.db.sql(  # type: ignore
+        """
+        select name from `tabEIMS Outbox`
+        where status = 'Pending' and next_attempt_at <= %(now)s
+        order by priority asc, name asc
+        limit %(limit)s
+        for update skip locked
+        """,
+        {"now": now_datetime(), "limit": int(batch_size)},
+        pluck=True,
+    )
+    if names:
+        frappe.db.sql(  # type: ignore
+            "update `tabEIMS Outbox` set status = 'Processing', modified = %(now)s where name in %(names)s",
+            {"now": now_datetime(), "names": tuple(names)},
+        )
+    frappe.db.commit()  # type: ignore
+
+    return names
+
+
+def requeue_entries(names, delay_seconds=SHED_RETRY_SECONDS):
+    """Put claimed entries back to Pending without counting an attempt."""
+    if not names:
+        return
+    frappe.db.sql(  # type: ignore
+        "update `tabEIMS Outbox` set status = 'Pending', next_attempt_at = %(due)s where name in %(names)s",
+        {"due": add_to_date(now_datetime(), seconds=delay_seconds), "names": tuple(names)},
+    )
+    frappe.db.commit()  # type: ignore
+
+
+def defer_entry(name, deferrals, delay_seconds):
+    """Put a claimed entry back to Pending, counting a deferral instead of an attempt."""
+    frappe.db.sql(  # type: ignore
+        """
+        update `tabEIMS Outbox`
+        set status = 'Pending', deferrals = %(deferrals)s, next_attempt_at = %(due)s
+        where name = %(name)s
+        """,
+        {"deferrals": deferrals, "due": add_to_date(now_datetime(), seconds=delay_seconds), "name": name},
+    )
+    frappe.db.commit()  # type: ignore
+
+
+def record_failure(outbox, error):
+    """Count a failed attempt; back off, or give up after max_attempts."""
+    outbox.attempts = (outbox.attempts or 0) + 1
+    if isinstance(error, EIMSSubmissionError) and error.request_body:
+        outbox.request_body = dumps(error.request_body).decode()
+    outbox.last_error = frappe.get_traceback() if not isinstance(error, EIMSSubmissionError) else str(error)  # type: ignore
+
+    if outbox.attempts >= (outbox.max_attempts or 1):
+        outbox.status = "Failed"
+        frappe.log_error(  # type: ignore
+            f"EIMS Outbox {outbox.name} failed after {outbox.attempts} attempts", outbox.last_error
+        )
+    else:
+        outbox.status = "Pending"
+        outbox.next_attempt_at = add_to_date(now_datetime(), seconds=get_backoff_seconds(outbox.attempts))
+
+
+def get_priority_class(outbox):
+    # bulk entries only get leftover budget; retried rider traffic stays below the interactive reserve
+    return BACKGROUND if (outbox.priority or 0) >= PRIORITY_BACKGROUND else RETRY
+
+
+def submit_entry(outbox, receipt_writer=None):
+    """Replay a stored submission through the regular EIMS submission path."""
+    # imported here: the api modules import this one to enqueue failures
+    payload = loads(outbox.payload)
+
+    if outbox.submission_type == "Invoice":
+        from taxiye_eims_integration.api.invoice import submit_invoice
+        from taxiye_eims_integration.api.schemas import InvoicePayload
+
+        return submit_invoice(InvoicePayload(**payload))
+
+    if outbox.submission_type == "Credit Note":
+        from taxiye_eims_integration.utils.credit_notes import submit_credit_note
+
+        return submit_credit_note(payload)
+
+    from taxiye_eims_integration.api.receipt import submit_receipt
+    from taxiye_eims_integration.api.schemas import ReceiptModel
+
+    return submit_receipt(ReceiptModel(**payload), writer=receipt_writer)
+
+
+def process_entry(name, receipt_writer=None):
+    """Attempt a single outbox entry and record the outcome.
+
+    Returns the new status, or "Shed" when the rate budget or the EIMS rate
+    limit deferred it.
+    """
+    outbox = frappe.get_doc("EIMS Outbox", name)  # type: ignore
+
+    try:
+        with priority_class(get_priority_class(outbox)):
+            result = submit_entry(outbox, receipt_writer)
+    except EIMSRateLimited as e:
+        # shed by the rate budget or rate limited by EIMS
+        frappe.db.rollback()  # type: ignore
+        outbox.deferrals = (outbox.deferrals or 0) + 1
+        if outbox.deferrals <= MAX_DEFERRALS:
+            # not the submission's fault: no attempt counted, and the drain stops
+            defer_entry(name, outbox.deferrals, get_deferral_seconds(outbox.deferrals, e.retry_after))
+            return "Shed"
+        record_failure(outbox, e)
+    except Exception as e:
+        frappe.db.rollback()  # type: ignore
+        record_failure(outbox, e)
+    else:
+        outbox.attempts = (outbox.attempts or 0) + 1
+        outbox.status = "Sent"
+        outbox.last_error = None
+        data = result.get("data") or {}
+        outbox.result_name = data.get("receipt_id") or data.get("credit_note_id") or data.get("invoice_id")
+        if receipt_writer and receipt_writer.rows:
+            # a buffered receipt is not in the database yet: Sent is saved
+            # in the same transaction as the rows
+            receipt_writer.before_commit(lambda: outbox.save(ignore_permissions=True))
+            return outbox.status
+
+    outbox.save(ignore_permissions=True)
+    frappe.db.commit()  # type: ignore
+
+    return outbox.status
+
+
+def process_outbox(batch_size=DEFAULT_BATCH_SIZE):
+    """Scheduler entry point: drain due outbox entries in priority and sequence order."""
+    release_stale_entries()
+
+    # receipts of the batch are written together; invoices are saved one by
+    # one since the next invoice chains on the last saved one
+    with TripWriteBuffer("Trip Receipt", max_rows=batch_size) as receipt_writer:
+        names = claim_due_entries(batch_size)
+        receipts = names and frappe.db.count(  # type: ignore
+            "EIMS Outbox", {"name": ["in", names], "submission_type": "Receipt"}
+        )
+        # one INCRBY for the receipt counters of the whole batch
+        with reserved_receipt_counters(receipts):
+            for position, name in enumerate(names):
+                if process_entry(name, receipt_writer) == "Shed":
+                    # no budget left this window; the rest would be shed too
+                    requeue_entries(names[position + 1 :])
+                    break
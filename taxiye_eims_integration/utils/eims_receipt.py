@@ -1,5 +1,78 @@
+from contextlib import contextmanager
 import frappe
 
+# Redis key holding the last allocated receipt counter
+REDIS_KEY_RECEIPT_COUNTER = "eims:receipt_counter"
+
+# INCRBY only when the counter exists, so an allocation is one round trip;
+# a missing counter (e.g. after a flush) returns nil and is seeded first.
+INCRBY_IF_EXISTS = """
+if redis.call("exists", KEYS[1]) == 1 then
+    return redis.call("incrby", KEYS[1], ARGV[1])
+end
+return false
+"""
+
+# Counters used to be random 5 digit numbers (10000-99999); start above that
+# range so sequential counters never collide with previously issued ones.
+RECEIPT_COUNTER_FLOOR = 100000
+
+
+def _get_last_saved_receipt_counter():
+    """Return the highest receipt counter persisted in Trip Receipt."""
+    result = frappe.db.sql(  # type: ignore
+        "select max(receipt_counter) from `tabTrip Receipt`"
+    )
+    last_counter = result[0][0] if result and result[0][0] else 0
+    return max(int(last_counter), RECEIPT_COUNTER_FLOOR)
+
+
+def reserve_receipt_counters(count=1):
+    """Atomically reserve `count` consecutive receipt counters.
+
+    The counter lives in Redis so every worker allocates from the same
+    sequence with a single INCRBY; it is seeded from the highest counter
+    stored in Trip Receipt when the key is missing (e.g. after a flush).
+    Returns a range of the reserved counters.
+    """
+    count = int(count)
+    if count < 1:
+        frappe.throw("Receipt counter reservation size must be at least 1")  # type: ignore
+
+    r = frappe.cache()  # type: ignore
+    key = r.make_key(REDIS_KEY_RECEIPT_COUNTER)
+
+    last_counter = r.eval(INCRBY_IF_EXISTS, 1, key, count)
+    if last_counter is None:
+        # nx: only the first worker seeds, the others keep its value
+        r.set(key, _get_last_saved_receipt_counter(), nx=True)
+        last_counter = r.incrby(key, count)
+    return range(last_counter - count + 1, last_counter + 1)
+
+
+@contextmanager
+def reserved_receipt_counters(count):
+    """Reserve `count` counters in one round trip for the receipts of a batch.
+
+    get_next_receipt_counter() inside the block takes them in order, then
+    falls back to single reservations. Counters left over (entries that
+    failed or were shed) are skipped: counters only need to be unique.
+    """
+    previous = frappe.flags.eims_receipt_counters  # type: ignore
+    frappe.flags.eims_receipt_counters = iter(reserve_receipt_counters(count)) if count else None  # type: ignore
+    try:
+        yield
+    finally:
+        frappe.flags.eims_receipt_counters = previous  # type: ignore
+
+
+def get_next_receipt_counter():
+    """Take a counter reserved for the current batch, or reserve a single one."""
+    reserved = frappe.flags.eims_receipt_counters  # type: ignore
+    counter = next(reserved, None) if reserved else None
+    return reserve_receipt_counters(1)[0] if counter is None else counter
+
+
 def save_eims_receipt(
     invoice_id: str,
     irn: str,
@@ -11,7 +84,9 @@ def save_eims_receipt(
     base_fare: float,
     commission_amount: float,
     status: str,
-    signer_qr: str
+    signer_qr: str,
+    receipt_counter: int | None = None,
+    manual_receipt_number: str | None = None,
 ):
     """Save a new Trip Receipt with all required fields"""
 
@@ -22,8 +97,10 @@ def save_eims_receipt(
     receipt_doc.invoice_id = invoice_id                           # Invoice ID (Link to trip Invoice)
     receipt_doc.irn = irn                                         #  Invoice Reference Number
     receipt_doc.rrn = rrn                                         # Receipt Reference Number
+    receipt_doc.receipt_counter = receipt_counter                 # Receipt Counter sent to EIMS
+    receipt_doc.manual_receipt_number = manual_receipt_number     # Manual Receipt Number sent to EIMS
     receipt_doc.payment_method = payment_method                   # Payment Method
-    receipt_doc.payment_date = payment_date 
+    receipt_doc.payment_date = payment_date
     receipt_doc.base_fare = base_fare
     receipt_doc.commission_amount = commission_amount
     receipt_doc.total_payment = total_payment                     # Payment Amount
@@ -36,4 +113,3 @@ def save_eims_receipt(
     frappe.db.commit()  # type: ignore
 
     return receipt_doc
- 
\ No newline at end of file
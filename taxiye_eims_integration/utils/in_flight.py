@@ -0,0 +1,252 @@
+import os
+import signal
+import socket
+import threading
+import time
+from contextlib import contextmanager
+import frappe
+from taxiye_eims_integration.utils.metrics import inc
+from taxiye_eims_integration.utils.serialization import dumps, loads
+from taxiye_eims_integration.utils.submission_journal import get_acknowledgement
+
+# In-flight EIMS submissions, so a worker recycled between the EIMS
+# acknowledgement and the save does not lose an IRN.
+#
+# submit_invoice / submit_receipt register the submission in a Redis hash
+# before anything is sent and remove it once it is saved; post_journaled
+# notes the journal key of each attempt and whether EIMS acknowledged it.
+# SIGTERM / SIGINT / SIGQUIT are held back while this process has
+# submissions in flight, up to eims_shutdown_grace_seconds. What is left
+# behind by a killed worker is resolved by recover_in_flight (each minute
+# and after migrate): acknowledged submissions are saved from the journal
+# ack, filling the placeholder a resync wrote for their number; the rest go
+# back to the outbox.
+
+REDIS_KEY_IN_FLIGHT = "eims:in_flight"
+
+DEFAULT_SHUTDOWN_GRACE_SECONDS = 25
+# a live submission refreshes its entry on every attempt
+STALE_AFTER_SECONDS = 300
+
+HANDLED_SIGNALS = ("SIGTERM", "SIGINT", "SIGQUIT")
+
+_local = threading.local()
+_lock = threading.Lock()
+_in_flight = 0
+# signum -> previous handler
+_previous_handlers = {}
+# signum -> (deadline, timer) of a held back signal
+_held = {}
+
+
+def get_hash_key():
+    cache = frappe.cache()  # type: ignore
+    return cache, cache.make_key(REDIS_KEY_IN_FLIGHT)
+
+
+def write_entry(token, entry):
+    cache, key = get_hash_key()
+    entry["updated_at"] = time.time()
+    cache.hset(key, token, dumps(entry))
+
+
+@contextmanager
+def track(submission_type, payload):
+    """Mark a submission in flight until the block has saved it.
+
+    The entry is kept when the block fails after EIMS acknowledged the
+    submission, so the recovery pass saves it.
+    """
+    global _in_flight
+
+    install_signal_handlers()
+    token = frappe.generate_hash(length=16)  # type: ignore
+    entry = {
+        "submission_type": submission_type,
+        "payload": payload,
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "started_at": time.time(),
+        "journal_key": None,
+        "acknowledged": False,
+    }
+    write_entry(token, entry)
+    _local.current = (token, entry)
+    with _lock:
+        _in_flight += 1
+
+    try:
+        yield
+    except BaseException:
+        if not entry["acknowledged"]:
+            drop_entry(token)
+        raise
+    else:
+        drop_entry(token)
+    finally:
+        _local.current = None
+        with _lock:
+            _in_flight -= 1
+            release = _in_flight == 0 and list(_held)
+        # re-deliver held back signals; the handler now passes them on
+        for signum in release or ():
+            os.kill(os.getpid(), signum)
+
+
+def drop_entry(token):
+    cache, key = get_hash_key()
+    cache.hdel(key, token)
+
+
+def mark(journal_key, acknowledged=False):
+    """Note the journal key of the attempt being sent (post_journaled)."""
+    current = getattr(_local, "current", None)
+    if not current:
+        return
+    token, entry = current
+    if entry["journal_key"] == journal_key and entry["acknowledged"] == acknowledged:
+        return
+    entry.update(journal_key=journal_key, acknowledged=acknowledged)
+    write_entry(token, entry)
+
+
+def get_shutdown_grace_seconds():
+    return int(frappe.conf.get("eims_shutdown_grace_seconds") or DEFAULT_SHUTDOWN_GRACE_SECONDS)  # type: ignore
+
+
+def install_signal_handlers():
+    # handlers can only be set from the main thread; other threads rely on it
+    if _previous_handlers or threading.current_thread() is not threading.main_thread():
+        return
+    for name in HANDLED_SIGNALS:
+        signum = getattr(signal, name)
+        _previous_handlers[signum] = signal.getsignal(signum)
+        signal.signal(signum, handle_signal)
+
+
+def handle_signal(signum, frame):
+    """Hold a shutdown signal back while submissions are in flight."""
+    with _lock:
+        busy = _in_flight > 0
+    held = _held.get(signum)
+    if busy and (held is None or time.monotonic() < held[0]):
+        if held is None:
+            grace = get_shutdown_grace_seconds()
+            # re-deliver at the deadline whether or not the submissions finished
+            timer = threading.Timer(grace, os.kill, (os.getpid(), signum))
+            timer.daemon = True
+            _held[signum] = (time.monotonic() + grace, timer)
+            timer.start()
+        return
+
+    held = _held.pop(signum, None)
+    if held:
+        held[1].cancel()
+    previous = _previous_handlers.get(signum)
+    if callable(previous):
+        previous(signum, frame)
+    elif previous == signal.SIG_DFL:
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+
+def is_abandoned(entry, now):
+    if now - entry.get("updated_at", 0) > STALE_AFTER_SECONDS:
+        return True
+    if entry.get("host") != socket.gethostname():
+        return False
+    try:
+        os.kill(entry["pid"], 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def recover_invoice(payload, ack):
+    """Save an acknowledged invoice, in place of its resync placeholder if there is one."""
+    from taxiye_eims_integration.api.invoice import get_acknowledged_last_doc, get_invoice_values
+    from taxiye_eims_integration.utils.eims_invoice import cache_invoice_for_receipt, save_eims_invoice
+
+    values = get_invoice_values(get_acknowledged_last_doc(ack["sequence"]), ack["response"], payload)
+    if frappe.db.exists("Trip Invoice", {"irn": values["irn"]}):  # type: ignore
+        return
+
+    placeholder = frappe.db.get_value(  # type: ignore
+        "Trip Invoice", {"document_number": int(values["document_number"]), "irn": ""}
+    )
+    if placeholder:
+        # keeps the placeholder's place in the chain (and its creation)
+        values.pop("invoice_number")
+        invoice = frappe.get_doc("Trip Invoice", placeholder)  # type: ignore
+        invoice.update(values)
+        invoice.save(ignore_permissions=True)
+    else:
+        invoice = save_eims_invoice(**values)
+
+    # the next invoice was chained to the placeholder's empty IRN
+    frappe.db.sql(  # type: ignore
+        """update `tabTrip Invoice` set previous_irn = %s
+        where document_number = %s and ifnull(previous_irn, '') = ''""",
+        (values["irn"], int(values["document_number"]) + 1),
+    )
+    frappe.db.commit()  # type: ignore
+    cache_invoice_for_receipt(invoice)
+
+
+def resolve_entry(entry):
+    """Settle one abandoned submission; returns how."""
+    from taxiye_eims_integration.utils.eims_outbox import enqueue_submission
+
+    ack = entry.get("journal_key") and get_acknowledgement(entry["journal_key"])
+    if entry["submission_type"] == "Invoice":
+        from taxiye_eims_integration.api.schemas import InvoicePayload
+
+        if ack:
+            recover_invoice(InvoicePayload(**entry["payload"]), ack)
+            return "saved"
+        reference_id = entry["payload"].get("trip_id")
+    else:
+        if ack:
+            from taxiye_eims_integration.api.receipt import submit_receipt
+            from taxiye_eims_integration.api.schemas import ReceiptModel
+
+            # replays the journaled ack; saves the receipt unless it already was
+            submit_receipt(ReceiptModel(**entry["payload"]))
+            return "saved"
+        reference_id = entry["payload"].get("invoice_id")
+
+    # never acknowledged (or the ack was lost with the worker): submit again
+    enqueue_submission(
+        entry["submission_type"],
+        entry["payload"],
+        error="Worker stopped before EIMS acknowledged the submission",
+        reference_id=reference_id,
+    )
+    return "requeued"
+
+
+def recover_in_flight():
+    """Resolve submissions left in flight by workers that are gone (cron, after_migrate)."""
+    cache, key = get_hash_key()
+    now = time.time()
+    resolved = {}
+
+    for token, raw in (cache.hgetall(key) or {}).items():
+        entry = loads(raw)
+        # hdel is the claim: of two concurrent passes only one gets 1
+        if not is_abandoned(entry, now) or not cache.hdel(key, token):
+            continue
+        try:
+            outcome = resolve_entry(entry)
+        except Exception:
+            frappe.db.rollback()  # type: ignore
+            # put it back for the next pass
+            cache.hset(key, token, raw)
+            frappe.log_error("EIMS in-flight recovery failed", frappe.get_traceback())  # type: ignore
+            continue
+        inc("eims_in_flight_recovered_total", outcome=outcome)
+        resolved[outcome] = resolved.get(outcome, 0) + 1
+
+    return resolved
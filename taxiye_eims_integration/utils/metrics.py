@@ -0,0 +1,132 @@
+import threading
+import time
+import frappe
+import redis
+
+# Counters and histograms for the EIMS integration, aggregated across workers
+# in one Redis hash per site and rendered in the Prometheus text format by
+# api.metrics. Increments are buffered per worker and written with a single
+# pipelined round trip at the end of each request / job, or after
+# FLUSH_INTERVAL_SECONDS, so the hot path is a dict update.
+
+REDIS_KEY_METRICS = "eims:metrics"
+FLUSH_INTERVAL_SECONDS = 5
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    "eims_requests_total": ("counter", "EIMS API calls by path and HTTP status", None),
+    "eims_request_duration_seconds": ("histogram", "EIMS API call latency by path", DEFAULT_BUCKETS),
+    "eims_requests_shed_total": ("counter", "EIMS calls shed by the rate budget by priority class", None),
+    "eims_submissions_total": ("counter", "Invoice and receipt submissions by outcome", None),
+    "eims_invoice_retries_total": ("counter", "Invoice registration retries by reason", None),
+    "eims_journal_replays_total": ("counter", "Submissions answered from the journal instead of EIMS by path", None),
+    "eims_sequence_resyncs_total": ("counter", "Sequence resyncs after a 406/417 from EIMS", None),
+    "eims_receipt_failures_total": ("counter", "Receipt submissions EIMS did not accept by reason", None),
+    "eims_audit_entries_dropped_total": ("counter", "Audit log entries dropped because the writer fell behind", None),
+    "eims_in_flight_recovered_total": ("counter", "Submissions left in flight by stopped workers by how they were settled", None),
+    "eims_buyer_lookups_total": ("counter", "B2B buyer registry lookups by result", None),
+    "eims_token_requests_total": ("counter", "Access token lookups by where the token came from", None),
+    "eims_token_refreshes_total": ("counter", "Access token refreshes by outcome", None),
+    "eims_logins_total": ("counter", "EIMS logins by outcome", None),
+}
+
+# site -> {series: increment}
+_pending = {}
+_last_flush = {}
+_lock = threading.Lock()
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in sorted(labels.items())
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _add(series, value):
+    site = frappe.local.site  # type: ignore
+    with _lock:
+        pending = _pending.setdefault(site, {})
+        pending[series] = pending.get(series, 0) + value
+        due = time.monotonic() - _last_flush.setdefault(site, time.monotonic()) >= FLUSH_INTERVAL_SECONDS
+    if due:
+        flush()
+
+
+def inc(name, value=1, **labels):
+    """Increment a counter."""
+    _add(name + format_labels(labels), value)
+
+
+def observe(name, value, **labels):
+    """Record one observation of a histogram."""
+    buckets = METRICS[name][2]
+    for bound in buckets:
+        # zero increments too, so every bucket of the series is exposed
+        _add(f"{name}_bucket" + format_labels({**labels, "le": bound}), 1 if value <= bound else 0)
+    _add(f"{name}_bucket" + format_labels({**labels, "le": "+Inf"}), 1)
+    _add(f"{name}_sum" + format_labels(labels), value)
+    _add(f"{name}_count" + format_labels(labels), 1)
+
+
+def flush():
+    """Write this worker's buffered increments for the current site to Redis."""
+    site = getattr(frappe.local, "site", None)
+    if not site:
+        return
+    with _lock:
+        pending = _pending.pop(site, None)
+        _last_flush[site] = time.monotonic()
+    if not pending:
+        return
+
+    cache = frappe.cache()  # type: ignore
+    key = cache.make_key(REDIS_KEY_METRICS)
+    pipeline = cache.pipeline()
+    for series, value in pending.items():
+        pipeline.hincrbyfloat(key, series, value)
+    pipeline.execute()
+
+
+def get_family(series):
+    base = series.split("{", 1)[0]
+    for suffix in ("_bucket", "_sum", "_count"):
+        if base.endswith(suffix) and base[: -len(suffix)] in METRICS:
+            return base[: -len(suffix)]
+    return base
+
+
+def sort_key(series):
+    # buckets of one histogram series are listed in increasing `le` order
+    base, _, labels = series.partition("{")
+    bound = ""
+    if 'le="' in labels:
+        bound = labels.split('le="', 1)[1].split('"', 1)[0]
+        labels = labels.replace(f'le="{bound}"', "")
+    return base, labels, float("inf") if bound == "+Inf" else float(bound or 0)
+
+
+def render():
+    """Current values in the Prometheus text exposition format."""
+    flush()
+    cache = frappe.cache()  # type: ignore
+    # raw HGETALL on the key flush() writes; RedisWrapper.hgetall would prefix it again and unpickle
+    raw = redis.Redis.hgetall(cache, cache.make_key(REDIS_KEY_METRICS)) or {}
+    values = {
+        (series.decode() if isinstance(series, bytes) else series): float(value)
+        for series, value in raw.items()
+    }
+
+    lines = []
+    for name, (kind, help_text, _buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for series in sorted((series for series in values if get_family(series) == name), key=sort_key):
+            value = values[series]
+            lines.append(f"{series} {int(value) if value.is_integer() else value}")
+    return "\n".join(lines) + "\n"
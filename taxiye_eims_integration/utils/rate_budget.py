@@ -0,0 +1,117 @@
+import time
+from contextlib import contextmanager
+import frappe
+import redis
+
+# Shared EIMS request budget with priority classes. Every call to EIMS takes
+# a token from a per-second window in Redis that all workers share.
+# Interactive traffic (rider-facing create_invoice / create_receipt) may use
+# the whole window; retries of queued submissions stop short of the share
+# reserved for interactive traffic, and background jobs (backfill, ingest)
+# only get what is left below that, so they are shed first under pressure.
+# A class without budget is shed at once: web and job workers never sleep,
+# they defer the call to the outbox. Only standalone processes (the backfill
+# command) pass wait_seconds to priority_class to wait for the next window.
+#
+# Site config:
+#   eims_rate_limit_per_second      requests per second for the site (default 10)
+#   eims_interactive_reserved_share share kept for interactive traffic (default 0.3)
+
+INTERACTIVE = "interactive"
+RETRY = "retry"
+BACKGROUND = "background"
+PRIORITY_CLASSES = (INTERACTIVE, RETRY, BACKGROUND)
+
+DEFAULT_RATE_LIMIT_PER_SECOND = 10
+DEFAULT_INTERACTIVE_RESERVED_SHARE = 0.3
+# share of the non-reserved budget background jobs may use
+BACKGROUND_SHARE = 0.5
+
+REDIS_KEY_WINDOW = "eims:rate_budget:{}"
+REDIS_KEY_STATS = "eims:rate_budget:stats"
+
+
+def get_class_limits():
+    """Requests per second each priority class may take, counting all classes."""
+    capacity = int(frappe.conf.get("eims_rate_limit_per_second") or DEFAULT_RATE_LIMIT_PER_SECOND)  # type: ignore
+    reserved = float(
+        frappe.conf.get("eims_interactive_reserved_share") or DEFAULT_INTERACTIVE_RESERVED_SHARE  # type: ignore
+    )
+    shared = capacity * (1 - reserved)
+    return {
+        INTERACTIVE: capacity,
+        RETRY: max(int(shared), 1),
+        BACKGROUND: max(int(shared * BACKGROUND_SHARE), 1),
+    }
+
+
+@contextmanager
+def priority_class(name, wait_seconds=None):
+    """Run the EIMS calls inside the block under the given priority class."""
+    previous = frappe.flags.eims_priority_class, frappe.flags.eims_priority_wait  # type: ignore
+    frappe.flags.eims_priority_class = name  # type: ignore
+    frappe.flags.eims_priority_wait = wait_seconds  # type: ignore
+    try:
+        yield
+    finally:
+        frappe.flags.eims_priority_class, frappe.flags.eims_priority_wait = previous  # type: ignore
+
+
+def get_priority_class():
+    # calls outside a priority_class block come from the whitelisted endpoints
+    return frappe.flags.eims_priority_class or INTERACTIVE  # type: ignore
+
+
+def count(name, outcome):
+    cache = frappe.cache()  # type: ignore
+    cache.hincrby(cache.make_key(REDIS_KEY_STATS), f"{name}:{outcome}", 1)
+
+
+def acquire(name=None, wait_seconds=None):
+    """Take one token for the current window. Returns False when the class is shed."""
+    name = name or get_priority_class()
+    if wait_seconds is None:
+        wait_seconds = frappe.flags.eims_priority_wait or 0  # type: ignore
+
+    limit = get_class_limits()[name]
+    cache = frappe.cache()  # type: ignore
+    deadline = time.monotonic() + wait_seconds
+    waited = False
+
+    while True:
+        window = int(time.time())
+        key = cache.make_key(REDIS_KEY_WINDOW.format(window))
+        used = cache.incr(key)
+        if used == 1:
+            cache.expire(key, 2)
+        if used <= limit:
+            if waited:
+                count(name, "deferred")
+            return True
+
+        # give the token back: the window total is what the other classes compare against
+        cache.decr(key)
+        if time.monotonic() >= deadline:
+            count(name, "shed")
+            return False
+        waited = True
+        time.sleep(max(window + 1 - time.time(), 0.01))
+
+
+def get_stats():
+    """Shed and deferred counts per priority class, with the current limits."""
+    cache = frappe.cache()  # type: ignore
+    # raw HGETALL: RedisWrapper.hgetall would prefix the made key again and unpickle
+    raw = redis.Redis.hgetall(cache, cache.make_key(REDIS_KEY_STATS)) or {}
+    counts = {
+        (key.decode() if isinstance(key, bytes) else key): int(value) for key, value in raw.items()
+    }
+    limits = get_class_limits()
+    return {
+        name: {
+            "limit_per_second": limits[name],
+            "shed": counts.get(f"{name}:shed", 0),
+            "deferred": counts.get(f"{name}:deferred", 0),
+        }
+        for name in PRIORITY_CLASSES
+    }
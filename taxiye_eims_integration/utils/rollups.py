@@ -0,0 +1,190 @@
+import hashlib
+import frappe
+from frappe.utils import get_datetime, now_datetime  # type: ignore
+
+# Hourly / daily totals of Trip Invoice and Trip Receipt per provider TIN,
+# status and document type, kept up to date from doc events so dashboards
+# never scan the source tables. Credit notes (CRE) carry positive amounts
+# like the invoices they credit, so they get rows of their own instead of
+# adding to the invoice totals. rebuild_rollups() recomputes everything to
+# fix drift.
+
+BUCKET_TYPES = ("Hour", "Day")
+AMOUNT_FIELDS = ("base_fare", "commission_amount", "amount", "tax", "total_payment")
+# fields whose change moves a document to another bucket or changes its totals
+INVOICE_TRACKED_FIELDS = ("date", "time", "taxi_provider_tin", "status", "document_type", *AMOUNT_FIELDS)
+RECEIPT_TRACKED_FIELDS = ("status", *AMOUNT_FIELDS)
+
+
+def get_bucket_start(moment, bucket_type):
+    if bucket_type == "Hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_rollup_name(bucket_type, bucket_start, source, taxi_provider_tin, status, document_type):
+    key = f"{bucket_type}|{bucket_start}|{source}|{taxi_provider_tin or ''}|{status or ''}|{document_type or ''}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def get_invoice_moment(invoice):
+    # bucket invoices by trip date/time, not by when they were registered
+    return get_datetime(f"{invoice.get('date')} {invoice.get('time') or '00:00:00'}")
+
+
+def get_rollup_deltas(source, record, sign=1):
+    """Return the (key, counts) rows a single invoice/receipt contributes to."""
+    if source == "Invoice":
+        moment = get_invoice_moment(record)
+        taxi_provider_tin = record.get("taxi_provider_tin")
+        document_type = record.get("document_type") or "INV"
+    else:
+        moment = get_datetime(record.get("creation") or now_datetime())
+        taxi_provider_tin = None
+        document_type = None
+
+    amounts = [sign * float(record.get(field) or 0) for field in AMOUNT_FIELDS]
+    return [
+        (
+            bucket_type,
+            get_bucket_start(moment, bucket_type),
+            source,
+            taxi_provider_tin,
+            record.get("status"),
+            document_type,
+            sign,
+            *amounts,
+        )
+        for bucket_type in BUCKET_TYPES
+    ]
+
+
+def apply_rollup_deltas(deltas):
+    """Add deltas to their rollup rows with one INSERT ... ON DUPLICATE KEY UPDATE."""
+    if not deltas:
+        return
+
+    now = now_datetime()
+    user = frappe.session.user  # type: ignore
+    values = []
+    for bucket_type, bucket_start, source, taxi_provider_tin, status, document_type, *counts in deltas:
+        name = get_rollup_name(bucket_type, bucket_start, source, taxi_provider_tin, status, document_type)
+        values.append(
+            (
+                name, now, now, user, user,
+                bucket_type, bucket_start, source, taxi_provider_tin, status, document_type,
+                *counts,
+            )
+        )
+
+    placeholders = ", ".join(["(" + ", ".join(["%s"] * len(values[0])) + ")"] * len(values))
+    frappe.db.sql(  # type: ignore
+        f"""
+        insert into `tabTrip Stats Rollup`
+            (name, creation, modified, owner, modified_by,
+            bucket_type, bucket_start, source, taxi_provider_tin, status, document_type,
+            record_count, base_fare, commission_amount, amount, tax, total_payment)
+        values {placeholders}
+        on duplicate key update
+            record_count = record_count + values(record_count),
+            base_fare = base_fare + values(base_fare),
+            commission_amount = commission_amount + values(commission_amount),
+            amount = amount + values(amount),
+            tax = tax + values(tax),
+            total_payment = total_payment + values(total_payment),
+            modified = values(modified)
+        """,
+        [value for row in values for value in row],
+    )
+
+
+def record_rollups(source, records):
+    """Add already inserted records (e.g. from a bulk insert) to the rollups."""
+    apply_rollup_deltas([delta for record in records for delta in get_rollup_deltas(source, record)])
+
+
+def get_source(doc):
+    return "Invoice" if doc.doctype == "Trip Invoice" else "Receipt"
+
+
+def on_insert(doc, method=None):
+    """doc_events after_insert for Trip Invoice / Trip Receipt"""
+    apply_rollup_deltas(get_rollup_deltas(get_source(doc), doc))
+
+
+def on_update(doc, method=None):
+    """doc_events on_update: move the document between buckets if it changed"""
+    before = doc.get_doc_before_save()
+    if not before:
+        # new document, counted by after_insert
+        return
+
+    source = get_source(doc)
+    tracked = INVOICE_TRACKED_FIELDS if source == "Invoice" else RECEIPT_TRACKED_FIELDS
+    if all(before.get(field) == doc.get(field) for field in tracked):
+        return
+
+    apply_rollup_deltas(get_rollup_deltas(source, before, -1) + get_rollup_deltas(source, doc))
+
+
+def on_trash(doc, method=None):
+    """doc_events on_trash"""
+    apply_rollup_deltas(get_rollup_deltas(get_source(doc), doc, -1))
+
+
+def rebuild_rollups():
+    """Recompute every rollup row from Trip Invoice and Trip Receipt, archives included."""
+    from taxiye_eims_integration.utils.archive import get_rows_with_archive
+
+    frappe.db.sql("delete from `tabTrip Stats Rollup`")  # type: ignore
+
+    # formatted like str(datetime) so the sha1 names match get_rollup_name
+    bucket_expressions = {
+        "Hour": "date_format({moment}, '%%Y-%%m-%%d %%H:00:00')",
+        "Day": "date_format({moment}, '%%Y-%%m-%%d 00:00:00')",
+    }
+    sources = (
+        (
+            "Invoice",
+            "Trip Invoice",
+            "timestamp(`date`, coalesce(`time`, '00:00:00'))",
+            "taxi_provider_tin",
+            "coalesce(document_type, 'INV')",
+        ),
+        ("Receipt", "Trip Receipt", "creation", "null", "null"),
+    )
+    source_columns = {
+        "Invoice": ("date", "time", "taxi_provider_tin", "status", "document_type", *AMOUNT_FIELDS),
+        "Receipt": ("creation", "status", *AMOUNT_FIELDS),
+    }
+    now = now_datetime()
+    user = frappe.session.user  # type: ignore
+
+    for bucket_type, expression in bucket_expressions.items():
+        for source, doctype, moment, tin, document_type in sources:
+            bucket = expression.format(moment=moment)
+            # archived rows were counted when they were inserted; keep them
+            rows = get_rows_with_archive(doctype, source_columns[source])
+            frappe.db.sql(  # type: ignore
+                f"""
+                insert into `tabTrip Stats Rollup`
+                    (name, creation, modified, owner, modified_by,
+                    bucket_type, bucket_start, source, taxi_provider_tin, status, document_type,
+                    record_count, base_fare, commission_amount, amount, tax, total_payment)
+                select
+                    sha1(concat_ws('|', %(bucket_type)s, {bucket}, %(source)s, coalesce({tin}, ''),
+                        coalesce(status, ''), coalesce({document_type}, ''))),
+                    %(now)s, %(now)s, %(user)s, %(user)s,
+                    %(bucket_type)s, {bucket}, %(source)s, {tin}, status, {document_type},
+                    count(*),
+                    coalesce(sum(base_fare), 0),
+                    coalesce(sum(commission_amount), 0),
+                    coalesce(sum(amount), 0),
+                    coalesce(sum(tax), 0),
+                    coalesce(sum(total_payment), 0)
+                from {rows} source_rows
+                group by {bucket}, {tin}, status, {document_type}
+                """,
+                {"bucket_type": bucket_type, "source": source, "now": now, "user": user},
+            )
+    frappe.db.commit()  # type: ignore
@@ -0,0 +1,98 @@
+import time
+import frappe
+from taxiye_eims_integration.utils.normalization import normalize_settings_tin, prefixed_settings_phone
+from taxiye_eims_integration.utils.serialization import dumps, loads, payload_hash
+from taxiye_eims_integration.utils.settings import VERSION_CHECK_SECONDS, get_version, load_settings, site_key
+
+# The SellerDetails block of the invoice body, built once per settings change.
+#
+# Invoices used to send get_driver_details() whole, API credentials and base
+# URL included, decrypting every Password field each time. The block holds
+# the seller fields in the EIMS shape only; the values receipts need besides
+# (seller TIN, system number) are kept next to it and never go into the
+# invoice body. Both are stored in Redis per site with the settings version
+# they were built from and a hash of their content: the first worker to see
+# a new version rebuilds them, the others take them from Redis without
+# decrypting anything. A rebuild that hashes the same (e.g. only the client
+# secret changed) keeps the block workers already hold.
+
+REDIS_KEY_SELLER_DETAILS = "eims:{}:seller_details"
+
+DEFAULT_TIN = "0079140416"
+
+# site -> {"version", "hash", "details", "receipt", "checked_at"}
+_blocks = {}
+
+
+def build_seller_details(settings):
+    """SellerDetails from EIMS Settings (Password fields decrypted)."""
+    return {
+        "City": settings.city or None,
+        "Email": settings.email,
+        "LegalName": settings.legalname,
+        "Locality": settings.locality,
+        "Phone": prefixed_settings_phone(settings.phone),
+        "Region": settings.region,
+        "SubCity": settings.subcity,
+        "Wereda": settings.woreda,
+        "Tin": normalize_settings_tin(settings.tin) or DEFAULT_TIN,
+        "VatNumber": settings.vatnumber or None,
+    }
+
+
+def build_receipt_seller(settings):
+    """Seller values of the receipt body, which are not part of SellerDetails."""
+    return {
+        "seller_tin": normalize_settings_tin(settings.seller_tin) or DEFAULT_TIN,
+        "systemnumber": settings.systemnumber or None,
+    }
+
+
+def load_block(version, current=None):
+    cache = frappe.cache()  # type: ignore
+    key = cache.make_key(site_key(REDIS_KEY_SELLER_DETAILS))
+    raw = cache.get(key)
+    shared = loads(raw) if raw else None
+
+    if not shared or shared["version"] != version:
+        # read from the database, not the settings snapshot: that one may
+        # still hold the previous version for a few seconds
+        settings = load_settings()
+        details, receipt = build_seller_details(settings), build_receipt_seller(settings)
+        shared = {
+            "version": version,
+            "hash": payload_hash({"details": details, "receipt": receipt}),
+            "details": details,
+            "receipt": receipt,
+        }
+        cache.set(key, dumps(shared))
+
+    if current and current["hash"] == shared["hash"]:
+        shared["details"], shared["receipt"] = current["details"], current["receipt"]
+    return shared
+
+
+def get_block():
+    site = frappe.local.site  # type: ignore
+    block = _blocks.get(site)
+    now = time.monotonic()
+
+    if block and now - block["checked_at"] < VERSION_CHECK_SECONDS:
+        return block
+
+    version = int(get_version() or 0)
+    if not block or block["version"] != version:
+        block = load_block(version, block)
+        _blocks[site] = block
+    block["checked_at"] = now
+    return block
+
+
+def get_seller_details():
+    """SellerDetails of the current site; treat as read-only, it is shared."""
+    return get_block()["details"]
+
+
+def get_receipt_seller():
+    """Seller TIN and system number for receipts; treat as read-only, it is shared."""
+    return get_block()["receipt"]
@@ -0,0 +1,160 @@
+import frappe
+from taxiye_eims_integration.utils.submission_journal import get_entry, iter_acknowledged
+
+# Consistency checks and repair of the Trip Invoice chain.
+#
+# find_sequence_issues() reads the chain once, ordered by document number,
+# and compares every row with the one before it (LAG) to list gaps,
+# duplicate numbers, counters out of step, rows created out of order, broken
+# previous_irn links and the placeholders written on resync.
+# repair_placeholders() fills placeholders, a batch at a time, from the
+# acknowledgements still in the submission journal: the placeholder stands
+# for an invoice EIMS accepted but whose save was lost.
+
+REPAIR_BATCH_SIZE = 500
+DEFAULT_ISSUE_LIMIT = 1000
+
+ISSUE_TYPES = ("gaps", "duplicates", "counter_mismatches", "out_of_order", "broken_links", "placeholders")
+
+
+def find_sequence_issues(from_number=None, to_number=None, limit=DEFAULT_ISSUE_LIMIT):
+    """List chain issues between two document numbers in a single pass."""
+    conditions = []
+    if from_number:
+        conditions.append("document_number >= %(from_number)s")
+    if to_number:
+        conditions.append("document_number <= %(to_number)s")
+
+    rows = frappe.db.sql(  # type: ignore
+        f"""
+        select * from (
+            select
+                name, document_number, invoice_counter, irn, previous_irn, creation,
+                lag(document_number) over by_number as previous_number,
+                lag(invoice_counter) over by_number as previous_counter,
+                lag(irn) over by_number as previous_row_irn,
+                lag(document_number) over by_creation as number_created_before
+            from `tabTrip Invoice`
+            where document_number > 0 {"and " + " and ".join(conditions) if conditions else ""}
+            window
+                by_number as (order by document_number, creation),
+                by_creation as (order by creation, name)
+        ) chain
+        where ifnull(irn, '') = ''
+            or document_number - previous_number != 1
+            or invoice_counter - previous_counter != 1
+            or document_number < number_created_before
+            or (ifnull(previous_row_irn, '') != '' and ifnull(previous_irn, '') != previous_row_irn)
+        order by document_number, creation
+        limit %(limit)s
+        """,
+        {"from_number": from_number, "to_number": to_number, "limit": int(limit)},
+        as_dict=True,
+    )
+
+    issues = {issue_type: [] for issue_type in ISSUE_TYPES}
+    for row in rows:
+        if not row.irn:
+            issues["placeholders"].append({"name": row.name, "document_number": row.document_number})
+        if row.previous_number is None:
+            # first row of the range: nothing to compare with
+            continue
+
+        step = row.document_number - row.previous_number
+        if step > 1:
+            issues["gaps"].append({"from": row.previous_number + 1, "to": row.document_number - 1})
+        elif step == 0:
+            issues["duplicates"].append({"name": row.name, "document_number": row.document_number})
+        if step >= 1 and row.invoice_counter - row.previous_counter != 1:
+            issues["counter_mismatches"].append(
+                {"name": row.name, "document_number": row.document_number, "invoice_counter": row.invoice_counter}
+            )
+        if row.number_created_before is not None and row.document_number < row.number_created_before:
+            issues["out_of_order"].append(
+                {"name": row.name, "document_number": row.document_number, "creation": row.creation}
+            )
+        if step == 1 and row.previous_row_irn and (row.previous_irn or "") != row.previous_row_irn:
+            issues["broken_links"].append(
+                {"name": row.name, "document_number": row.document_number, "previous_irn": row.previous_irn}
+            )
+
+    issues["truncated"] = len(rows) >= int(limit)
+    return issues
+
+
+def get_placeholder_batch(after_number, batch_size):
+    return frappe.get_all(  # type: ignore
+        "Trip Invoice",
+        filters={"irn": ["in", ["", None]], "document_number": [">", after_number]},
+        fields=["name", "document_number"],
+        order_by="document_number asc",
+        limit_page_length=batch_size,
+    )
+
+
+def index_acknowledgements():
+    """{document number: journal key} of the register acks still in the journal."""
+    index = {}
+    for key, entry in iter_acknowledged("register"):
+        # newest first: a number acknowledged twice keeps its latest ack
+        index.setdefault(int(entry["sequence"].get("DocumentDetails.DocumentNumber") or 0), key)
+    return index
+
+
+def repair_placeholders(batch_size=REPAIR_BATCH_SIZE, echo=print):
+    """Fill placeholders from journaled acknowledgements, committing per batch.
+
+    A filled placeholder gets the IRN, signatures and previous IRN EIMS
+    acknowledged, and the invoice after it is linked to that IRN. Trip
+    details are not journaled, so amounts stay as they were. Returns the
+    counts and the numbers no acknowledgement was found for.
+    """
+    from taxiye_eims_integration.api.invoice import get_acknowledged_last_doc
+    from taxiye_eims_integration.utils.auth import parse_ack_date
+
+    filled, linked, unmatched = 0, 0, []
+    after_number = 0
+    # one walk over the journal for all batches; only keys are kept in memory
+    index = index_acknowledgements() if get_placeholder_batch(0, 1) else {}
+
+    while True:
+        placeholders = get_placeholder_batch(after_number, int(batch_size))
+        if not placeholders:
+            break
+        after_number = placeholders[-1].document_number
+
+        updates, irns = {}, {}
+        for row in placeholders:
+            key = index.get(row.document_number)
+            entry = get_entry(key) if key else None
+            body = (entry or {}).get("response", {}).get("body") or {}
+            if not body.get("irn"):
+                unmatched.append(row.document_number)
+                continue
+            updates[row.name] = {
+                "irn": body["irn"],
+                "signed_qr": body.get("signedQR"),
+                "signed_invoice": body.get("signedInvoice"),
+                "acknowledged_date": parse_ack_date(body.get("acknowledged_date")),
+                "previous_irn": get_acknowledged_last_doc(entry["sequence"]).irn,
+                "description": "Placeholder filled from the EIMS acknowledgement; trip details were not saved.",
+            }
+            irns[row.document_number + 1] = body["irn"]
+
+        # the invoices chained to the placeholders' empty IRNs
+        for successor in frappe.get_all(  # type: ignore
+            "Trip Invoice",
+            filters={"document_number": ["in", list(irns)], "previous_irn": ["in", ["", None]]},
+            fields=["name", "document_number"],
+            limit_page_length=0,
+        ) if irns else []:
+            updates.setdefault(successor.name, {})["previous_irn"] = irns[successor.document_number]
+            linked += 1
+
+        if updates:
+            frappe.db.bulk_update("Trip Invoice", updates)  # type: ignore
+        frappe.db.commit()  # type: ignore
+        filled += len(irns)
+        echo(f"up to document number {after_number}: {filled} placeholders filled, {len(unmatched)} unmatched")
+
+    return {"filled": filled, "linked": linked, "unmatched": unmatched}
@@ -0,0 +1,74 @@
+import hashlib
+import json
+
+# JSON encoding for EIMS traffic and the whitelisted endpoints. orjson is used
+# when installed (pip install orjson), the stdlib otherwise. Both write sorted
+# keys, compact separators, UTF-8 and str() for anything else such as dates
+# and Decimals, but the bytes are not always identical: floats in exponent
+# form differ (1e-07 / 1e-7) and only the stdlib takes non-str keys of mixed
+# types once they are made str first. Hashes used to compare payloads
+# (payload_hash) therefore always go through canonical_dumps, which is the
+# stdlib encoder whatever is installed.
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+if orjson:
+    # datetimes go through default=str like with the stdlib, not orjson's ISO "T" form
+    _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(obj):
+    """Encode obj to canonical JSON bytes."""
+    if orjson:
+        return orjson.dumps(obj, default=str, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=str, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def canonical_key(key):
+    # what json.dumps makes of a non-str key (1 -> "1", True -> "true")
+    return key if isinstance(key, str) else json.dumps(key, default=str).strip('"')
+
+
+def canonical_keys(obj):
+    if isinstance(obj, dict):
+        return {canonical_key(key): canonical_keys(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [canonical_keys(value) for value in obj]
+    return obj
+
+
+def canonical_dumps(obj):
+    """Encode obj to backend independent JSON bytes, for hashing."""
+    return json.dumps(
+        canonical_keys(obj), default=str, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    ).encode()
+
+
+def loads(data):
+    """Decode JSON from bytes or str."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def payload_hash(obj):
+    """Stable content hash of a payload, for dedup and audit."""
+    return hash_bytes(canonical_dumps(obj))
+
+
+def encode_payload(obj):
+    """Encode a request body once; returns (bytes, hash of those bytes).
+
+    The hash identifies the bytes sent; compare payloads with payload_hash.
+    """
+    data = dumps(obj)
+    return data, hash_bytes(data)
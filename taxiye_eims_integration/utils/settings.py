@@ -0,0 +1,81 @@
+import time
+import frappe
+from frappe import _  # type: ignore
+from frappe.utils.password import get_decrypted_password  # type: ignore
+
+# Snapshot of EIMS Settings, loaded once per worker and site.
+#
+# Building an invoice used to read the Single and decrypt every Password
+# field again (one query each). The snapshot keeps the decrypted values in
+# process memory, keyed by site, so a job worker hopping between the sites of
+# a bench pays for a dict lookup. Saving EIMS Settings bumps a per-site
+# version in Redis; other workers compare against it at most every
+# VERSION_CHECK_SECONDS and reload when it moved.
+
+REDIS_KEY_VERSION = "eims:{}:settings_version"
+
+VERSION_CHECK_SECONDS = 5
+
+PASSWORD_FIELDS = ("tin", "seller_tin", "vatnumber", "systemnumber", "client_id", "client_secret", "api_key")
+DEFAULT_BASE_URL = "http://core.mor.gov.et"
+
+# site -> snapshot
+_snapshots = {}
+
+
+def site_key(key):
+    """Namespace a Redis key template ("eims:{}:...") with the current site."""
+    return key.format(frappe.local.site)  # type: ignore
+
+
+def get_version():
+    cache = frappe.cache()  # type: ignore
+    return cache.get(cache.make_key(site_key(REDIS_KEY_VERSION)))
+
+
+def load_settings():
+    try:
+        settings = frappe.get_single("EIMS Settings")  # type: ignore
+    except frappe.DoesNotExistError:  # type: ignore
+        frappe.throw(  # type: ignore
+            _("EIMS Settings are not configured. Please go to 'EIMS Settings' and save your credentials before submitting an invoice."),
+            title="Configuration Missing",
+        )
+
+    values = frappe._dict(settings.as_dict(no_default_fields=True))  # type: ignore
+    for field in PASSWORD_FIELDS:
+        values[field] = get_decrypted_password("EIMS Settings", "EIMS Settings", field, raise_exception=False)
+    values.mor_base_url = (values.mor_base_url or DEFAULT_BASE_URL).rstrip("/")
+    return values
+
+
+def get_settings():
+    """EIMS Settings of the current site with Password fields decrypted."""
+    site = frappe.local.site  # type: ignore
+    snapshot = _snapshots.get(site)
+    now = time.monotonic()
+
+    if snapshot and now - snapshot["checked_at"] < VERSION_CHECK_SECONDS:
+        return snapshot["values"]
+
+    version = get_version()
+    if not snapshot or snapshot["version"] != version:
+        snapshot = {"version": version, "values": load_settings()}
+        _snapshots[site] = snapshot
+    snapshot["checked_at"] = now
+    return snapshot["values"]
+
+
+def bump_version():
+    cache = frappe.cache()  # type: ignore
+    cache.incr(cache.make_key(site_key(REDIS_KEY_VERSION)))
+    _snapshots.pop(frappe.local.site, None)  # type: ignore
+
+
+def invalidate_settings():
+    """Make every worker reload the snapshot of the current site.
+
+    The version moves once the save is committed; bumped any earlier, a
+    worker could reload the old values and keep them under the new version.
+    """
+    frappe.db.after_commit.add(bump_version)  # type: ignore
@@ -0,0 +1,143 @@
+import time
+import frappe
+from frappe.utils.background_jobs import get_redis_conn  # type: ignore
+from taxiye_eims_integration.utils.serialization import dumps, loads, payload_hash
+from taxiye_eims_integration.utils.settings import site_key
+
+# Journal of EIMS register / receipt submissions. Each prepared request is
+# recorded before it is sent and its acknowledgement right after, keyed by
+# the hash of the request without its sequence fields plus the trip (or
+# receipt) it is for, so a retry of the same trip or receipt finds the
+# earlier acknowledgement whatever numbers it was sent with. Entries expire
+# after JOURNAL_TTL_SECONDS; the append-only stream of state changes is
+# trimmed to about JOURNAL_STREAM_MAXLEN entries.
+#
+# The journal lives in the queue Redis, not in redis_cache: the cache is not
+# persisted and evicts keys when full, the queue instance does neither. It
+# stays outside the database on purpose, since the callers commit at
+# different points and an acknowledgement must be kept even when the
+# transaction around it is rolled back. That connection does not prefix
+# keys, so they carry the site.
+
+REDIS_KEY_ENTRY = "eims:{}:submission_journal:{}"
+REDIS_KEY_STREAM = "eims:{}:submission_journal"
+
+JOURNAL_TTL_SECONDS = 7 * 24 * 60 * 60
+JOURNAL_STREAM_MAXLEN = 100000
+
+# fields a retry may change, per EIMS path; they are kept apart from the key
+SEQUENCE_FIELDS = {
+    "register": (
+        ("DocumentDetails", "DocumentNumber"),
+        ("SourceSystem", "InvoiceCounter"),
+        ("ReferenceDetails", "PreviousIrn"),
+    ),
+    "receipt/sales": (
+        ("ReceiptCounter",),
+        ("ManualReceiptNumber",),
+    ),
+}
+
+
+def split_sequence(path, body):
+    """Return (body without sequence fields, {dotted field: value})."""
+    stripped = dict(body)
+    sequence = {}
+    for field_path in SEQUENCE_FIELDS.get(path, ()):
+        *parents, field = field_path
+        container = stripped
+        for parent in parents:
+            # copy each level on the way down; the caller's body is left alone
+            container[parent] = dict(container.get(parent) or {})
+            container = container[parent]
+        sequence[".".join(field_path)] = container.pop(field, None)
+    return stripped, sequence
+
+
+def journal_key(path, body, reference=None):
+    """Key of a request: the hash of its body without sequence fields and of `reference`.
+
+    `reference` (the trip_id of an invoice) keeps apart requests whose
+    bodies are otherwise identical, e.g. two trips of the same rider with
+    the same amounts on the same date and a 00:00:00 time.
+    """
+    stripped, _sequence = split_sequence(path, body)
+    return payload_hash({"path": path, "reference": reference, "body": stripped})
+
+
+def get_entry_key(key):
+    return REDIS_KEY_ENTRY.format(frappe.local.site, key)  # type: ignore
+
+
+def get_entry(key):
+    raw = get_redis_conn().get(get_entry_key(key))
+    return loads(raw) if raw else None
+
+
+def get_acknowledgement(key):
+    """The acknowledged entry for a journal key, or None."""
+    entry = get_entry(key)
+    return entry if entry and entry.get("state") == "acked" else None
+
+
+def write_entry(key, entry):
+    pipeline = get_redis_conn().pipeline()
+    pipeline.set(get_entry_key(key), dumps(entry), ex=JOURNAL_TTL_SECONDS)
+    pipeline.xadd(
+        site_key(REDIS_KEY_STREAM),
+        {"key": key, "path": entry["path"], "state": entry["state"]},
+        maxlen=JOURNAL_STREAM_MAXLEN,
+        approximate=True,
+    )
+    pipeline.execute()
+
+
+def record_sent(key, path, body):
+    """Journal a prepared request before it is sent."""
+    _stripped, sequence = split_sequence(path, body)
+    write_entry(key, {"path": path, "state": "sent", "sequence": sequence, "sent_at": time.time()})
+
+
+def record_ack(key, path, body, response):
+    """Journal the acknowledgement EIMS returned for a request."""
+    _stripped, sequence = split_sequence(path, body)
+    write_entry(
+        key,
+        {"path": path, "state": "acked", "sequence": sequence, "response": response, "acked_at": time.time()},
+    )
+
+
+def iter_acknowledged(path, batch_size=1000):
+    """Yield (key, entry) of acknowledged entries of a path, newest first.
+
+    Walks the state stream, so only entries still within its length are
+    seen; entries whose key expired are skipped.
+    """
+    connection = get_redis_conn()
+    stream = site_key(REDIS_KEY_STREAM)
+    seen = set()
+    last_id = "+"
+
+    while True:
+        events = connection.xrevrange(stream, max=last_id, count=batch_size + 1)
+        if last_id != "+":
+            # max is inclusive: the first event was the last one of the previous batch
+            events = events[1:]
+        if not events:
+            return
+
+        keys = []
+        for _event_id, fields in events:
+            key = fields.get(b"key", b"").decode()
+            if fields.get(b"state") == b"acked" and fields.get(b"path", b"").decode() == path and key not in seen:
+                seen.add(key)
+                keys.append(key)
+
+        pipeline = connection.pipeline()
+        for key in keys:
+            pipeline.get(get_entry_key(key))
+        for key, raw in zip(keys, pipeline.execute()):
+            if raw:
+                yield key, loads(raw)
+
+        last_id = events[-1][0]
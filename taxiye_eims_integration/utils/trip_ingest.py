@@ -0,0 +1,164 @@
+import json
+import frappe
+from frappe.utils import now_datetime  # type: ignore
+from frappe.utils.password import get_decrypted_password  # type: ignore
+from taxiye_eims_integration.utils.archive import get_archived_values
+from taxiye_eims_integration.utils.eims_outbox import PRIORITY_BACKGROUND, enqueue_submission
+
+# Pull path for trips the push endpoint (create_invoice) never received.
+# Trips are read page by page from a cursor-paged source, checked against
+# existing invoices, and queued on the EIMS outbox which submits them in
+# bounded batches. The cursor is checkpointed after every page.
+
+HTTP_TIMEOUT_SECONDS = 30
+
+
+class HTTPTripSource:
+    """Pages through `GET <url>?cursor=<cursor>&limit=<n>`.
+
+    The endpoint returns `{"trips": [...], "next_cursor": "..."}`; a missing
+    or empty next_cursor means there are no more pages.
+    """
+
+    def __init__(self, url, token=None, page_size=100):
+        self.url = url
+        self.token = token
+        self.page_size = page_size
+
+    def fetch_page(self, cursor):
+        import requests
+
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        params = {"limit": self.page_size}
+        if cursor:
+            params["cursor"] = cursor
+
+        response = requests.get(self.url, params=params, headers=headers, timeout=HTTP_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        data = response.json()
+        return data.get("trips") or [], data.get("next_cursor") or None
+
+
+class FileTripSource:
+    """Pages through a JSON Lines file; the cursor is the byte offset."""
+
+    def __init__(self, path, page_size=100):
+        self.path = path
+        self.page_size = page_size
+
+    def fetch_page(self, cursor):
+        trips = []
+        with open(self.path, "rb") as f:
+            f.seek(int(cursor or 0))
+            while len(trips) < self.page_size:
+                line = f.readline()
+                if not line:
+                    # end of file: keep the offset so appended trips are picked up next run
+                    return trips, str(f.tell()) if trips else None
+                if line.strip():
+                    trips.append(json.loads(line))
+            return trips, str(f.tell())
+
+
+def get_trip_source(settings):
+    page_size = settings.page_size or 100
+    if settings.source_type == "File":
+        if not settings.file_path:
+            frappe.throw("Trip Ingest Settings: File Path is required for a File source")  # type: ignore
+        return FileTripSource(settings.file_path, page_size)
+
+    if not settings.source_url:
+        frappe.throw("Trip Ingest Settings: Source URL is required for an HTTP source")  # type: ignore
+    token = get_decrypted_password("Trip Ingest Settings", "Trip Ingest Settings", "api_token", raise_exception=False)
+    return HTTPTripSource(settings.source_url, token, page_size)
+
+
+def get_known_trip_ids(trip_ids):
+    """Return the subset of `trip_ids` already invoiced or queued for submission.
+
+    One indexed IN lookup per page on Trip Invoice.trip_id (hot and
+    archived) and EIMS Outbox.reference_id, instead of a query per trip.
+    """
+    if not trip_ids:
+        return set()
+
+    invoiced = frappe.get_all(  # type: ignore
+        "Trip Invoice", filters={"trip_id": ["in", trip_ids]}, pluck="trip_id"
+    )
+    queued = frappe.get_all(  # type: ignore
+        "EIMS Outbox",
+        filters={
+            "submission_type": "Invoice",
+            "reference_id": ["in", trip_ids],
+            "status": ["!=", "Failed"],
+        },
+        pluck="reference_id",
+    )
+    archived = get_archived_values("Trip Invoice", "trip_id", trip_ids)
+    return set(invoiced) | set(queued) | set(archived)
+
+
+def filter_new_trips(trips):
+    """Drop trips without an id, duplicates within the page, and known trips."""
+    page_ids = sorted({str(trip["trip_id"]) for trip in trips if trip.get("trip_id")})
+    known = get_known_trip_ids(page_ids)
+
+    new_trips = []
+    seen = set(known)
+    for trip in trips:
+        trip_id = str(trip.get("trip_id") or "")
+        if not trip_id or trip_id in seen:
+            continue
+        seen.add(trip_id)
+        new_trips.append(trip)
+    return new_trips
+
+
+def queue_trips(trips):
+    """Validate trips and queue them for invoice submission. Returns the count queued."""
+    from taxiye_eims_integration.api.schemas import InvoicePayload
+    from pydantic import ValidationError
+
+    queued = 0
+    for trip in trips:
+        try:
+            validated = InvoicePayload(**trip)
+        except ValidationError as e:
+            frappe.log_error(f"Trip ingest: invalid trip {trip.get('trip_id')}", str(e))  # type: ignore
+            continue
+
+        enqueue_submission(
+            "Invoice",
+            validated.model_dump(),
+            reference_id=validated.trip_id,
+            priority=PRIORITY_BACKGROUND,
+        )
+        queued += 1
+    return queued
+
+
+def ingest_trips():
+    """Scheduler entry point: pull missed trips until the source or the run budget is exhausted."""
+    settings = frappe.get_single("Trip Ingest Settings")  # type: ignore
+    if not settings.enabled:
+        return
+
+    source = get_trip_source(settings)
+    budget = settings.max_trips_per_run or 500
+    cursor = settings.cursor or None
+    queued = 0
+
+    while queued < budget:
+        trips, next_cursor = source.fetch_page(cursor)
+        queued += queue_trips(filter_new_trips(trips))
+
+        if next_cursor:
+            # checkpoint only after the page is queued: a crash replays the
+            # page and the dedup check skips what was already queued
+            cursor = next_cursor
+            settings.db_set("cursor", cursor, commit=True)
+        if not next_cursor or not trips:
+            break
+
+    settings.db_set("last_run", now_datetime(), commit=True)
+    return queued
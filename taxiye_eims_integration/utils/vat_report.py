@@ -0,0 +1,208 @@
+import frappe
+from frappe.utils import add_days, get_first_day, get_last_day, getdate, now_datetime, today  # type: ignore
+
+# VAT totals per trip day and provider TIN, stored in VAT Daily Summary.
+#
+# update_vat_summaries() recomputes only the days since the last run, a chunk
+# of days per statement, with one set-based INSERT ... SELECT over Trip
+# Invoice joined to its receipts, archived ones included. Credit notes (CRE) are subtracted, so the
+# totals are what is owed for the day. The last RECOMPUTE_DAYS are redone
+# every run because receipts, retried registrations and credit notes keep
+# arriving after the day is over. The monthly report reads the summaries
+# only; the invoices still missing a receipt are listed with an anti-join.
+
+CREDIT_NOTE = "CRE"
+CHUNK_DAYS = 7
+RECOMPUTE_DAYS = 3
+MAX_UNRECEIPTED_PAGE = 1000
+
+SUMMARY_FIELDS = [
+    "summary_date",
+    "taxi_provider_tin",
+    "invoice_count",
+    "credit_note_count",
+    "amount",
+    "tax",
+    "total_payment",
+    "receipt_count",
+    "invoices_without_receipt",
+    "receipt_tax",
+    "receipt_total_payment",
+]
+TOTAL_FIELDS = SUMMARY_FIELDS[2:]
+
+INVOICE_COLUMNS = ("name", "date", "taxi_provider_tin", "document_type", "status", "irn", "amount", "tax", "total_payment")
+RECEIPT_COLUMNS = ("name", "invoice_id", "status", "tax", "total_payment")
+
+
+def summarize_days(from_date, to_date):
+    """Replace the summaries of a date range (inclusive) in one statement."""
+    from taxiye_eims_integration.utils.archive import get_archive_cutoff, get_rows_with_archive
+
+    invoices, receipts = "`tabTrip Invoice`", "`tabTrip Receipt`"
+    # a trip is archived months after its date: recent days only read the hot tables
+    if getdate(from_date) <= getdate(get_archive_cutoff()):
+        invoices = get_rows_with_archive("Trip Invoice", INVOICE_COLUMNS)
+        receipts = get_rows_with_archive("Trip Receipt", RECEIPT_COLUMNS)
+
+    frappe.db.sql(  # type: ignore
+        "delete from `tabVAT Daily Summary` where summary_date between %s and %s", (from_date, to_date)
+    )
+
+    now = now_datetime()
+    user = frappe.session.user  # type: ignore
+    frappe.db.sql(  # type: ignore
+        f"""
+        insert into `tabVAT Daily Summary`
+            (name, creation, modified, owner, modified_by,
+            summary_date, taxi_provider_tin, invoice_count, credit_note_count,
+            amount, tax, total_payment,
+            receipt_count, invoices_without_receipt, receipt_tax, receipt_total_payment)
+        select
+            sha1(concat(inv.`date`, '|', coalesce(inv.taxi_provider_tin, ''))),
+            %(now)s, %(now)s, %(user)s, %(user)s,
+            inv.`date`,
+            inv.taxi_provider_tin,
+            sum(ifnull(inv.document_type, 'INV') != %(credit_note)s),
+            sum(ifnull(inv.document_type, 'INV') = %(credit_note)s),
+            sum(if(inv.document_type = %(credit_note)s, -1, 1) * ifnull(inv.amount, 0)),
+            sum(if(inv.document_type = %(credit_note)s, -1, 1) * ifnull(inv.tax, 0)),
+            sum(if(inv.document_type = %(credit_note)s, -1, 1) * ifnull(inv.total_payment, 0)),
+            sum(ifnull(receipts.receipt_count, 0)),
+            sum(ifnull(inv.document_type, 'INV') != %(credit_note)s and receipts.invoice_id is null),
+            sum(ifnull(receipts.tax, 0)),
+            sum(ifnull(receipts.total_payment, 0))
+        from {invoices} inv
+        left join (
+            select
+                receipt.invoice_id,
+                count(*) as receipt_count,
+                sum(ifnull(receipt.tax, 0)) as tax,
+                sum(ifnull(receipt.total_payment, 0)) as total_payment
+            from {receipts} receipt
+            join {invoices} invoice on invoice.name = receipt.invoice_id
+            where invoice.`date` between %(from_date)s and %(to_date)s
+                and receipt.status = 'Acknowledged'
+            group by receipt.invoice_id
+        ) receipts on receipts.invoice_id = inv.name
+        where inv.`date` between %(from_date)s and %(to_date)s
+            and inv.status = 'Completed'
+            and ifnull(inv.irn, '') != ''
+        group by inv.`date`, inv.taxi_provider_tin
+        """,
+        {
+            "now": now,
+            "user": user,
+            "credit_note": CREDIT_NOTE,
+            "from_date": from_date,
+            "to_date": to_date,
+        },
+    )
+
+
+def get_first_pending_day():
+    last = frappe.db.sql("select max(summary_date) from `tabVAT Daily Summary`")[0][0]  # type: ignore
+    if last:
+        return add_days(last, -RECOMPUTE_DAYS + 1)
+    first = frappe.db.sql(  # type: ignore
+        "select min(`date`) from `tabTrip Invoice` where status = 'Completed'"
+    )[0][0]
+    return getdate(first) if first else None
+
+
+def update_vat_summaries(from_date=None, to_date=None):
+    """Scheduler entry point: summarize the days since the last run, up to yesterday.
+
+    Pass a range to rebuild it, e.g. after a correction; archived days are
+    rebuilt from the archive tables.
+    """
+    from_date = getdate(from_date) if from_date else get_first_pending_day()
+    to_date = getdate(to_date) if to_date else getdate(add_days(today(), -1))
+    if not from_date or from_date > to_date:
+        return 0
+
+    days = 0
+    chunk_start = from_date
+    while chunk_start <= to_date:
+        chunk_end = min(getdate(add_days(chunk_start, CHUNK_DAYS - 1)), to_date)
+        summarize_days(chunk_start, chunk_end)
+        # one transaction per chunk keeps row locks short
+        frappe.db.commit()  # type: ignore
+        days += (chunk_end - chunk_start).days + 1
+        chunk_start = getdate(add_days(chunk_end, 1))
+    return days
+
+
+def get_month_range(month):
+    """First and last day of a month given as YYYY-MM (default: the previous month)."""
+    first = getdate(f"{month}-01") if month else get_first_day(add_days(get_first_day(today()), -1))
+    return first, get_last_day(first)
+
+
+def get_monthly_report(month=None, taxi_provider_tin=None):
+    """VAT totals of a month per provider and per day, from the summaries only."""
+    from_date, to_date = get_month_range(month)
+    filters = {"summary_date": ["between", [from_date, to_date]]}
+    if taxi_provider_tin:
+        filters["taxi_provider_tin"] = taxi_provider_tin
+
+    rows = frappe.get_all(  # type: ignore
+        "VAT Daily Summary",
+        filters=filters,
+        fields=SUMMARY_FIELDS,
+        order_by="summary_date asc",
+        limit_page_length=0,
+    )
+
+    def add(totals, row):
+        for field in TOTAL_FIELDS:
+            totals[field] = totals.get(field, 0) + (row[field] or 0)
+
+    total, providers, days = {}, {}, {}
+    for row in rows:
+        add(total, row)
+        add(providers.setdefault(row.taxi_provider_tin or "", {}), row)
+        add(days.setdefault(str(row.summary_date), {}), row)
+
+    return {
+        "from_date": from_date,
+        "to_date": to_date,
+        "total": total,
+        "providers": [{"taxi_provider_tin": tin, **totals} for tin, totals in sorted(providers.items())],
+        "days": [{"date": day, **totals} for day, totals in days.items()],
+        # the summaries lag by a day; this says how far they reach
+        "summarized_until": frappe.db.sql("select max(summary_date) from `tabVAT Daily Summary`")[0][0],  # type: ignore
+    }
+
+
+def get_invoices_without_receipts(from_date, to_date, taxi_provider_tin=None, start=0, page_length=100):
+    """Registered invoices of a date range with no acknowledged receipt (anti-join)."""
+    conditions = ""
+    if taxi_provider_tin:
+        conditions = "and inv.taxi_provider_tin = %(taxi_provider_tin)s"
+
+    return frappe.db.sql(  # type: ignore
+        f"""
+        select inv.name, inv.irn, inv.`date`, inv.taxi_provider_tin, inv.tax, inv.total_payment
+        from `tabTrip Invoice` inv
+        left join `tabTrip Receipt` receipt
+            on receipt.invoice_id = inv.name and receipt.status = 'Acknowledged'
+        where inv.`date` between %(from_date)s and %(to_date)s
+            and inv.status = 'Completed'
+            and ifnull(inv.irn, '') != ''
+            and ifnull(inv.document_type, 'INV') != %(credit_note)s
+            and receipt.name is null
+            {conditions}
+        order by inv.`date`, inv.name
+        limit %(start)s, %(page_length)s
+        """,
+        {
+            "from_date": getdate(from_date),
+            "to_date": getdate(to_date),
+            "taxi_provider_tin": taxi_provider_tin,
+            "credit_note": CREDIT_NOTE,
+            "start": int(start),
+            "page_length": min(int(page_length), MAX_UNRECEIPTED_PAGE),
+        },
+        as_dict=True,
+    )
@@ -0,0 +1,163 @@
+import hashlib
+import json
+from functools import lru_cache
+import frappe
+from taxiye_eims_integration.utils.settings import get_settings
+
+# Offline verification of EIMS signatures (signedQR / signedInvoice are JWS
+# compact tokens). The MoR public key set (JWKS) is cached in Redis and
+# refreshed hourly by the scheduler; each worker parses it once per version
+# and keeps an LRU of recent verification results, so checks never call MoR.
+# The JWKS is read from the Public Keys URL of EIMS Settings (site config
+# eims_public_keys_url overrides it); failed refreshes go to the Error Log.
+
+REDIS_KEY_PUBLIC_KEYS = "eims:public_keys"
+HTTP_TIMEOUT_SECONDS = 30
+
+ALLOWED_ALGORITHMS = ["RS256", "RS384", "RS512", "PS256", "ES256", "ES384"]
+RESULT_CACHE_SIZE = 8192
+# upper bound of tokens per verify call
+MAX_BATCH_SIZE = 1000
+SIGNED_FIELDS = ("signed_qr", "signed_invoice")
+
+
+def get_public_keys_url():
+    return frappe.conf.get("eims_public_keys_url") or get_settings().public_keys_url  # type: ignore
+
+
+def refresh_public_keys():
+    """Scheduler entry point: fetch the MoR JWKS and store it in Redis."""
+    import requests
+
+    url = get_public_keys_url()
+    if not url:
+        # verification is not set up on this site; verify_documents says so
+        return None
+
+    try:
+        response = requests.get(url, timeout=HTTP_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        jwks = response.json()
+    except (requests.RequestException, ValueError):
+        frappe.log_error(f"EIMS public keys refresh from {url} failed", frappe.get_traceback())  # type: ignore
+        return None
+
+    if not isinstance(jwks, dict) or not jwks.get("keys"):
+        frappe.log_error("EIMS public keys refresh returned no keys", response.text)  # type: ignore
+        return None
+
+    raw = json.dumps(jwks, sort_keys=True)
+    skipped = [jwk.get("kid") for jwk in jwks["keys"] if jwk.get("kid") not in parse_key_set(raw)]
+    if skipped:
+        frappe.log_error("EIMS public keys refresh skipped unsupported keys", ", ".join(map(str, skipped)))  # type: ignore
+
+    # kept without expiry: a stale key set is better than none if MoR is down
+    frappe.cache().set_value(REDIS_KEY_PUBLIC_KEYS, raw)  # type: ignore
+    return jwks
+
+
+def get_public_keys_json():
+    raw = frappe.cache().get_value(REDIS_KEY_PUBLIC_KEYS)  # type: ignore
+    if not raw:
+        jwks = refresh_public_keys()
+        raw = json.dumps(jwks, sort_keys=True) if jwks else None
+    return raw
+
+
+@lru_cache(maxsize=4)
+def parse_key_set(raw_jwks):
+    """Parse a JWKS once per distinct key set; returns {kid: key}."""
+    import jwt
+
+    keys = {}
+    for jwk in json.loads(raw_jwks).get("keys", []):
+        try:
+            keys[jwk.get("kid")] = jwt.PyJWK.from_dict(jwk).key
+        except jwt.PyJWTError:
+            # unsupported key types are skipped rather than failing the whole set;
+            # refresh_public_keys reports them
+            continue
+    return keys
+
+
+@lru_cache(maxsize=RESULT_CACHE_SIZE)
+def verify_token(token, raw_jwks):
+    """Verify one JWS token against a key set. Cached per (token, key set)."""
+    import jwt
+
+    try:
+        header = jwt.get_unverified_header(token)
+        keys = parse_key_set(raw_jwks)
+        key = keys.get(header.get("kid")) if header.get("kid") else next(iter(keys.values()), None)
+        if key is None:
+            return {"valid": False, "error": f"Unknown signing key {header.get('kid')}"}
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=ALLOWED_ALGORITHMS,
+            options={"verify_aud": False, "verify_exp": False},
+        )
+    except jwt.PyJWTError as e:
+        return {"valid": False, "error": str(e)}
+
+    return {"valid": True, "kid": header.get("kid"), "claims": claims}
+
+
+def get_signed_irn(claims):
+    """The IRN a signed payload was issued for, whatever the case of its claim name."""
+    return next((value for key, value in claims.items() if key.lower() == "irn"), None)
+
+
+def check_signature(token, raw_jwks, irn=None):
+    """Verify one token and, when `irn` is given, that it was signed for that IRN."""
+    if not isinstance(token, str):
+        return {"valid": False, "error": "Signature must be a string"}
+
+    check = dict(verify_token(token, raw_jwks))
+    if check["valid"] and irn:
+        signed_irn = get_signed_irn(check["claims"])
+        if signed_irn != irn:
+            check.update(valid=False, error=f"Signed IRN {signed_irn} does not match {irn}")
+    return check
+
+
+def verify_document(document, raw_jwks):
+    if not isinstance(document, dict):
+        return {"irn": None, "valid": False, "checks": {}, "error": "Document must be an object"}
+
+    checks = {
+        field: check_signature(document[field], raw_jwks, document.get("irn"))
+        for field in SIGNED_FIELDS
+        if document.get(field)
+    }
+    return {
+        "irn": document.get("irn"),
+        "valid": bool(checks) and all(check["valid"] for check in checks.values()),
+        "checks": checks,
+    }
+
+
+def verify_documents(documents):
+    """Verify the signed_qr / signed_invoice of many documents in one call.
+
+    `documents` is a list of dicts with any of `signed_qr`, `signed_invoice`
+    and an optional `irn`. Returns one result per document; a document is
+    valid when every signature it carries verifies and, if it has an irn,
+    was signed for that IRN. Malformed documents get an error of their own.
+    """
+    if len(documents) > MAX_BATCH_SIZE:
+        frappe.throw(f"At most {MAX_BATCH_SIZE} documents can be verified per call")  # type: ignore
+
+    raw_jwks = get_public_keys_json()
+    if not raw_jwks:
+        frappe.throw(  # type: ignore
+            "EIMS public keys are not available for verification. Check the Public Keys URL in EIMS Settings."
+        )
+
+    return [verify_document(document, raw_jwks) for document in documents]
+
+
+def get_key_set_version():
+    raw = get_public_keys_json()
+    return hashlib.sha256(raw.encode()).hexdigest()[:12] if raw else None
@@ -0,0 +1,208 @@
+import json
+import os
+import time
+import frappe
+from datetime import timedelta
+from frappe.utils import now_datetime  # type: ignore
+from taxiye_eims_integration.utils.rollups import record_rollups
+
+# Coalesced persistence for system generated Trip Invoice / Trip Receipt rows.
+#
+# Acknowledged results are appended to a journal file before add() returns,
+# buffered in memory, and written with multi-row INSERTs and one commit per
+# flush (by size or age). Each row is handed to the OS at once, which is
+# enough for it to outlive the worker; the journal is fsync'd once per flush,
+# not once per row. The journal is removed only after the commit, and
+# recover_write_journals() replays journals whose owner stopped flushing, so
+# an acknowledged IRN survives a worker crash. Redis is no
+# place for it: the cache is not persisted and evicts keys under memory
+# pressure. Names are generated up front, which makes a replay idempotent.
+# Interactive requests keep using the single-row save_eims_invoice /
+# save_eims_receipt.
+
+# under the site's private files, one file per buffer
+JOURNAL_FOLDER = "eims_write_journal"
+JOURNAL_SUFFIX = ".jsonl"
+# a journal being replayed; the rename is the claim between two recoveries
+RECOVERING_SUFFIX = ".recovering"
+
+DEFAULT_MAX_ROWS = 200
+DEFAULT_MAX_AGE_SECONDS = 5
+# journals untouched for this long belong to a dead worker
+JOURNAL_STALE_SECONDS = 10 * 60
+
+SOURCES = {"Trip Invoice": "Invoice", "Trip Receipt": "Receipt"}
+DOCTYPES = {source: doctype for doctype, source in SOURCES.items()}
+
+
+def get_journal_folder():
+    folder = frappe.get_site_path("private", JOURNAL_FOLDER)  # type: ignore
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def insert_rows(doctype, rows):
+    """Insert rows with multi-row INSERTs, skipping the Document lifecycle.
+
+    Rows may carry `name` / `creation`; missing ones are generated, keeping
+    creation increasing in row order. Rows whose name already exists are
+    skipped. Does not commit. Returns the names inserted.
+    """
+    if not rows:
+        return []
+
+    names = [row.setdefault("name", frappe.generate_hash(length=10)) for row in rows]  # type: ignore
+    existing = set(
+        frappe.get_all(doctype, filters={"name": ["in", names]}, pluck="name")  # type: ignore
+    )
+    rows = [row for row in rows if row["name"] not in existing]
+    if not rows:
+        return []
+
+    meta = frappe.get_meta(doctype)  # type: ignore
+    columns = [field for field in rows[0] if meta.has_field(field)]
+    user = frappe.session.user  # type: ignore
+    now = now_datetime()
+
+    values = []
+    for position, row in enumerate(rows):
+        # distinct, increasing creation keeps get_last_eims_invoice on the chain tail
+        created = row.setdefault("creation", now + timedelta(microseconds=position))
+        values.append([row["name"], created, created, user, user, 0, *(row.get(field) for field in columns)])
+
+    frappe.db.bulk_insert(  # type: ignore
+        doctype,
+        ["name", "creation", "modified", "owner", "modified_by", "docstatus", *columns],
+        values,
+        ignore_duplicates=True,
+    )
+    # bulk inserts skip doc events, so feed the dashboard rollups here
+    record_rollups(SOURCES[doctype], rows)
+    return [row["name"] for row in rows]
+
+
+class TripWriteBuffer:
+    """Buffer of acknowledged rows for one doctype, flushed in multi-row INSERTs.
+
+    Use as a context manager (flushes on exit) or call flush() explicitly.
+    Work that must not be committed before the rows (e.g. marking the
+    outbox entry Sent) is passed to before_commit().
+    """
+
+    def __init__(self, doctype, max_rows=DEFAULT_MAX_ROWS, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        self.doctype = doctype
+        self.max_rows = max_rows
+        self.max_age_seconds = max_age_seconds
+        self.rows = []
+        self.oldest = None
+        self.callbacks = []
+        self.journal_path = os.path.join(
+            get_journal_folder(),
+            f"{SOURCES[doctype]}-{frappe.generate_hash(length=12)}{JOURNAL_SUFFIX}",  # type: ignore
+        )
+        self.journal = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # flush even on errors: every buffered row was acknowledged by EIMS
+        self.flush()
+
+    def journal_row(self, row):
+        if self.journal is None:
+            self.journal = open(self.journal_path, "a", encoding="utf-8")
+        self.journal.write(json.dumps(row, default=str) + "\n")
+        # in the OS before the caller moves on: a dead worker loses nothing
+        self.journal.flush()
+
+    def add(self, values):
+        """Journal and buffer one row of field values. Returns its name."""
+        row = dict(values)
+        row.setdefault("name", frappe.generate_hash(length=10))  # type: ignore
+        row.setdefault("creation", now_datetime())
+
+        self.journal_row(row)
+
+        self.rows.append(row)
+        if self.oldest is None:
+            self.oldest = time.monotonic()
+        if len(self.rows) >= self.max_rows or time.monotonic() - self.oldest >= self.max_age_seconds:
+            self.flush()
+        return row["name"]
+
+    def before_commit(self, callback):
+        """Run callback after the next flush's inserts, in the same transaction."""
+        self.callbacks.append(callback)
+
+    def flush(self):
+        """Insert buffered rows, commit once, then drop the journal."""
+        if not self.rows:
+            return []
+
+        # one fsync for the batch: if the commit fails the journal is what is left
+        os.fsync(self.journal.fileno())
+        names = insert_rows(self.doctype, self.rows)
+        for callback in self.callbacks:
+            callback()
+        frappe.db.commit()  # type: ignore
+
+        self.journal.close()
+        self.journal = None
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            # claimed by recover_write_journals while idle; its replay skips
+            # the rows inserted here
+            pass
+        self.rows = []
+        self.oldest = None
+        self.callbacks = []
+        return names
+
+
+def read_journal(path):
+    rows = []
+    with open(path, encoding="utf-8") as journal:
+        for line in journal:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                # the last line of a worker killed while writing it; that
+                # row's add() never returned
+                continue
+    return rows
+
+
+def recover_write_journals():
+    """Scheduler entry point: persist rows journaled by workers that died before flushing."""
+    folder = get_journal_folder()
+    cutoff = time.time() - JOURNAL_STALE_SECONDS
+
+    recovered = 0
+    for file_name in os.listdir(folder):
+        path = os.path.join(folder, file_name)
+        if file_name.endswith(JOURNAL_SUFFIX):
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                claimed = path + RECOVERING_SUFFIX
+                os.rename(path, claimed)
+                # fresh again, so only a recovery that died leaves it stale
+                os.utime(claimed)
+            except FileNotFoundError:
+                # flushed by its owner or claimed by another recovery meanwhile
+                continue
+        elif file_name.endswith(RECOVERING_SUFFIX) and os.path.getmtime(path) <= cutoff:
+            # a recovery that died half way; replaying again is safe
+            claimed = path
+        else:
+            continue
+
+        doctype = DOCTYPES[file_name.split("-", 1)[0]]
+        # rows the owner or an earlier replay already inserted are skipped
+        recovered += len(insert_rows(doctype, read_journal(claimed)))
+        frappe.db.commit()  # type: ignore
+        os.remove(claimed)
+
+    return recovered